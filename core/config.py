@@ -39,12 +39,14 @@ import ruamel.yaml as yaml
 from io import BytesIO
 
 
-def ordered_load(stream, Loader=yaml.Loader):
+def ordered_load(stream, Loader=yaml.Loader, array_dir=None):
     """
     Loads a YAML formatted data from stream and puts it into an OrderedDict
 
     @param Stream stream: stream the data is read from
     @param Loader Loader: Loader base class
+    @param str array_dir: optional, directory relative paths of .npy array files are relative to.
+                          Defaults to the directory of the stream file.
 
     Returns OrderedDict with data. If stream is empty then an empty
     OrderedDict is returned.
@@ -80,6 +82,20 @@ def ordered_load(stream, Loader=yaml.Loader):
         arrays = numpy.load(filename)
         return arrays['array']
 
+    def construct_npy_array(loader, node):
+        """
+        The constructor for a numpy array saved in an uncompressed .npy file.
+        The file is memory mapped copy-on-write, so the data is only read when accessed and
+        changes to the array are not written back to the file.
+        """
+        filename = loader.construct_yaml_str(node)
+        if not os.path.isabs(filename):
+            base_dir = array_dir
+            if base_dir is None:
+                base_dir = os.path.dirname(getattr(stream, 'name', ''))
+            filename = os.path.join(base_dir, filename)
+        return numpy.load(filename, mmap_mode='c')
+
     def construct_frozenset(loader, node):
         """
         The frozenset constructor.
@@ -120,6 +136,9 @@ def ordered_load(stream, Loader=yaml.Loader):
     OrderedLoader.add_constructor(
             '!extndarray',
             construct_external_ndarray)
+    OrderedLoader.add_constructor(
+            '!npyarray',
+            construct_npy_array)
     OrderedLoader.add_constructor(
         '!frozenset',
         construct_frozenset)
@@ -136,13 +155,16 @@ def ordered_load(stream, Loader=yaml.Loader):
         return OrderedDict()
 
 
-def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
+def ordered_dump(data, stream=None, Dumper=yaml.Dumper, array_store=None, **kwds):
     """
     dumps (OrderedDict) data in YAML format
 
     @param OrderedDict data: the data
     @param Stream stream: where the data in YAML is dumped
     @param Dumper Dumper: The dumper that is used as a base class
+    @param object array_store: optional, store for numpy arrays with a method store(array)
+                               returning the path of the saved .npy file (see
+                               core.statusstore.NpyArrayStore)
     """
     class OrderedDumper(Dumper):
         """
@@ -188,6 +210,10 @@ def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
         """
         Representer for numpy ndarrays
         """
+        if array_store is not None and not array_data.dtype.hasobject:
+            node = dumper.represent_str(array_store.store(array_data))
+            node.tag = '!npyarray'
+            return node
         try:
             filename = os.path.splitext(os.path.basename(stream.name))[0]
             configdir = os.path.dirname(stream.name)
@@ -221,6 +247,7 @@ def ordered_dump(data, stream=None, Dumper=yaml.Dumper, **kwds):
     OrderedDumper.add_representer(numpy.float64, represent_float)
     # OrderedDumper.add_representer(numpy.float128, represent_float)
     OrderedDumper.add_representer(numpy.ndarray, represent_ndarray)
+    OrderedDumper.add_representer(numpy.memmap, represent_ndarray)
     OrderedDumper.add_representer(frozenset, represent_frozenset)
 
     # dump data
@@ -34,12 +34,15 @@ import importlib
 
 from qtpy import QtCore
 from . import config
+from . import statusstore
 
 from .util.mutex import Mutex   # Mutex provides access serialization between threads
+from .util.mutex import set_mutex_profiling
 from .util.modules import toposort, is_base
 from collections import OrderedDict
 from .logger import register_exception_handler
 from .threadmanager import ThreadManager
+from .profiler import StartupProfiler
 # try to import RemoteObjectManager. Might fail if rpyc is not installed.
 try:
     from .remote import RemoteObjectManager
@@ -99,6 +102,16 @@ class Manager(QtCore.QObject):
         self.tree['global'] = OrderedDict()
         self.tree['global']['startup'] = list()
 
+        # records the time spent loading and activating each module
+        self.profiler = StartupProfiler()
+        # the startup profile is saved only once, after the first startup sequence
+        self._startup_profile_saved = False
+
+        # duration of the last activation of each module in seconds. Keys are (base, name)
+        self.activation_times = dict()
+        # modules activated in their own thread by startModulesParallel
+        self._running_activations = dict()
+
         self.hasGui = not args.no_gui
         self.currentDir = None
         self.baseDir = None
@@ -188,6 +201,10 @@ class Manager(QtCore.QObject):
                     except:
                         logger.exception('Remote server could not be started.')
 
+            if self.tree['global'].get('mutex_profiling', False):
+                set_mutex_profiling(True)
+                logger.info('Mutex profiling enabled.')
+
             logger.info('Qudi started.')
 
             # Load startup things from config here
@@ -207,6 +224,8 @@ class Manager(QtCore.QObject):
                     else:
                         logger.error('Loading startup module {} failed, not '
                                      'defined anywhere.'.format(key))
+                if len(self.tree['global']['startup']) > 0:
+                    self.saveStartupProfile()
         except:
             logger.exception('Error while configuring Manager:')
         finally:
@@ -793,7 +812,9 @@ class Manager(QtCore.QObject):
                         '',
                         defined_module['module.Class'])
 
-                    modObj = self.importModule(base, module_name)
+                    with self.profiler.measure(base, key, 'import'):
+                        already_imported = '{0}.{1}'.format(base, module_name) in sys.modules
+                        modObj = self.importModule(base, module_name)
 
                     # Ensure that the namespace of a module is reloaded before 
                     # instantiation. That will not harm anything.
@@ -803,9 +824,13 @@ class Manager(QtCore.QObject):
                     # Reloading the namespace will prevent the need to restart 
                     # Qudi, if a module instantiation was not successful upon 
                     # load.
-                    importlib.reload(modObj)  # keep the namespace of module up to date
+                    # A module imported just now is up to date already and is not executed twice.
+                    if already_imported:
+                        with self.profiler.measure(base, key, 'import'):
+                            importlib.reload(modObj)  # keep the namespace of module up to date
 
-                    self.configureModule(modObj, base, class_name, key, defined_module)
+                    with self.profiler.measure(base, key, 'configure'):
+                        self.configureModule(modObj, base, class_name, key, defined_module)
                     if 'remoteaccess' in defined_module and defined_module['remoteaccess']:
                         if self.rm is None:
                             logger.error('Remote module sharing functionality disabled. Rpyc not'
@@ -958,13 +983,16 @@ class Manager(QtCore.QObject):
         if module.module_state() != 'deactivated':
             logger.error('{0} module {1} not deactivated'.format(base, name))
             return
+        start_time = time.perf_counter()
         try:
-            module.setStatusVariables(self.loadStatusVariables(base, name))
+            with self.profiler.measure(base, name, 'load_status'):
+                module.setStatusVariables(self.loadStatusVariables(base, name))
+            # loading the status variables is recorded as own stage. Measure only the activation
+            # like in the threaded parallel startup (_activateModuleAsync).
+            start_time = time.perf_counter()
             # start main loop for qt objects
             if module.is_module_threaded:
-                modthread = self.tm.newThread('mod-{0}-{1}'.format(base, name))
-                module.moveToThread(modthread)
-                modthread.start()
+                self._startModuleThread(base, name, module)
                 success = QtCore.QMetaObject.invokeMethod(
                     module.module_state,
                     'trigger',
@@ -977,8 +1005,68 @@ class Manager(QtCore.QObject):
         except:
             logger.exception(
                 '{0} module {1}: error during activation:'.format(base, name))
+        self.activation_times[(base, name)] = time.perf_counter() - start_time
+        self.profiler.record(base, name, 'activate', self.activation_times[(base, name)])
         QtCore.QCoreApplication.instance().processEvents()
 
+    def _startModuleThread(self, base, name, module):
+        """Create and start the thread of a threaded module and move the module into it.
+
+          @param string base: module base package (hardware, logic or gui)
+          @param string name: module name
+          @param object module: the module instance
+
+          @return QThread: the started module thread
+        """
+        modthread = self.tm.newThread('mod-{0}-{1}'.format(base, name))
+        module.moveToThread(modthread)
+        modthread.start()
+        return modthread
+
+    def _activateModuleAsync(self, base, name):
+        """Start the activation of a threaded module in its own thread without waiting for it.
+        _moduleActivationFinished is called when the activation is done.
+
+          @param string base: module base package (hardware, logic or gui)
+          @param string name: module which is going to be activated.
+
+          @return bool: True if the activation has been started
+        """
+        module = self.tree['loaded'][base][name]
+        try:
+            with self.profiler.measure(base, name, 'load_status'):
+                module.setStatusVariables(self.loadStatusVariables(base, name))
+            modthread = self._startModuleThread(base, name, module)
+            worker = ModuleActivationWorker(module, base, name)
+            worker.moveToThread(modthread)
+            worker.sigActivationFinished.connect(
+                self._moduleActivationFinished, QtCore.Qt.QueuedConnection)
+            self._running_activations[(base, name)] = worker
+            QtCore.QMetaObject.invokeMethod(worker, 'activate', QtCore.Qt.QueuedConnection)
+        except:
+            self._running_activations.pop((base, name), None)
+            logger.exception(
+                '{0} module {1}: error during activation:'.format(base, name))
+            return False
+        return True
+
+    @QtCore.Slot(str, str, bool, float)
+    def _moduleActivationFinished(self, base, name, success, duration):
+        """Called in the manager thread when an activation started by _activateModuleAsync is done.
+
+          @param string base: module base package (hardware, logic or gui)
+          @param string name: module name
+          @param bool success: activation success
+          @param float duration: duration of the activation in seconds
+        """
+        worker = self._running_activations.pop((base, name), None)
+        if worker is not None:
+            worker.deleteLater()
+        self.activation_times[(base, name)] = duration
+        self.profiler.record(base, name, 'activate', duration)
+        logger.debug('Activation of {0}.{1} success: {2} ({3:.3f}s)'
+                     ''.format(base, name, success, duration))
+
     @QtCore.Slot(str, str)
     def deactivateModule(self, base, name):
         """Activated the module given in key with the help of base class.
@@ -1168,7 +1256,8 @@ class Manager(QtCore.QObject):
                         return -1
                     elif success > 0:
                         logger.warning('Nonfatal loading error, going on.')
-                    success = self.connectModule(mbase, mkey)
+                    with self.profiler.measure(mbase, mkey, 'connect'):
+                        success = self.connectModule(mbase, mkey)
                     if success < 0:
                         logger.warning('Stopping loading module {0}.{1} after '
                                        'connection failure.'.format(mbase, mkey))
@@ -1239,7 +1328,8 @@ class Manager(QtCore.QObject):
                     logger.warning('Stopping loading module {0}.{1} after '
                                    'loading error.'.format(mbase, mkey))
                     return -1
-                success = self.connectModule(mbase, mkey)
+                with self.profiler.measure(mbase, mkey, 'connect'):
+                    success = self.connectModule(mbase, mkey)
                 if success < 0:
                     logger.warning('Stopping loading module {0}.{1} after '
                                    'connection error'.format(mbase, mkey))
@@ -1247,7 +1337,8 @@ class Manager(QtCore.QObject):
 
             if mkey in self.tree['loaded'][mbase]:
                 if mkey in self.tree['loaded'][mbase]:
-                    success = self.connectModule(mbase, mkey)
+                    with self.profiler.measure(mbase, mkey, 'connect'):
+                        success = self.connectModule(mbase, mkey)
                     if success < 0:
                         logger.warning('Stopping loading module {0}.{1} after '
                                        'connection error'.format(mbase, mkey))
@@ -1263,12 +1354,110 @@ class Manager(QtCore.QObject):
         deps = self.getAllRecursiveModuleDependencies(self.tree['defined'])
         sorteddeps = toposort(deps)
 
-        for module in sorteddeps:
-            base = self.findBase(module)
-            if self.startModule(base, module) < 0:
-                break
+        if self.tree['global'].get('parallel_module_activation', False):
+            self.startModulesParallel(sorteddeps, deps)
+        else:
+            for module in sorteddeps:
+                base = self.findBase(module)
+                if self.startModule(base, module) < 0:
+                    break
 
         logger.info('Start all modules finished.')
+        self.saveStartupProfile()
+
+    def startModulesParallel(self, modules, deps):
+        """Load, connect and activate modules. Modules are loaded and connected one after another
+        in the given order. Afterwards independent modules are activated concurrently:
+        Threaded modules are activated in their own thread as soon as all modules they are
+        connected to are activated. Non-threaded modules (GUI and most hardware) are activated
+        in the manager thread meanwhile.
+
+          @param list modules: module names in the order of a toposort of deps
+          @param dict deps: module dependencies (see getAllRecursiveModuleDependencies)
+
+          @return int: 0 on success, -1 if loading or connecting a module failed
+        """
+        start_time = time.perf_counter()
+        error = 0
+        pending = OrderedDict()
+        for mkey in modules:
+            mbase = self.findBase(mkey)
+            if mkey not in self.tree['loaded'][mbase]:
+                success = self.loadConfigureModule(mbase, mkey)
+                if success < 0:
+                    logger.warning('Stopping module loading after loading failure.')
+                    error = -1
+                    break
+                elif success > 0:
+                    logger.warning('Nonfatal loading error, going on.')
+                with self.profiler.measure(mbase, mkey, 'connect'):
+                    success = self.connectModule(mbase, mkey)
+                if success < 0:
+                    logger.warning('Stopping loading module {0}.{1} after '
+                                   'connection failure.'.format(mbase, mkey))
+                    error = -1
+                    break
+            if (mkey in self.tree['loaded'][mbase]
+                    and self.tree['loaded'][mbase][mkey].module_state() == 'deactivated'):
+                pending[mkey] = mbase
+
+        # A module can be activated when all modules it is connected to are finished
+        waiting_for = {mkey: set(deps.get(mkey, list())) & set(pending) for mkey in pending}
+        finished = set()
+        running = dict()
+        while pending or running:
+            ready = [mkey for mkey in pending if waiting_for[mkey] <= finished]
+            ready_threaded = [mkey for mkey in ready
+                              if self._isActivatedInThread(pending[mkey], mkey)]
+            ready_main = [mkey for mkey in ready if mkey not in ready_threaded]
+            # Start all threaded activations first, then one activation in the manager thread
+            for mkey in ready_threaded:
+                mbase = pending.pop(mkey)
+                if self._activateModuleAsync(mbase, mkey):
+                    running[mkey] = mbase
+                else:
+                    finished.add(mkey)
+            if ready_main:
+                mkey = ready_main[0]
+                self.activateModule(pending.pop(mkey), mkey)
+                finished.add(mkey)
+            elif running:
+                QtCore.QCoreApplication.instance().processEvents(QtCore.QEventLoop.AllEvents, 50)
+                QtCore.QThread.msleep(1)
+            elif pending and not ready_threaded:
+                # Can not happen for a dependency tree without cycles
+                logger.error('Unresolvable module dependencies. Activating {0} one by one.'
+                             ''.format(', '.join(pending)))
+                for mkey in list(pending):
+                    self.activateModule(pending.pop(mkey), mkey)
+                    finished.add(mkey)
+            for mkey, mbase in list(running.items()):
+                if (mbase, mkey) not in self._running_activations:
+                    del running[mkey]
+                    finished.add(mkey)
+
+        self.sigModulesChanged.emit()
+        activated = [key for key in self.activation_times if key[1] in finished]
+        slowest = sorted(activated, key=self.activation_times.get, reverse=True)[:5]
+        logger.info('Activated {0:d} modules in {1:.2f}s. Slowest activations: {2}'
+                    ''.format(len(finished),
+                              time.perf_counter() - start_time,
+                              ', '.join('{0}.{1} ({2:.2f}s)'.format(
+                                            base, name, self.activation_times[(base, name)])
+                                        for base, name in slowest)))
+        return error
+
+    def _isActivatedInThread(self, base, name):
+        """Check if a module is activated in its own thread (threaded local modules).
+
+          @param string base: module base package (hardware, logic or gui)
+          @param string name: module name
+
+          @return bool: True if the module is threaded and not a remote module
+        """
+        if 'remote' in self.tree['defined'][base][name]:
+            return False
+        return bool(self.tree['loaded'][base][name].is_module_threaded)
 
     def getStatusDir(self):
         """ Get the directory where the app state is saved, create it if necessary.
@@ -1280,6 +1469,33 @@ class Manager(QtCore.QObject):
             os.makedirs(appStatusDir)
         return appStatusDir
 
+    def getProfileDir(self):
+        """ Get the directory where the startup profiles are saved, create it if necessary.
+
+          @return str: path of the startup profile directory
+        """
+        profileDir = os.path.join(self.configDir, 'app_profile')
+        if not os.path.isdir(profileDir):
+            os.makedirs(profileDir)
+        return profileDir
+
+    def saveStartupProfile(self):
+        """ Save the timing report of the startup profiler if enabled in the global config
+        (startup_profile: True).
+        The report is only saved once, after the startup modules (or, without startup modules, all
+        configured modules) have been started. Later loads and reloads of modules would add up in
+        the profiler and make the comparison with the previous report meaningless.
+        """
+        if not self.tree['global'].get('startup_profile', False):
+            return
+        if self._startup_profile_saved:
+            return
+        self._startup_profile_saved = True
+        try:
+            self.profiler.save_report(self.getProfileDir())
+        except:
+            logger.exception('Failed to save startup profile.')
+
     @QtCore.Slot(str, str, dict)
     def saveStatusVariables(self, base, module, variables):
         """ If a module has status variables, save them to a file in the application status directory.
@@ -1294,7 +1510,7 @@ class Manager(QtCore.QObject):
                 classname = self.tree['loaded'][base][module].__class__.__name__
                 filename = os.path.join(statusdir,
                     'status-{0}_{1}_{2}.cfg'.format(classname, base, module))
-                config.save(filename, variables)
+                statusstore.save_status_variables(filename, variables)
             except:
                 print(variables)
                 logger.exception('Failed to save status variables of module '
@@ -1314,7 +1530,7 @@ class Manager(QtCore.QObject):
             filename = os.path.join(
                 statusdir, 'status-{0}_{1}_{2}.cfg'.format(classname, base, module))
             if os.path.isfile(filename):
-                variables = config.load(filename)
+                variables = statusstore.load_status_variables(filename)
             else:
                 variables = OrderedDict()
         except:
@@ -1330,8 +1546,7 @@ class Manager(QtCore.QObject):
                 module]['module.Class'].split('.')[-1]
             filename = os.path.join(
                 statusdir, 'status-{0}_{1}_{2}.cfg'.format(classname, base, module))
-            if os.path.isfile(filename):
-                os.remove(filename)
+            statusstore.remove_status_variables(filename)
         except:
             logger.exception('Failed to remove module status file.')
 
@@ -1417,3 +1632,35 @@ class Manager(QtCore.QObject):
             else:
                 logger.warning('Replacing task runner.')
 
+
+class ModuleActivationWorker(QtCore.QObject):
+    """ Activates a threaded module inside the module thread and reports the result to the
+    manager. Used by Manager.startModulesParallel to activate modules concurrently.
+    """
+    sigActivationFinished = QtCore.Signal(str, str, bool, float)
+
+    def __init__(self, module, base, name):
+        """
+          @param object module: the module instance to activate
+          @param str base: module base package (hardware, logic or gui)
+          @param str name: module name
+        """
+        super().__init__()
+        self._module = module
+        self._base = base
+        self._name = name
+
+    @QtCore.Slot()
+    def activate(self):
+        """ Activate the module. Runs in the module thread.
+        """
+        start_time = time.perf_counter()
+        success = False
+        try:
+            success = self._module.module_state.activate()
+        except:
+            logger.exception(
+                '{0} module {1}: error during activation:'.format(self._base, self._name))
+        self.sigActivationFinished.emit(
+            self._base, self._name, bool(success), time.perf_counter() - start_time)
+
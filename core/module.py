@@ -21,6 +21,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 import copy
 import logging
+import time
 import warnings
 from fysom import Fysom  # provides a final state machine
 from collections import OrderedDict
@@ -204,6 +205,7 @@ class BaseMixin(metaclass=ModuleMeta):
 
             @param e: Fysom event
         """
+        start_time = time.perf_counter()
         # add status vars
         sv = self._statusVariables
         for vname, var in self._stat_vars.items():
@@ -219,6 +221,13 @@ class BaseMixin(metaclass=ModuleMeta):
             else:
                 setattr(self, var.var_name, var.constructor_function(self, svar))
 
+        profiler = getattr(self._manager, 'profiler', None)
+        if profiler is not None:
+            profiler.record(self.__module__.split('.')[0],
+                            self._name,
+                            'status_variables',
+                            time.perf_counter() - start_time)
+
         # activate
         self.on_activate()
 
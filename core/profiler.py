@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the Qudi startup profiler recording the time spent loading and activating modules.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_memory_usage():
+    """ Get the resident memory of the qudi process.
+
+    @return int: resident set size in bytes or None if it can not be determined
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+class StartupProfiler:
+    """
+    Records wall time, memory delta and the number of newly imported python modules for each
+    loading stage (import, configure, connect, activate, ...) of each qudi module.
+
+    The report is a json file with one entry per module (sorted keys), so reports of different
+    runs can be compared with compare_reports or any diff tool.
+    Memory deltas are the change of the resident memory of the whole process. They are only
+    meaningful for stages that do not run concurrently with others.
+    """
+    # Stages measured within another stage, not included in the total time of a module
+    nested_stages = ('status_variables',)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start_time = time.perf_counter()
+        self._start_memory = get_memory_usage()
+        self._modules = OrderedDict()
+
+    def clear(self):
+        """ Remove all recorded timings.
+        """
+        with self._lock:
+            self._modules = OrderedDict()
+
+    @contextmanager
+    def measure(self, base, name, stage):
+        """ Context manager recording the duration of a stage of a module.
+
+        @param str base: module base package (hardware, logic or gui)
+        @param str name: module name
+        @param str stage: name of the stage, e.g. 'import'
+        """
+        memory = get_memory_usage()
+        number_of_modules = len(sys.modules)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time
+            new_memory = get_memory_usage()
+            if memory is not None and new_memory is not None:
+                memory_delta = new_memory - memory
+            else:
+                memory_delta = None
+            self.record(base,
+                        name,
+                        stage,
+                        duration,
+                        memory_delta=memory_delta,
+                        imported_modules=len(sys.modules) - number_of_modules)
+
+    def record(self, base, name, stage, duration, memory_delta=None, imported_modules=0):
+        """ Record the duration of a stage of a module. Repeated stages are accumulated.
+
+        @param str base: module base package (hardware, logic or gui)
+        @param str name: module name
+        @param str stage: name of the stage, e.g. 'import'
+        @param float duration: wall time of the stage in seconds
+        @param int memory_delta: optional, change of resident memory in bytes
+        @param int imported_modules: number of python modules imported during the stage
+        """
+        key = '{0}.{1}'.format(base, name)
+        with self._lock:
+            module = self._modules.setdefault(key, OrderedDict())
+            entry = module.setdefault(stage, OrderedDict([('time', 0.0),
+                                                           ('memory', None),
+                                                           ('imported_modules', 0),
+                                                           ('count', 0)]))
+            entry['time'] += duration
+            if memory_delta is not None:
+                entry['memory'] = (entry['memory'] or 0) + memory_delta
+            entry['imported_modules'] += imported_modules
+            entry['count'] += 1
+
+    def get_report(self):
+        """ Create the timing report of all modules.
+
+        @return OrderedDict: report with total startup time and memory and the stages of all modules
+        """
+        memory = get_memory_usage()
+        with self._lock:
+            modules = OrderedDict()
+            for key in sorted(self._modules):
+                module = OrderedDict((stage, OrderedDict(entry))
+                                     for stage, entry in self._modules[key].items())
+                module['total_time'] = sum(entry['time']
+                                           for stage, entry in self._modules[key].items()
+                                           if stage not in self.nested_stages)
+                modules[key] = module
+        report = OrderedDict()
+        report['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        report['python'] = sys.version.split()[0]
+        report['total_time'] = time.perf_counter() - self._start_time
+        report['memory'] = memory
+        report['memory_delta'] = (None if memory is None or self._start_memory is None
+                                  else memory - self._start_memory)
+        report['modules'] = modules
+        return report
+
+    def save_report(self, directory):
+        """ Save the report as startup_profile_<timestamp>.json and startup_profile_latest.json.
+        Modules that got slower compared to the previous latest report are logged.
+
+        @param str directory: directory to save the report files in
+
+        @return str: path of the saved report
+        """
+        os.makedirs(directory, exist_ok=True)
+        report = self.get_report()
+        latest_path = os.path.join(directory, 'startup_profile_latest.json')
+        previous = load_report(latest_path) if os.path.isfile(latest_path) else None
+        file_path = os.path.join(
+            directory,
+            'startup_profile_{0}.json'.format(time.strftime('%Y%m%d-%H%M%S')))
+        for path in (file_path, latest_path):
+            with open(path, 'w') as file:
+                json.dump(report, file, indent=2)
+        logger.info('Startup took {0:.2f}s. Profile saved to {1}'.format(report['total_time'],
+                                                                        file_path))
+        if previous is not None:
+            for key, old_time, new_time in compare_reports(previous, report):
+                logger.warning('Startup of module {0} got slower: {1:.2f}s -> {2:.2f}s'
+                               ''.format(key, old_time, new_time))
+        return file_path
+
+
+def load_report(file_path):
+    """ Load a report saved by StartupProfiler.save_report.
+
+    @param str file_path: path of the json report
+
+    @return dict: the report or None if it could not be loaded
+    """
+    try:
+        with open(file_path, 'r') as file:
+            return json.load(file, object_pairs_hook=OrderedDict)
+    except (OSError, ValueError):
+        logger.exception('Could not load startup profile {0}'.format(file_path))
+        return None
+
+
+def compare_reports(old_report, new_report, min_difference=1.0, min_ratio=1.5):
+    """ Find the modules that got slower between two reports.
+
+    @param dict old_report: previous report
+    @param dict new_report: current report
+    @param float min_difference: minimal increase of the total module time in seconds
+    @param float min_ratio: minimal ratio of new to old total module time
+
+    @return list: (module key, old total time, new total time) for each slower module, slowest
+                  increase first
+    """
+    slower = list()
+    old_modules = old_report.get('modules', dict())
+    for key, module in new_report.get('modules', dict()).items():
+        if key not in old_modules:
+            continue
+        old_time = old_modules[key].get('total_time', 0)
+        new_time = module.get('total_time', 0)
+        if new_time - old_time >= min_difference and new_time >= min_ratio * old_time:
+            slower.append((key, old_time, new_time))
+    slower.sort(key=lambda entry: entry[2] - entry[1], reverse=True)
+    return slower
@@ -27,6 +27,7 @@ from qtpy.QtCore import QObject
 from urllib.parse import urlparse
 import ssl
 from .util.models import DictTableModel, ListTableModel
+from .util.network import ArrayExporter
 import rpyc
 from rpyc.utils.server import ThreadedServer
 from rpyc.utils.authenticators import SSLAuthenticator
@@ -47,6 +48,8 @@ class RemoteObjectManager(QObject):
         self.remoteModules.headers[0] = 'Remote Modules'
         self.sharedModules = DictTableModel()
         self.sharedModules.headers[0] = 'Shared Modules'
+        # Transfers large arrays to clients via shared memory or raw data chunks (see netobtain)
+        self.arrayExporter = ArrayExporter()
 
     def makeRemoteService(self):
         """ A function that returns a class containing a module list hat can be manipulated from the host.
@@ -56,6 +59,7 @@ class RemoteObjectManager(QObject):
             """
             modules = self.sharedModules
             _manager = self.manager
+            _array_exporter = self.arrayExporter
 
             @staticmethod
             def get_service_name():
@@ -95,6 +99,26 @@ class RemoteObjectManager(QObject):
                         logger.error('Client requested a module that is not '
                                 'shared.')
                         return None
+
+            def exposed_export_array(self, array, host_id):
+                """ Prepare the transfer of a numpy array to the client (see netobtain).
+
+                  @param numpy.ndarray array: array to transfer
+                  @param str host_id: host identifier of the client or None
+
+                  @return tuple: transfer header or None if the array should be pickled
+                """
+                return self._array_exporter.export_array(array, host_id)
+
+            def exposed_get_array_chunk(self, token, start, stop):
+                """ Return raw data of an exported array.
+                """
+                return self._array_exporter.get_array_chunk(token, start, stop)
+
+            def exposed_release_array(self, token):
+                """ Release an exported array after the transfer.
+                """
+                self._array_exporter.release_array(token)
         return RemoteModuleService
 
     def createServer(self, hostname, port, certfile=None, keyfile=None):
@@ -125,6 +149,7 @@ class RemoteObjectManager(QObject):
         """
         if hasattr(self, 'server'):
             self.server.close()
+        self.arrayExporter.close()
 
     def shareModule(self, name, obj):
         """ Add a module to the list of modules that can be accessed remotely.
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the storage of module status variables used by the Qudi manager.
+
+Status variables are saved as YAML file like the configuration. Numpy arrays are not embedded in
+the YAML file but stored as uncompressed .npy files next to it, which are memory mapped on load.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import glob
+import hashlib
+import numpy
+import os
+import shutil
+import ruamel.yaml as yaml
+from . import config
+
+
+class NpyArrayStore:
+    """
+    Content addressed store for numpy arrays in a directory of uncompressed .npy files.
+
+    Each array is saved as <hash of dtype, shape and data>.npy. An array that has not changed since
+    the last save is therefore not written again. Files are written to a temporary file first and
+    renamed afterwards, so a file with a valid name is always complete.
+    """
+
+    def __init__(self, directory, relative_to=None):
+        """
+        @param str directory: directory to save the .npy files in
+        @param str relative_to: optional, the paths returned by store are relative to this directory
+        """
+        self.directory = directory
+        self.relative_to = relative_to
+        self.used_files = set()
+        self.written_files = 0
+
+    @staticmethod
+    def get_hash(array):
+        """ Hash of dtype, shape and content of a numpy array.
+
+        @param numpy.ndarray array: the array
+
+        @return str: hex digest of the hash
+        """
+        array = numpy.ascontiguousarray(array)
+        content_hash = hashlib.blake2b(digest_size=20)
+        content_hash.update(array.dtype.str.encode())
+        content_hash.update(repr(array.shape).encode())
+        content_hash.update(array.reshape(-1).view(numpy.uint8))
+        return content_hash.hexdigest()
+
+    def store(self, array):
+        """ Save an array (if not saved already).
+
+        @param numpy.ndarray array: the array to save, must not have object dtype
+
+        @return str: path of the .npy file (relative if relative_to is given)
+        """
+        filename = '{0}.npy'.format(self.get_hash(array))
+        path = os.path.join(self.directory, filename)
+        if filename not in self.used_files and not os.path.isfile(path):
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = path + '.tmp'
+            with open(temp_path, 'wb') as file:
+                numpy.save(file, numpy.asarray(array), allow_pickle=False)
+            os.replace(temp_path, path)
+            self.written_files += 1
+        self.used_files.add(filename)
+        if self.relative_to is None:
+            return path
+        return os.path.relpath(path, self.relative_to)
+
+    def remove_unused(self):
+        """ Delete all files in the directory that were not used by store since creation of the
+        store. Files which are still memory mapped (e.g. on Windows) are left for a later save.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if filename not in self.used_files:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+        if not self.used_files:
+            try:
+                os.rmdir(self.directory)
+            except OSError:
+                pass
+
+
+def get_array_dir(filename):
+    """ Get the directory of the .npy array files belonging to a status file.
+
+    @param str filename: path of the status file
+
+    @return str: path of the array directory
+    """
+    return os.path.splitext(filename)[0] + '_arrays'
+
+
+def remove_legacy_array_files(filename):
+    """ Delete the compressed .npz array files written by config.save for a status file.
+
+    @param str filename: path of the status file
+    """
+    for path in glob.glob(glob.escape(os.path.splitext(filename)[0]) + '-[0-9]*.npz'):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def save_status_variables(filename, variables):
+    """ Save status variables atomically to a YAML file and a directory of .npy array files.
+    The YAML file is only rewritten if its content changed and array files only if the array
+    changed.
+
+    @param str filename: path of the status file
+    @param dict variables: status variable names and values
+
+    @return bool: True if any file has been written
+    """
+    array_store = NpyArrayStore(get_array_dir(filename), relative_to=os.path.dirname(filename))
+    content = config.ordered_dump(variables,
+                                  Dumper=yaml.SafeDumper,
+                                  array_store=array_store,
+                                  default_flow_style=False)
+    changed = array_store.written_files > 0
+    try:
+        with open(filename, 'r') as file:
+            unchanged = file.read() == content
+    except OSError:
+        unchanged = False
+    if not unchanged:
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'w') as file:
+            file.write(content)
+        os.replace(temp_filename, filename)
+        changed = True
+    array_store.remove_unused()
+    remove_legacy_array_files(filename)
+    return changed
+
+
+def load_status_variables(filename):
+    """ Load status variables saved by save_status_variables (or config.save).
+
+    @param str filename: path of the status file
+
+    @return OrderedDict: status variable names and values
+    """
+    return config.load(filename)
+
+
+def remove_status_variables(filename):
+    """ Delete a status file and its array files.
+
+    @param str filename: path of the status file
+    """
+    if os.path.isfile(filename):
+        os.remove(filename)
+    shutil.rmtree(get_array_dir(filename), ignore_errors=True)
+    remove_legacy_array_files(filename)
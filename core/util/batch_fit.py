@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a vectorized fitting engine fitting the same model to many data sets at once,
+e.g. an ODMR spectrum per pixel of a confocal map or a Rabi trace per POI.
+
+All data sets share the same x values. Initial parameters are estimated for all data sets at once
+and a Levenberg-Marquardt optimization with analytic Jacobians is performed on all data sets in
+parallel using numpy array operations. Optionally the data sets are distributed over a pool of
+processes.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+
+class BatchModel:
+    """
+    Base class of the models for batch fitting. Parameters are given as array of shape
+    (number of data sets, number of parameters) in the order of param_names.
+    """
+    param_names = tuple()
+
+    @staticmethod
+    def function(x, params):
+        """ Evaluate the model.
+
+        @param numpy.ndarray x: x values with shape (points,)
+        @param numpy.ndarray params: parameters with shape (N, number of parameters)
+
+        @return numpy.ndarray: model values with shape (N, points)
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def jacobian(x, params):
+        """ Derivatives of the model with respect to the parameters.
+
+        @param numpy.ndarray x: x values with shape (points,)
+        @param numpy.ndarray params: parameters with shape (N, number of parameters)
+
+        @return numpy.ndarray: derivatives with shape (N, points, number of parameters)
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def estimate(x, data):
+        """ Estimate the initial parameters of all data sets.
+
+        @param numpy.ndarray x: x values with shape (points,)
+        @param numpy.ndarray data: data with shape (N, points)
+
+        @return numpy.ndarray: parameters with shape (N, number of parameters)
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def finalize(params):
+        """ Map parameters to their canonical range (e.g. positive widths) after the fit.
+
+        @param numpy.ndarray params: parameters with shape (N, number of parameters)
+
+        @return numpy.ndarray: the parameters
+        """
+        return params
+
+
+def _estimate_peak(x, data):
+    """ Estimate offset, amplitude, center and the full width at half maximum of a single peak or
+    dip in each data set.
+
+    @return tuple: offset, amplitude, center, fwhm as arrays of shape (N,)
+    """
+    offset = np.median(data, axis=1)
+    deviation = data - offset[:, np.newaxis]
+    max_index = np.argmax(deviation, axis=1)
+    min_index = np.argmin(deviation, axis=1)
+    rows = np.arange(data.shape[0])
+    is_dip = -deviation[rows, min_index] > deviation[rows, max_index]
+    extremum_index = np.where(is_dip, min_index, max_index)
+    amplitude = deviation[rows, extremum_index]
+    center = x[extremum_index]
+    step = np.abs(x[-1] - x[0]) / max(x.size - 1, 1)
+    above_half = (deviation * np.sign(amplitude)[:, np.newaxis]
+                  > np.abs(amplitude)[:, np.newaxis] / 2)
+    fwhm = np.maximum(above_half.sum(axis=1), 1) * step
+    return offset, amplitude, center, fwhm
+
+
+class LorentzianModel(BatchModel):
+    """ amplitude * sigma**2 / ((x - center)**2 + sigma**2) + offset (sigma: half width at half
+    maximum)
+    """
+    param_names = ('amplitude', 'center', 'sigma', 'offset')
+
+    @staticmethod
+    def function(x, params):
+        amplitude, center, sigma, offset = (params.T[:, :, np.newaxis])
+        return amplitude * sigma ** 2 / ((x - center) ** 2 + sigma ** 2) + offset
+
+    @staticmethod
+    def jacobian(x, params):
+        amplitude, center, sigma, offset = (params.T[:, :, np.newaxis])
+        distance = x - center
+        denominator = distance ** 2 + sigma ** 2
+        lorentzian = sigma ** 2 / denominator
+        return np.stack((lorentzian,
+                         amplitude * 2 * sigma ** 2 * distance / denominator ** 2,
+                         amplitude * 2 * sigma * distance ** 2 / denominator ** 2,
+                         np.ones_like(lorentzian)),
+                        axis=2)
+
+    @staticmethod
+    def estimate(x, data):
+        offset, amplitude, center, fwhm = _estimate_peak(x, data)
+        return np.column_stack((amplitude, center, fwhm / 2, offset))
+
+    @staticmethod
+    def finalize(params):
+        params[:, 2] = np.abs(params[:, 2])
+        return params
+
+
+class GaussianModel(BatchModel):
+    """ amplitude * exp(-(x - center)**2 / (2 * sigma**2)) + offset
+    """
+    param_names = ('amplitude', 'center', 'sigma', 'offset')
+
+    @staticmethod
+    def function(x, params):
+        amplitude, center, sigma, offset = (params.T[:, :, np.newaxis])
+        return amplitude * np.exp(-(x - center) ** 2 / (2 * sigma ** 2)) + offset
+
+    @staticmethod
+    def jacobian(x, params):
+        amplitude, center, sigma, offset = (params.T[:, :, np.newaxis])
+        distance = x - center
+        gaussian = np.exp(-distance ** 2 / (2 * sigma ** 2))
+        return np.stack((gaussian,
+                         amplitude * gaussian * distance / sigma ** 2,
+                         amplitude * gaussian * distance ** 2 / sigma ** 3,
+                         np.ones_like(gaussian)),
+                        axis=2)
+
+    @staticmethod
+    def estimate(x, data):
+        offset, amplitude, center, fwhm = _estimate_peak(x, data)
+        return np.column_stack((amplitude, center, fwhm / (2 * np.sqrt(2 * np.log(2))), offset))
+
+    @staticmethod
+    def finalize(params):
+        params[:, 2] = np.abs(params[:, 2])
+        return params
+
+
+class SineModel(BatchModel):
+    """ amplitude * sin(2 * pi * frequency * x + phase) + offset
+    """
+    param_names = ('amplitude', 'frequency', 'phase', 'offset')
+
+    @staticmethod
+    def function(x, params):
+        amplitude, frequency, phase, offset = (params.T[:, :, np.newaxis])
+        return amplitude * np.sin(2 * np.pi * frequency * x + phase) + offset
+
+    @staticmethod
+    def jacobian(x, params):
+        amplitude, frequency, phase, offset = (params.T[:, :, np.newaxis])
+        argument = 2 * np.pi * frequency * x + phase
+        sine = np.sin(argument)
+        cosine = amplitude * np.cos(argument)
+        return np.stack((sine,
+                         cosine * 2 * np.pi * x,
+                         cosine,
+                         np.ones_like(sine)),
+                        axis=2)
+
+    @staticmethod
+    def estimate(x, data):
+        offset = data.mean(axis=1)
+        deviation = data - offset[:, np.newaxis]
+        # Frequency of the maximum of the zero padded Fourier transform (x must be equidistant)
+        step = (x[-1] - x[0]) / max(x.size - 1, 1)
+        padded_size = 4 * x.size
+        spectrum = np.abs(np.fft.rfft(deviation, n=padded_size, axis=1))
+        spectrum[:, 0] = 0
+        frequency = np.argmax(spectrum, axis=1) / (padded_size * step)
+        # Linear least squares of the sine and cosine component at that frequency
+        argument = 2 * np.pi * frequency[:, np.newaxis] * x
+        sine = np.sin(argument)
+        cosine = np.cos(argument)
+        matrix = np.stack((np.stack(((sine * sine).sum(axis=1), (sine * cosine).sum(axis=1)), 1),
+                           np.stack(((sine * cosine).sum(axis=1), (cosine * cosine).sum(axis=1)),
+                                    1)),
+                          axis=1)
+        vector = np.stack(((sine * deviation).sum(axis=1), (cosine * deviation).sum(axis=1)),
+                          axis=1)
+        matrix += np.eye(2) * 1e-12 * x.size
+        sine_part, cosine_part = np.linalg.solve(matrix, vector[:, :, np.newaxis])[:, :, 0].T
+        return np.column_stack((np.hypot(sine_part, cosine_part),
+                                frequency,
+                                np.arctan2(cosine_part, sine_part),
+                                offset))
+
+    @staticmethod
+    def finalize(params):
+        negative = params[:, 0] < 0
+        params[negative, 0] = -params[negative, 0]
+        params[negative, 2] += np.pi
+        params[:, 2] = np.mod(params[:, 2], 2 * np.pi)
+        return params
+
+
+class DecayExponentialModel(BatchModel):
+    """ amplitude * exp(-x / lifetime) + offset
+    """
+    param_names = ('amplitude', 'lifetime', 'offset')
+
+    @staticmethod
+    def function(x, params):
+        amplitude, lifetime, offset = (params.T[:, :, np.newaxis])
+        return amplitude * np.exp(-x / lifetime) + offset
+
+    @staticmethod
+    def jacobian(x, params):
+        amplitude, lifetime, offset = (params.T[:, :, np.newaxis])
+        exponential = np.exp(-x / lifetime)
+        return np.stack((exponential,
+                         amplitude * exponential * x / lifetime ** 2,
+                         np.ones_like(exponential)),
+                        axis=2)
+
+    @staticmethod
+    def estimate(x, data):
+        tail = max(x.size // 10, 1)
+        offset = data[:, -tail:].mean(axis=1)
+        deviation = data - offset[:, np.newaxis]
+        amplitude_at_start = deviation[:, 0]
+        # The area below an exponential decay is amplitude * lifetime
+        area = np.sum((deviation[:, 1:] + deviation[:, :-1]) / 2 * np.diff(x), axis=1)
+        step = np.abs(x[-1] - x[0]) / max(x.size - 1, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lifetime = area / amplitude_at_start
+        lifetime = np.where(np.isfinite(lifetime), lifetime, step)
+        lifetime = np.clip(lifetime, step, np.abs(x[-1] - x[0]))
+        amplitude = amplitude_at_start * np.exp(x[0] / lifetime)
+        return np.column_stack((amplitude, lifetime, offset))
+
+
+models = OrderedDict([('lorentzian', LorentzianModel),
+                      ('gaussian', GaussianModel),
+                      ('sine', SineModel),
+                      ('decayexponential', DecayExponentialModel)])
+
+
+def levenberg_marquardt(model, x, data, params, max_iterations=100, tolerance=1e-8):
+    """ Levenberg-Marquardt least squares optimization of all data sets in parallel.
+    Data sets that converged are not iterated any further.
+
+    @param BatchModel model: the model to fit
+    @param numpy.ndarray x: x values with shape (points,)
+    @param numpy.ndarray data: data with shape (N, points)
+    @param numpy.ndarray params: initial parameters with shape (N, number of parameters)
+    @param int max_iterations: maximal number of iterations
+    @param float tolerance: relative change of the chi square to stop the iteration
+
+    @return tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray): optimized parameters,
+            sum of squared residuals with shape (N,) and success flags with shape (N,)
+    """
+    params = np.array(params, dtype=float)
+    damping = np.full(data.shape[0], 1e-3)
+    with np.errstate(all='ignore'):
+        residuals = data - model.function(x, params)
+        chi_square = np.sum(residuals ** 2, axis=1)
+    chi_square[~np.isfinite(chi_square)] = np.inf
+    converged = np.zeros(data.shape[0], dtype=bool)
+    active = np.flatnonzero(np.isfinite(chi_square))
+
+    for _ in range(max_iterations):
+        if active.size == 0:
+            break
+        current = params[active]
+        with np.errstate(all='ignore'):
+            jacobian = model.jacobian(x, current)
+            jacobian[~np.isfinite(jacobian)] = 0
+            residuals = data[active] - model.function(x, current)
+        jacobian_transposed = jacobian.transpose(0, 2, 1)
+        curvature = np.matmul(jacobian_transposed, jacobian)
+        gradient = np.matmul(jacobian_transposed, residuals[:, :, np.newaxis])[:, :, 0]
+        diagonal = np.einsum('nii->ni', curvature)
+        diagonal = np.maximum(diagonal, 1e-12 * diagonal.max(axis=1, keepdims=True) + 1e-300)
+        matrix = curvature + (damping[active, np.newaxis] * diagonal)[:, :, np.newaxis] * np.eye(
+            params.shape[1])
+        try:
+            step = np.linalg.solve(matrix, gradient[:, :, np.newaxis])[:, :, 0]
+        except np.linalg.LinAlgError:
+            step = np.einsum('nij,nj->ni', np.linalg.pinv(matrix), gradient)
+
+        new_params = current + step
+        with np.errstate(all='ignore'):
+            new_chi_square = np.sum((data[active] - model.function(x, new_params)) ** 2, axis=1)
+        new_chi_square[~np.isfinite(new_chi_square)] = np.inf
+        improved = new_chi_square < chi_square[active]
+
+        improved_index = active[improved]
+        relative_change = ((chi_square[improved_index] - new_chi_square[improved])
+                           / np.maximum(chi_square[improved_index], 1e-300))
+        params[improved_index] = new_params[improved]
+        chi_square[improved_index] = new_chi_square[improved]
+        damping[improved_index] = np.maximum(damping[improved_index] / 10, 1e-12)
+        damping[active[~improved]] *= 10
+
+        converged[improved_index[relative_change < tolerance]] = True
+        # A fit that can not be improved even with strong damping is at its minimum
+        converged[active[~improved & (damping[active] > 1e10)]] = True
+        active = active[~converged[active]]
+    return params, chi_square, converged
+
+
+def _fit_rows(model_name, x, data, params, max_iterations, tolerance):
+    """ Fit a block of data sets (runs in a worker process if a process pool is used).
+    """
+    model = models[model_name]
+    if params is None:
+        params = model.estimate(x, data)
+    params, chi_square, success = levenberg_marquardt(
+        model, x, data, params, max_iterations=max_iterations, tolerance=tolerance)
+    params = model.finalize(params)
+
+    # Standard errors from the covariance matrix of the linearized model
+    degrees_of_freedom = max(x.size - params.shape[1], 1)
+    with np.errstate(all='ignore'):
+        jacobian = model.jacobian(x, params)
+        jacobian[~np.isfinite(jacobian)] = 0
+        covariance = np.linalg.pinv(np.matmul(jacobian.transpose(0, 2, 1), jacobian))
+        errors = np.sqrt(np.abs(np.einsum('nii->ni', covariance))
+                         * (chi_square / degrees_of_freedom)[:, np.newaxis])
+    return params, errors, chi_square / degrees_of_freedom, success
+
+
+def batch_fit(model, x, data, initial_params=None, max_iterations=100, tolerance=1e-8,
+              processes=None, chunk_size=1000):
+    """ Fit a model to each row of a 2D data array.
+
+    @param str model: name of the model, one of models ('lorentzian', 'gaussian', 'sine',
+                      'decayexponential')
+    @param numpy.ndarray x: x values (equidistant for the sine estimator) with shape (points,)
+    @param numpy.ndarray data: data sets with shape (N, points)
+    @param dict initial_params: optional, initial parameter arrays (or scalars) for all
+                                parameter names of the model. Estimated if None.
+    @param int max_iterations: maximal number of Levenberg-Marquardt iterations
+    @param float tolerance: relative change of the chi square to stop the iteration
+    @param int processes: optional, number of worker processes. None to fit in this process.
+    @param int chunk_size: number of data sets per worker job
+
+    @return OrderedDict: 'params': OrderedDict with parameter names as keys and arrays of shape (N,)
+                         'errors': OrderedDict with the standard errors of the parameters
+                         'reduced_chi_square': array of shape (N,)
+                         'success': bool array of shape (N,), True if the fit converged
+    """
+    if model not in models:
+        raise ValueError('Unknown batch fit model "{0}". Available models: {1}'
+                         ''.format(model, ', '.join(models)))
+    x = np.asarray(x, dtype=float)
+    data = np.atleast_2d(np.asarray(data, dtype=float))
+    if x.ndim != 1 or data.shape[1] != x.size:
+        raise ValueError('Data of shape {0} does not match x values of shape {1}.'
+                         ''.format(data.shape, x.shape))
+    param_names = models[model].param_names
+    params = None
+    if initial_params is not None:
+        params = np.column_stack([np.broadcast_to(initial_params[name], data.shape[0])
+                                  for name in param_names]).astype(float)
+
+    if processes is None or processes < 2 or data.shape[0] <= chunk_size:
+        results = [_fit_rows(model, x, data, params, max_iterations, tolerance)]
+    else:
+        starts = range(0, data.shape[0], chunk_size)
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(_fit_rows,
+                                       model,
+                                       x,
+                                       data[start:start + chunk_size],
+                                       None if params is None else params[start:start + chunk_size],
+                                       max_iterations,
+                                       tolerance)
+                       for start in starts]
+            results = [future.result() for future in futures]
+
+    fit_params, errors, reduced_chi_square, success = (np.concatenate(arrays)
+                                                       for arrays in zip(*results))
+    result = OrderedDict()
+    result['params'] = OrderedDict(zip(param_names, fit_params.T))
+    result['errors'] = OrderedDict(zip(param_names, errors.T))
+    result['reduced_chi_square'] = reduced_chi_square
+    result['success'] = success
+    return result
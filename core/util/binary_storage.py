@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains writers for binary data files (HDF5 and numpy .npy) used by the SaveLogic.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import json
+import os
+import re
+import numpy as np
+from collections import OrderedDict
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+
+def json_default(obj):
+    """
+    Fallback conversion for objects json can not serialize (numpy types, datetime, ...).
+    Use as json.dump(..., default=json_default).
+    """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+def split_data_columns(data):
+    """
+    Splits the data dict as passed to SaveLogic.save_data into single columns.
+    A 2D array is split into its columns if its key contains one comma separated name per column
+    (e.g. {'Time (s),Signal (counts/s)': array of shape (n, 2)}). All other arrays are kept as they
+    are.
+
+    @param dict data: data dict with header strings as keys and array_like as values
+
+    @return OrderedDict: column name as keys and numpy.ndarray as values
+    """
+    columns = OrderedDict()
+    for key, value in data.items():
+        value = np.asanyarray(value)
+        names = [name.strip() for name in key.split(',')]
+        if value.ndim == 2 and len(names) > 1 and len(names) == value.shape[1]:
+            for index, name in enumerate(names):
+                columns[name] = value[:, index]
+        else:
+            columns[key] = value
+    return columns
+
+
+class BinaryDataWriter:
+    """
+    Base class for writers storing each data column as its own array/dataset together with the
+    measurement parameters as metadata.
+
+    Data can be written at once (write) or streamed in chunks to disk (append). The latter appends
+    the new data along the first axis of each column.
+    """
+    file_extension = ''
+
+    def __init__(self, file_path, parameters=None, metadata=None):
+        """
+        @param str file_path: path of the file (or directory) to create without file extension
+        @param dict parameters: measurement parameters to store as metadata
+        @param dict metadata: additional (general) metadata, e.g. module name and timestamp
+        """
+        self.file_path = file_path + self.file_extension
+        self.parameters = OrderedDict() if parameters is None else OrderedDict(parameters)
+        self.metadata = OrderedDict() if metadata is None else OrderedDict(metadata)
+        self._column_names = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def sanitize_name(name):
+        """
+        Creates a name usable as file or dataset name from a column header.
+
+        @param str name: column header
+
+        @return str: the name with all special characters replaced by '_'
+        """
+        name = re.sub(r'[^\w\-\.\(\) ]', '_', str(name)).strip()
+        return name if name else 'data'
+
+    def _get_column_name(self, name):
+        if name not in self._column_names:
+            base_name = self.sanitize_name(name)
+            column_name = base_name
+            index = 1
+            while column_name in self._column_names.values():
+                column_name = '{0}_{1:d}'.format(base_name, index)
+                index += 1
+            self._column_names[name] = column_name
+        return self._column_names[name]
+
+    def write(self, data):
+        """
+        Writes the complete data at once.
+
+        @param dict data: data dict as passed to SaveLogic.save_data
+        """
+        self.append(data)
+        self.close()
+
+    def append(self, data):
+        """
+        Appends the data of each column to the already written data.
+
+        @param dict data: data dict as passed to SaveLogic.save_data
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Writes all pending data and metadata and closes the file(s).
+        """
+        raise NotImplementedError
+
+
+class NpyDataWriter(BinaryDataWriter):
+    """
+    Stores the data in a directory containing one .npy file per data column and a metadata.json
+    file with the parameters and the mapping of file names to column headers.
+
+    The .npy files are written with a fixed size header which is updated when data is appended,
+    so each column can be loaded with numpy.load (or numpy.load(..., mmap_mode='r')).
+    """
+    file_extension = ''
+    _header_size = 128
+
+    def __init__(self, file_path, parameters=None, metadata=None):
+        super().__init__(file_path, parameters, metadata)
+        os.makedirs(self.file_path, exist_ok=True)
+        self._files = OrderedDict()
+        self._shapes = OrderedDict()
+        self._dtypes = OrderedDict()
+        self._write_metadata()
+
+    def append(self, data):
+        for name, column in split_data_columns(data).items():
+            column = np.ascontiguousarray(column)
+            if column.dtype.hasobject:
+                column = column.astype(str)
+            if column.ndim == 0:
+                column = column.reshape(1)
+            column_name = self._get_column_name(name)
+            if column_name not in self._files:
+                file = open(os.path.join(self.file_path, column_name + '.npy'), 'w+b')
+                self._files[column_name] = file
+                self._dtypes[column_name] = column.dtype
+                self._shapes[column_name] = (0,) + column.shape[1:]
+                self._write_header(column_name)
+            elif column.shape[1:] != self._shapes[column_name][1:]:
+                raise ValueError('Shape of appended data {0} does not match the shape {1} of '
+                                 'column "{2}".'.format(column.shape,
+                                                        self._shapes[column_name],
+                                                        name))
+            file = self._files[column_name]
+            file.seek(0, os.SEEK_END)
+            file.write(column.astype(self._dtypes[column_name], copy=False).tobytes())
+            shape = self._shapes[column_name]
+            self._shapes[column_name] = (shape[0] + column.shape[0],) + shape[1:]
+            self._write_header(column_name)
+        self._write_metadata()
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+        self._files.clear()
+        self._write_metadata()
+
+    def _write_header(self, column_name):
+        header = {'descr': np.lib.format.dtype_to_descr(self._dtypes[column_name]),
+                  'fortran_order': False,
+                  'shape': self._shapes[column_name]}
+        header = repr(header)
+        magic = np.lib.format.magic(1, 0)
+        # magic string + uint16 header length + header + padding + newline
+        header_length = self._header_size - len(magic) - 2
+        if len(header) + 1 > header_length:
+            raise ValueError('Header of column "{0}" too long for npy file.'.format(column_name))
+        header = header.ljust(header_length - 1) + '\n'
+        file = self._files[column_name]
+        file.seek(0)
+        file.write(magic)
+        file.write(np.array(header_length, dtype='<u2').tobytes())
+        file.write(header.encode('latin1'))
+        file.flush()
+
+    def _write_metadata(self):
+        metadata = OrderedDict(self.metadata)
+        metadata['parameters'] = self.parameters
+        metadata['columns'] = OrderedDict(
+            (column_name + '.npy', name) for name, column_name in self._column_names.items())
+        with open(os.path.join(self.file_path, 'metadata.json'), 'w') as file:
+            json.dump(metadata, file, indent=2, default=json_default)
+
+
+class Hdf5DataWriter(BinaryDataWriter):
+    """
+    Stores the data in a HDF5 file (requires h5py). Each data column is a dataset in the root group
+    with the column header stored in its 'name' attribute. Parameters are stored as attributes of
+    the 'parameters' group, additional metadata as attributes of the root group.
+    Streamed datasets are created chunked and resizable along the first axis.
+    """
+    file_extension = '.h5'
+
+    def __init__(self, file_path, parameters=None, metadata=None, compression=None):
+        """
+        @param str file_path: path of the file to create without file extension
+        @param dict parameters: measurement parameters to store as metadata
+        @param dict metadata: additional (general) metadata, e.g. module name and timestamp
+        @param str compression: optional, h5py compression filter for the datasets (e.g. 'gzip')
+        """
+        if h5py is None:
+            raise ImportError('Saving data as HDF5 file requires the h5py package.')
+        super().__init__(file_path, parameters, metadata)
+        self.compression = compression
+        self._file = h5py.File(self.file_path, 'w')
+        self._set_attributes(self._file.attrs, self.metadata)
+        self._set_attributes(self._file.create_group('parameters').attrs, self.parameters)
+
+    @staticmethod
+    def is_available():
+        """
+        @return bool: True if h5py is installed and HDF5 files can be written
+        """
+        return h5py is not None
+
+    def write(self, data):
+        for name, column in split_data_columns(data).items():
+            column = self._prepare_column(column)
+            dataset = self._file.create_dataset(self._get_column_name(name),
+                                                data=column,
+                                                compression=self.compression)
+            dataset.attrs['name'] = str(name)
+        self.close()
+
+    def append(self, data):
+        for name, column in split_data_columns(data).items():
+            column = self._prepare_column(column)
+            column_name = self._get_column_name(name)
+            if column_name not in self._file:
+                dataset = self._file.create_dataset(column_name,
+                                                    data=column,
+                                                    maxshape=(None,) + column.shape[1:],
+                                                    chunks=True,
+                                                    compression=self.compression)
+                dataset.attrs['name'] = str(name)
+            else:
+                dataset = self._file[column_name]
+                old_length = dataset.shape[0]
+                dataset.resize(old_length + column.shape[0], axis=0)
+                dataset[old_length:] = column
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def _prepare_column(column):
+        column = np.asanyarray(column)
+        if column.ndim == 0:
+            column = column.reshape(1)
+        if column.dtype.kind in 'UO':
+            column = column.astype(h5py.special_dtype(vlen=str))
+        return column
+
+    @staticmethod
+    def _set_attributes(attributes, values):
+        for key, value in values.items():
+            try:
+                attributes[str(key)] = value
+            except (TypeError, ValueError):
+                attributes[str(key)] = json.dumps(value, default=json_default)
@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains Qudi data buffer classes for continuously acquired measurement data.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import bisect
+import numpy as np
+import os
+import tempfile
+from collections import deque
+
+
+class RunningAverageBuffer:
+    """
+    Buffer for equally shaped data entries (e.g. ODMR sweeps) that keeps all appended entries and
+    provides the average over all entries as well as the average over the last <window> entries.
+
+    Appending an entry is amortized O(1): The entries are stored chronologically in a preallocated
+    array which grows by doubling its size if necessary. A running sum over all entries and a
+    running sum over the last <window> entries are updated on each append.
+
+    The storage array contains <padding> rows of zeros in front of the first entry. This allows to
+    return the last n <= padding entries (newest first, zero padded if less than n entries are
+    present) as a numpy view without copying the data (see get_latest).
+    Entries once written are never altered. The views handed out remain valid until the buffer is
+    cleared.
+    """
+
+    def __init__(self, entry_shape, capacity=100, padding=0, window=0, dtype=np.float64):
+        """
+        @param tuple entry_shape: The shape of a single data entry
+        @param int capacity: Initial number of entries to preallocate memory for
+        @param int padding: Max. number of entries that can be returned by get_latest as view
+        @param int window: Number of most recent entries to average over in get_window_mean.
+                           0 means all entries.
+        @param dtype: numpy dtype of the stored data
+        """
+        self._entry_shape = tuple(np.atleast_1d(entry_shape).astype(int))
+        self._dtype = np.dtype(dtype)
+        self._padding = max(0, int(padding))
+        self._window = max(0, int(window))
+        self._count = 0
+        self._storage = np.zeros((self._padding + max(1, int(capacity)),) + self._entry_shape,
+                                 dtype=self._dtype)
+        self._sum = np.zeros(self._entry_shape, dtype=np.float64)
+        self._window_sum = np.zeros(self._entry_shape, dtype=np.float64)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def entry_shape(self):
+        return self._entry_shape
+
+    @property
+    def capacity(self):
+        return self._storage.shape[0] - self._padding
+
+    @property
+    def padding(self):
+        return self._padding
+
+    @padding.setter
+    def padding(self, value):
+        value = max(0, int(value))
+        if value > self._padding:
+            storage = np.zeros((value + self.capacity,) + self._entry_shape, dtype=self._dtype)
+            storage[value:value + self._count] = self.data
+            self._storage = storage
+            self._padding = value
+
+    @property
+    def window(self):
+        return self._window
+
+    @window.setter
+    def window(self, value):
+        value = max(0, int(value))
+        if value != self._window:
+            self._window = value
+            self._recalculate_window_sum()
+
+    @property
+    def data(self):
+        """
+        View of all entries in chronological order (oldest first).
+        """
+        return self._storage[self._padding:self._padding + self._count]
+
+    def clear(self):
+        """
+        Removes all entries. The storage is newly allocated so previously returned views are not
+        altered.
+        """
+        self._storage = np.zeros(self._storage.shape, dtype=self._dtype)
+        self._count = 0
+        self._sum = np.zeros(self._entry_shape, dtype=np.float64)
+        self._window_sum = np.zeros(self._entry_shape, dtype=np.float64)
+
+    def append(self, entry):
+        """
+        Appends a new entry and updates the running sums.
+
+        @param numpy.ndarray entry: The new data entry with shape <entry_shape>
+        """
+        if self._padding + self._count >= self._storage.shape[0]:
+            self._grow()
+        index = self._padding + self._count
+        self._storage[index] = entry
+        self._count += 1
+        new_entry = self._storage[index]
+        self._sum += new_entry
+        if self._window > 0:
+            self._window_sum += new_entry
+            if self._count > self._window:
+                self._window_sum -= self._storage[index - self._window]
+
+    def get_mean(self):
+        """
+        Average over all entries.
+
+        @return numpy.ndarray: The averaged entry (zeros if the buffer is empty)
+        """
+        if self._count == 0:
+            return np.zeros(self._entry_shape, dtype=np.float64)
+        return self._sum / self._count
+
+    def get_window_mean(self):
+        """
+        Average over the last <window> entries (all entries if window is 0).
+
+        @return numpy.ndarray: The averaged entry (zeros if the buffer is empty)
+        """
+        if self._window <= 0 or self._window >= self._count:
+            return self.get_mean()
+        return self._window_sum / self._window
+
+    def get_latest(self, number_of_entries):
+        """
+        Returns the last <number_of_entries> entries with the newest entry first. If less entries
+        are present the result is padded with zeros.
+        If number_of_entries does not exceed the padding, a view is returned (no copy).
+
+        @param int number_of_entries: Number of entries to return
+
+        @return numpy.ndarray: Array of shape (number_of_entries, *entry_shape)
+        """
+        number_of_entries = max(0, int(number_of_entries))
+        if number_of_entries > self._padding:
+            self.padding = number_of_entries
+        stop = self._padding + self._count
+        return self._storage[stop - number_of_entries:stop][::-1]
+
+    def _grow(self):
+        capacity = 2 * max(1, self.capacity)
+        storage = np.zeros((self._padding + capacity,) + self._entry_shape, dtype=self._dtype)
+        storage[:self._padding + self._count] = self._storage[:self._padding + self._count]
+        self._storage = storage
+
+    def _recalculate_window_sum(self):
+        if self._window > 0:
+            self._window_sum = np.sum(self.data[-self._window:], axis=0, dtype=np.float64)
+        else:
+            self._window_sum = np.zeros(self._entry_shape, dtype=np.float64)
+
+
+class CircularTrace:
+    """
+    Fixed length ring buffer for multi-channel time traces (e.g. count traces).
+
+    The buffer holds each value twice ("mirrored" storage of twice the trace length) so the trace
+    is always available as a contiguous array in chronological order without rolling any data.
+    Appending a value is O(1) per channel and the chronological trace is just a slice of the
+    storage. Call get_trace only when the trace is actually needed (e.g. for a redraw).
+    """
+
+    def __init__(self, number_of_channels, length, dtype=np.float64):
+        """
+        @param int number_of_channels: Number of channels (rows) of the trace
+        @param int length: Number of values per channel the trace holds
+        @param dtype: numpy dtype of the stored data
+        """
+        self._length = max(1, int(length))
+        self._storage = np.zeros((max(1, int(number_of_channels)), 2 * self._length),
+                                 dtype=dtype)
+        # Index of the oldest value (i.e. the position the next value is written to)
+        self._head = 0
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def number_of_channels(self):
+        return self._storage.shape[0]
+
+    @property
+    def head(self):
+        return self._head
+
+    @property
+    def latest(self):
+        """
+        The most recent value of each channel.
+        """
+        return self._storage[:, self._head + self._length - 1]
+
+    def clear(self):
+        """
+        Sets all values of the trace to 0.
+        """
+        self._storage[:] = 0
+        self._head = 0
+
+    def append(self, values):
+        """
+        Appends new values to the trace and discards the same number of oldest values.
+
+        @param numpy.ndarray values: One value per channel (shape (channels,)) or a block of values
+                                     per channel (shape (channels, n))
+        """
+        values = np.asarray(values)
+        if values.ndim < 2:
+            self._storage[:, self._head] = values
+            self._storage[:, self._head + self._length] = values
+            self._head = (self._head + 1) % self._length
+            return
+        number_of_values = values.shape[1]
+        start = self._head
+        if number_of_values > self._length:
+            start += number_of_values - self._length
+            values = values[:, -self._length:]
+        indices = (start + np.arange(values.shape[1])) % self._length
+        self._storage[:, indices] = values
+        self._storage[:, indices + self._length] = values
+        self._head = (self._head + number_of_values) % self._length
+
+    def set_latest(self, values, number_of_values=1):
+        """
+        Overwrites the <number_of_values> most recent values of each channel.
+
+        @param numpy.ndarray values: One value per channel (shape (channels,))
+        @param int number_of_values: Number of most recent values to overwrite
+        """
+        number_of_values = min(max(0, int(number_of_values)), self._length)
+        indices = (self._head - 1 - np.arange(number_of_values)) % self._length
+        values = np.asarray(values).reshape(-1, 1)
+        self._storage[:, indices] = values
+        self._storage[:, indices + self._length] = values
+
+    def get_trace(self, copy=True):
+        """
+        Returns the trace in chronological order (newest value last).
+
+        @param bool copy: If False a view into the ring storage is returned. The view is contiguous
+                          per channel but its content changes with every append.
+
+        @return numpy.ndarray: The trace with shape (channels, length)
+        """
+        trace = self._storage[:, self._head:self._head + self._length]
+        return trace.copy() if copy else trace
+
+
+class RunningMedian:
+    """
+    Running median over the last <window> values of multiple channels.
+
+    For each channel the values inside the window are kept in a sorted list. Each new value is
+    inserted and the value dropping out of the window is removed by bisection, so no full median
+    has to be calculated per value. The window is initially filled with <initial_value>.
+    """
+
+    def __init__(self, number_of_channels, window, initial_value=0):
+        """
+        @param int number_of_channels: Number of channels
+        @param int window: Number of values to calculate the median of
+        @param float initial_value: Value the window is filled with initially
+        """
+        self._window = max(1, int(window))
+        self._history = [deque([initial_value] * self._window)
+                         for _ in range(max(1, int(number_of_channels)))]
+        self._sorted = [[initial_value] * self._window for _ in self._history]
+
+    @property
+    def window(self):
+        return self._window
+
+    def append(self, values):
+        """
+        Adds one new value per channel to the window and returns the new medians.
+
+        @param numpy.ndarray values: One value per channel (shape (channels,))
+
+        @return numpy.ndarray: The median of each channel
+        """
+        medians = np.empty(len(self._history), dtype=np.float64)
+        middle, odd = divmod(self._window, 2)
+        for channel, value in enumerate(values):
+            value = float(value)
+            history = self._history[channel]
+            window = self._sorted[channel]
+            del window[bisect.bisect_left(window, history.popleft())]
+            bisect.insort(window, value)
+            history.append(value)
+            if odd:
+                medians[channel] = window[middle]
+            else:
+                medians[channel] = 0.5 * (window[middle - 1] + window[middle])
+        return medians
+
+
+class RecordingBuffer:
+    """
+    Growable 2D buffer (rows x columns, e.g. timestamp + channels) for long data recordings.
+
+    Rows are appended to a preallocated array which grows by doubling its size, so appending is
+    amortized O(1). All slices (e.g. the most recent rows) are numpy views without copying.
+
+    If spill_bytes is > 0 the data is moved to a memory mapped temporary file as soon as the buffer
+    would exceed this size. Afterwards the file grows in chunks of spill_bytes without copying the
+    data in memory, so multi-hour recordings do not fill up the RAM.
+    The temporary file is removed on clear/close.
+    """
+
+    def __init__(self, number_of_columns, initial_rows=1024, spill_bytes=0, spill_dir=None,
+                 dtype=np.float64):
+        """
+        @param int number_of_columns: Number of values per row
+        @param int initial_rows: Number of rows to preallocate memory for
+        @param int spill_bytes: Buffer size in bytes from which on the data is stored in a memory
+                                mapped file. 0 means always keep the data in RAM.
+        @param str spill_dir: Directory for the memory mapped file (default: system temp dir)
+        @param dtype: numpy dtype of the stored data
+        """
+        self._number_of_columns = max(1, int(number_of_columns))
+        self._dtype = np.dtype(dtype)
+        self._initial_rows = max(1, int(initial_rows))
+        self._spill_bytes = max(0, int(spill_bytes))
+        self._spill_dir = spill_dir
+        self._spill_file = None
+        self._rows = 0
+        self._storage = np.empty((self._initial_rows, self._number_of_columns), dtype=self._dtype)
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, item):
+        return self.data[item]
+
+    def __del__(self):
+        self._remove_spill_file()
+
+    @property
+    def number_of_columns(self):
+        return self._number_of_columns
+
+    @property
+    def capacity(self):
+        return self._storage.shape[0]
+
+    @property
+    def is_spilled(self):
+        return self._spill_file is not None
+
+    @property
+    def data(self):
+        """
+        View of all recorded rows.
+        """
+        return self._storage[:self._rows]
+
+    def get_tail(self, number_of_rows):
+        """
+        View of the last <number_of_rows> recorded rows (less if not enough rows are recorded).
+
+        @param int number_of_rows: Number of rows to return
+
+        @return numpy.ndarray: The last rows with shape (<=number_of_rows, number_of_columns)
+        """
+        number_of_rows = min(max(0, int(number_of_rows)), self._rows)
+        return self._storage[self._rows - number_of_rows:self._rows]
+
+    def append(self, row):
+        """
+        Appends a single row.
+
+        @param numpy.ndarray row: The values of the row (shape (number_of_columns,))
+        """
+        if self._rows >= self._storage.shape[0]:
+            self._grow(self._rows + 1)
+        self._storage[self._rows] = row
+        self._rows += 1
+
+    def extend(self, rows):
+        """
+        Appends multiple rows.
+
+        @param numpy.ndarray rows: The rows to append (shape (n, number_of_columns))
+        """
+        rows = np.asarray(rows, dtype=self._dtype).reshape(-1, self._number_of_columns)
+        required_rows = self._rows + rows.shape[0]
+        if required_rows > self._storage.shape[0]:
+            self._grow(required_rows)
+        self._storage[self._rows:required_rows] = rows
+        self._rows = required_rows
+
+    def clear(self):
+        """
+        Removes all rows and frees the memory mapped file (if any).
+        """
+        self._storage = np.empty((self._initial_rows, self._number_of_columns), dtype=self._dtype)
+        self._rows = 0
+        self._remove_spill_file()
+
+    def close(self):
+        """
+        Alias for clear. Call to release the resources of the buffer.
+        """
+        self.clear()
+
+    def _grow(self, required_rows):
+        row_bytes = self._number_of_columns * self._dtype.itemsize
+        new_rows = max(required_rows, 2 * self._storage.shape[0])
+        if self._spill_bytes > 0 and new_rows * row_bytes > self._spill_bytes:
+            # Grow file in chunks of spill_bytes
+            chunk_rows = max(1, self._spill_bytes // row_bytes)
+            new_rows = max(required_rows, self._storage.shape[0] + chunk_rows)
+            self._grow_spilled(new_rows)
+            return
+        storage = np.empty((new_rows, self._number_of_columns), dtype=self._dtype)
+        storage[:self._rows] = self._storage[:self._rows]
+        self._storage = storage
+
+    def _grow_spilled(self, new_rows):
+        shape = (new_rows, self._number_of_columns)
+        if self._spill_file is None:
+            self._spill_file = tempfile.NamedTemporaryFile(prefix='qudi_recording_',
+                                                           suffix='.dat',
+                                                           dir=self._spill_dir,
+                                                           delete=False)
+            self._spill_file.close()
+            storage = np.memmap(self._spill_file.name, dtype=self._dtype, mode='w+', shape=shape)
+            storage[:self._rows] = self._storage[:self._rows]
+        else:
+            self._storage.flush()
+            # Map the file again with the larger shape. np.memmap enlarges the file itself by
+            # writing its last byte, the data is not copied. The file is not resized explicitly
+            # (truncate), because this is not supported on Windows while the file is mapped.
+            storage = np.memmap(self._spill_file.name, dtype=self._dtype, mode='r+', shape=shape)
+        self._storage = storage
+
+    def _remove_spill_file(self):
+        spill_file = getattr(self, '_spill_file', None)
+        if spill_file is None:
+            return
+        self._spill_file = None
+        try:
+            os.remove(spill_file.name)
+        except OSError:
+            # Still mapped (e.g. on Windows) or already removed
+            pass
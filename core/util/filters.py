@@ -20,7 +20,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 import numpy as np
-from scipy.ndimage import minimum_filter1d, maximum_filter1d
+from scipy.ndimage import minimum_filter1d, maximum_filter1d, maximum_filter, label, maximum_position
 
 import logging
 logger = logging.getLogger(__name__)
@@ -62,3 +62,85 @@ def scan_blink_correction(image, axis=1):
         np.flip(filt_img, axis), size=2, axis=axis, mode='constant', cval=median)
     # Flip back the image to obtain original orientation and return result.
     return np.flip(filt_img, axis)
+
+
+def find_spots(image, spot_size, threshold, region_threshold=None, max_ellipticity=1.5):
+    """
+    Find round, bright spots (e.g. single emitters in a confocal scan) in a 2D array.
+
+    Spot candidates are the local maxima within a window of spot_size x spot_size pixels that are
+    brighter than threshold. Pixels brighter than region_threshold are grouped into connected
+    regions. The part of the region of a candidate within the window around its maximum is taken as
+    the spot and characterized by its image moments (weighted with the brightness above
+    region_threshold). A candidate is rejected if
+        - the ellipticity (ratio of major to minor axis) of the spot exceeds max_ellipticity or
+        - less than half of its region lies within the window (extended bright structure).
+
+    @param numpy.ndarray image: 2D array to search spots in (e.g. image data)
+    @param int spot_size: size of the spots (diameter) in pixels
+    @param float threshold: minimal brightness of the maximum of a spot
+    @param float region_threshold: optional, minimal brightness of the pixels belonging to a spot.
+                                   Defaults to threshold / 2.
+    @param float max_ellipticity: maximal ratio of major to minor axis of a spot
+
+    @return tuple(numpy.ndarray, numpy.ndarray): positions of the spots (center of mass in pixel
+                                                 coordinates along both axes) with shape (N, 2)
+                                                 and their scores (maximum / threshold) with shape
+                                                 (N,), sorted by descending score.
+    """
+    image = np.asarray(image, dtype=float)
+    if image.ndim != 2:
+        logger.error('Image must be 2D numpy array.')
+        return np.empty((0, 2)), np.empty(0)
+    if region_threshold is None:
+        region_threshold = threshold / 2
+    size = max(int(spot_size), 1)
+    half_size = size // 2
+
+    # Local maxima, each plateau of equal values counts as a single maximum
+    maxima = (image == maximum_filter(image, size=size, mode='nearest')) & (image > threshold)
+    maxima_labels, number_of_maxima = label(maxima)
+    if number_of_maxima == 0:
+        return np.empty((0, 2)), np.empty(0)
+    peaks = np.array(
+        maximum_position(image, maxima_labels, np.arange(1, number_of_maxima + 1)), dtype=int)
+
+    # Connected regions of bright pixels and their size
+    regions, number_of_regions = label(image > region_threshold)
+    region_sizes = np.bincount(regions.ravel(), minlength=number_of_regions + 1)
+
+    # Windows around all peaks, shape (number of peaks, size, size)
+    offsets = np.arange(-half_size, size - half_size)
+    rows = np.clip(peaks[:, 0, np.newaxis] + offsets, 0, image.shape[0] - 1)
+    columns = np.clip(peaks[:, 1, np.newaxis] + offsets, 0, image.shape[1] - 1)
+    window_index = (rows[:, :, np.newaxis], columns[:, np.newaxis, :])
+    peak_regions = regions[peaks[:, 0], peaks[:, 1]]
+    in_region = regions[window_index] == peak_regions[:, np.newaxis, np.newaxis]
+    # Clipped indices at the image border must not be counted twice
+    in_region &= ((peaks[:, 0, np.newaxis] + offsets >= 0)
+                  & (peaks[:, 0, np.newaxis] + offsets < image.shape[0]))[:, :, np.newaxis]
+    in_region &= ((peaks[:, 1, np.newaxis] + offsets >= 0)
+                  & (peaks[:, 1, np.newaxis] + offsets < image.shape[1]))[:, np.newaxis, :]
+    weights = np.where(in_region, image[window_index] - region_threshold, 0)
+
+    # Image moments of the spots
+    total = weights.sum(axis=(1, 2))
+    row_center = (weights.sum(axis=2) * offsets).sum(axis=1) / total
+    column_center = (weights.sum(axis=1) * offsets).sum(axis=1) / total
+    row_offsets = offsets - row_center[:, np.newaxis]
+    column_offsets = offsets - column_center[:, np.newaxis]
+    mu_rr = (weights.sum(axis=2) * row_offsets ** 2).sum(axis=1) / total
+    mu_cc = (weights.sum(axis=1) * column_offsets ** 2).sum(axis=1) / total
+    mu_rc = np.einsum('nij,ni,nj->n', weights, row_offsets, column_offsets) / total
+    # Eigenvalues of the covariance matrix
+    mean = (mu_rr + mu_cc) / 2
+    difference = np.sqrt(((mu_rr - mu_cc) / 2) ** 2 + mu_rc ** 2)
+    minor = np.maximum(mean - difference, 1e-12)
+    ellipticity = np.sqrt((mean + difference) / minor)
+
+    is_spot = ((ellipticity <= max_ellipticity)
+               & (in_region.sum(axis=(1, 2)) >= region_sizes[peak_regions] / 2))
+    positions = np.column_stack((peaks[:, 0] + row_center, peaks[:, 1] + column_center))[is_spot]
+    scores = image[peaks[:, 0], peaks[:, 1]][is_spot] / threshold
+    order = np.argsort(-scores, kind='mergesort')
+    return positions[order], scores[order]
@@ -24,10 +24,126 @@ Originally distributed under MIT/X11 license. See documentation/MITLicense.txt f
 """
 
 from qtpy import QtCore
+import bisect
+import sys
+import threading
+import time
 import traceback
+import weakref
 import logging
 logger = logging.getLogger(__name__)
 
+# Profiling of all Mutex instances. Disabled by default, see set_mutex_profiling.
+_profiling = {'enabled': False, 'sample_interval': 16}
+_all_mutexes = weakref.WeakSet()
+
+
+def set_mutex_profiling(enabled, sample_interval=None):
+    """ Enable or disable recording of lock statistics for all Mutex instances.
+
+        @param bool enabled: record statistics if True
+        @param int sample_interval: optional, measure the hold time of every n-th acquisition
+    """
+    if sample_interval is not None:
+        _profiling['sample_interval'] = max(1, int(sample_interval))
+    _profiling['enabled'] = bool(enabled)
+
+
+def is_mutex_profiling_enabled():
+    """ @return bool: True if lock statistics are recorded
+    """
+    return _profiling['enabled']
+
+
+def get_mutex_statistics():
+    """ Get the lock statistics of all existing Mutex instances that have been acquired while
+        profiling was enabled, sorted by total wait time (longest first).
+
+        @return list: dicts with the statistics (see MutexStatistics.to_dict)
+    """
+    statistics = [mutex.statistics.to_dict() for mutex in list(_all_mutexes)
+                  if mutex.statistics.acquisitions > 0]
+    statistics.sort(key=lambda entry: entry['wait_total'], reverse=True)
+    return statistics
+
+
+def reset_mutex_statistics():
+    """ Reset the lock statistics of all Mutex instances.
+    """
+    for mutex in list(_all_mutexes):
+        mutex.statistics.reset()
+
+
+class MutexStatistics:
+    """ Acquisition statistics of a single Mutex.
+
+    Every acquisition with Mutex.lock (and the context manager) is counted. The wait time is
+    measured for all contended acquisitions (i.e. the mutex was locked by another thread), the
+    hold time only for every n-th acquisition (sample_interval), so the overhead of uncontended
+    locking stays small. All values are updated while the mutex is held, so no extra lock is needed.
+    """
+    # Upper edges of the histogram bins in seconds
+    histogram_edges = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1, 10, float('inf'))
+    histogram_labels = ('<10us', '<100us', '<1ms', '<10ms', '<100ms', '<1s', '<10s', '>10s')
+
+    def __init__(self, name):
+        """
+            @param str name: name of the mutex (e.g. the place it has been created)
+        """
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        """ Set all statistics to zero.
+        """
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_histogram = [0] * len(self.histogram_edges)
+        self.waiting_threads = dict()
+        self.hold_samples = 0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+        self.hold_histogram = [0] * len(self.histogram_edges)
+
+    def record_wait(self, wait_time, thread_name):
+        """ Record a contended acquisition.
+
+            @param float wait_time: time waited for the mutex in seconds
+            @param str thread_name: name of the waiting thread
+        """
+        self.contended += 1
+        self.wait_total += wait_time
+        self.wait_max = max(self.wait_max, wait_time)
+        self.wait_histogram[bisect.bisect_left(self.histogram_edges, wait_time)] += 1
+        self.waiting_threads[thread_name] = self.waiting_threads.get(thread_name, 0) + wait_time
+
+    def record_hold(self, hold_time):
+        """ Record the hold time of a sampled acquisition.
+
+            @param float hold_time: time the mutex was held in seconds
+        """
+        self.hold_samples += 1
+        self.hold_total += hold_time
+        self.hold_max = max(self.hold_max, hold_time)
+        self.hold_histogram[bisect.bisect_left(self.histogram_edges, hold_time)] += 1
+
+    def to_dict(self):
+        """ @return dict: copy of the statistics
+        """
+        return {'name': self.name,
+                'acquisitions': self.acquisitions,
+                'contended': self.contended,
+                'wait_total': self.wait_total,
+                'wait_max': self.wait_max,
+                'wait_histogram': dict(zip(self.histogram_labels, self.wait_histogram)),
+                'waiting_threads': dict(self.waiting_threads),
+                'hold_samples': self.hold_samples,
+                'hold_mean': self.hold_total / self.hold_samples if self.hold_samples else 0.0,
+                'hold_max': self.hold_max,
+                'hold_histogram': dict(zip(self.histogram_labels, self.hold_histogram))}
+
 
 class Mutex(QtCore.QMutex):
     """Extends QMutex (which serves as access serialization between threads).
@@ -37,6 +153,8 @@ class Mutex(QtCore.QMutex):
       (if initialized with debug=True)
     * Drop-in replacement for threading.Lock
     * Context management (enter/exit)
+    * Lock statistics (acquisitions, wait and hold times) if profiling is enabled
+      (see set_mutex_profiling)
     """
 
     def __init__(self, *args, **kargs):
@@ -46,6 +164,18 @@ class Mutex(QtCore.QMutex):
         self.mutex = QtCore.QMutex()  # for serializing access to self.tb
         self.tb = []
         self.debug = kargs.pop('debug', False)  # True to enable debugging functions
+        name = kargs.pop('name', None)
+        if name is None:
+            # name the mutex after the place it has been created
+            frame = sys._getframe(1)
+            while frame.f_back is not None and frame.f_code.co_name == '__init__' and (
+                    frame.f_code.co_filename == __file__):
+                frame = frame.f_back
+            name = '{0}:{1}'.format(frame.f_code.co_filename, frame.f_lineno)
+        self.statistics = MutexStatistics(name)
+        # start times of the sampled acquisitions currently held (profiling only)
+        self._hold_start_times = []
+        _all_mutexes.add(self)
 
     def tryLock(self, timeout=None, id=None):
         """ Try to lock  the mutex.
@@ -72,6 +202,40 @@ class Mutex(QtCore.QMutex):
         return locked
 
     def lock(self, id=None):
+        """ Lock mutex. Will try again every 5 seconds.
+
+            @param id: debug id
+        """
+        if _profiling['enabled']:
+            self._profiled_lock(id)
+        else:
+            self._lock(id)
+
+    def _profiled_lock(self, id=None):
+        """ Lock mutex and record the lock statistics.
+
+            @param id: debug id
+        """
+        if self.tryLock(None, id):
+            wait_time = 0
+        else:
+            start_time = time.perf_counter()
+            self._lock(id)
+            wait_time = time.perf_counter() - start_time
+        # the mutex is held now, statistics are updated exclusively
+        statistics = self.statistics
+        statistics.acquisitions += 1
+        if wait_time:
+            thread_name = QtCore.QThread.currentThread().objectName()
+            if not thread_name:
+                thread_name = threading.current_thread().name
+            statistics.record_wait(wait_time, thread_name)
+        if statistics.acquisitions % _profiling['sample_interval'] == 0:
+            self._hold_start_times.append(time.perf_counter())
+        else:
+            self._hold_start_times.append(None)
+
+    def _lock(self, id=None):
         """ Lock mutex. Will try again every 5 seconds.
 
             @param id: debug id
@@ -98,6 +262,10 @@ class Mutex(QtCore.QMutex):
     def unlock(self):
         """ Unlock mutex.
         """
+        if self._hold_start_times:
+            start_time = self._hold_start_times.pop()
+            if start_time is not None:
+                self.statistics.record_hold(time.perf_counter() - start_time)
         QtCore.QMutex.unlock(self)
         if self.debug:
             self.mutex.lock()
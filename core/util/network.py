@@ -19,14 +19,268 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import logging
+import socket
+import threading
+import time
+import uuid
+import weakref
+import numpy as np
+import rpyc
 import rpyc.core.netref
 import rpyc.utils.classic
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
+
+logger = logging.getLogger(__name__)
+
+# Arrays smaller than this are transferred by pickling (rpyc obtain)
+ARRAY_TRANSFER_MIN_BYTES = 1 << 16
+# Chunk size for transferring array data over the network
+ARRAY_TRANSFER_CHUNK_BYTES = 1 << 24
 
 
 def netobtain(obj):
-    """
+    """ Transfers a remote object (rpyc netref) by value to the local side.
+    Large numpy arrays shared by a qudi remote module server are transferred via shared memory (if
+    client and server run on the same host) or as raw buffer in chunks. All other objects are
+    pickled.
+
+    @param object obj: a remote (netref) or local object
+
+    @return object: local copy of the remote object or the object itself if it is not remote
     """
     if isinstance(obj, rpyc.core.netref.BaseNetref):
+        array = obtain_array(obj)
+        if array is not None:
+            return array
         return rpyc.utils.classic.obtain(obj)
     else:
         return obj
+
+
+def get_host_id():
+    """ Identifier of this host used to check if shared memory can be used between two processes.
+
+    @return str: the host identifier
+    """
+    return socket.gethostname()
+
+
+def _is_remote_ndarray(netref):
+    try:
+        class_name = object.__getattribute__(netref, '____id_pack__')[0]
+    except AttributeError:
+        class_name = type(netref).__name__
+    return class_name.split('.')[-1] in ('ndarray', 'memmap')
+
+
+def _get_connection(netref):
+    connection = object.__getattribute__(netref, '____conn__')
+    if isinstance(connection, weakref.ref):
+        connection = connection()
+    return connection
+
+
+def obtain_array(netref):
+    """ Transfers a remote numpy array via the array export of the qudi remote module service.
+
+    @param netref: rpyc netref of the remote object
+
+    @return numpy.ndarray: local copy of the array, None if netref is no (large) array or the
+                           remote side does not support the array export
+    """
+    if not _is_remote_ndarray(netref):
+        return None
+    try:
+        root = _get_connection(netref).root
+        header = root.export_array(netref, get_host_id() if shared_memory is not None else None)
+    except AttributeError:
+        # Remote service does not provide the array export
+        return None
+    if header is None:
+        return None
+    token, shm_name, shape, dtype, nbytes = header
+    shape = tuple(shape)
+    dtype = np.dtype(dtype)
+    try:
+        array = None
+        if shm_name is not None:
+            array = _read_shared_memory(shm_name, shape, dtype)
+        if array is None:
+            array = np.empty(shape, dtype=dtype)
+            buffer = array.reshape(-1).view(np.uint8)
+            for start in range(0, nbytes, ARRAY_TRANSFER_CHUNK_BYTES):
+                stop = min(start + ARRAY_TRANSFER_CHUNK_BYTES, nbytes)
+                chunk = root.get_array_chunk(token, start, stop)
+                if chunk is None:
+                    # Export has been dropped by the server. Fall back to pickling the array.
+                    return None
+                buffer[start:stop] = np.frombuffer(chunk, dtype=np.uint8)
+    finally:
+        # Do not wait for the server to release the export
+        rpyc.async_(root.release_array)(token)
+    return array
+
+
+def _read_shared_memory(name, shape, dtype):
+    try:
+        segment = shared_memory.SharedMemory(name=name)
+    except (FileNotFoundError, OSError):
+        return None
+    try:
+        _untrack_shared_memory(segment)
+        array = np.empty(shape, dtype=dtype)
+        array.reshape(-1).view(np.uint8)[:] = np.frombuffer(segment.buf,
+                                                            dtype=np.uint8,
+                                                            count=array.nbytes)
+    finally:
+        segment.close()
+    return array
+
+
+def _untrack_shared_memory(segment):
+    """ Attaching to a segment registers it with the resource tracker which would unlink it when this
+    process exits. The segment is owned by the exporting process, so unregister it again.
+    """
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    except (ImportError, AttributeError, KeyError):
+        pass
+
+
+class ArrayExporter:
+    """ Server side of the array transport used by netobtain.
+
+    Exported arrays are copied into a pooled named shared memory segment if the client runs on the
+    same host. Otherwise a snapshot of the raw array data is kept until the client has fetched it in
+    chunks. Each export has to be released by the client. Exports not released within
+    lease_timeout seconds (e.g. disconnected clients) are released on the next export.
+    """
+
+    def __init__(self, max_pooled_bytes=1 << 30, lease_timeout=60):
+        """
+        @param int max_pooled_bytes: max. size of unused shared memory segments kept for reuse
+        @param float lease_timeout: time in seconds after which an unreleased export is dropped
+        """
+        self.max_pooled_bytes = int(max_pooled_bytes)
+        self.lease_timeout = lease_timeout
+        self._lock = threading.Lock()
+        self._free_segments = list()
+        self._exports = dict()
+
+    def export_array(self, array, host_id):
+        """ Prepares an array for transfer.
+
+        @param numpy.ndarray array: the array to export
+        @param str host_id: host identifier of the client, None if it can not use shared memory
+
+        @return tuple: (token, shared memory name or None, shape, dtype string, nbytes) or None if
+                       the array should just be pickled
+        """
+        if not isinstance(array, np.ndarray) or array.dtype.hasobject:
+            return None
+        if array.nbytes < ARRAY_TRANSFER_MIN_BYTES:
+            return None
+        array = np.ascontiguousarray(array)
+        header_args = (tuple(int(dim) for dim in array.shape), array.dtype.str, int(array.nbytes))
+        self._drop_expired()
+        if shared_memory is not None and host_id == get_host_id():
+            segment = self._acquire_segment(array.nbytes)
+            np.frombuffer(segment.buf, dtype=np.uint8, count=array.nbytes)[:] = \
+                array.reshape(-1).view(np.uint8)
+            token = segment.name
+            with self._lock:
+                self._exports[token] = (time.monotonic(), segment)
+            return (token, segment.name) + header_args
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._exports[token] = (time.monotonic(), array.tobytes())
+        return (token, None) + header_args
+
+    def get_array_chunk(self, token, start, stop):
+        """ Returns a part of the raw data of an exported array.
+        Also used for arrays exported via shared memory if the client can not attach to the
+        segment (e.g. same host name but different machine or container).
+
+        @param str token: the export token
+        @param int start: first byte
+        @param int stop: last byte (exclusive)
+
+        @return bytes: the raw data, None if the export has already been released or dropped
+        """
+        with self._lock:
+            export = self._exports.get(token)
+            if export is None:
+                logger.warning('Requested data of an array export that has already been released.')
+                return None
+            # Fetching a chunk renews the lease of the export
+            self._exports[token] = (time.monotonic(), export[1])
+            if isinstance(export[1], bytes):
+                return export[1][start:stop]
+            # Copy while holding the lock, so the segment can not be released and reused meanwhile
+            return bytes(export[1].buf[start:stop])
+
+    def release_array(self, token):
+        """ Releases an exported array after it has been transferred.
+
+        @param str token: the export token
+        """
+        with self._lock:
+            export = self._exports.pop(token, None)
+        if export is not None and not isinstance(export[1], bytes):
+            self._release_segment(export[1])
+
+    def close(self):
+        """ Frees all shared memory segments.
+        """
+        with self._lock:
+            segments = self._free_segments + [export[1] for export in self._exports.values()
+                                              if not isinstance(export[1], bytes)]
+            self._free_segments = list()
+            self._exports = dict()
+        for segment in segments:
+            self._unlink(segment)
+
+    def _acquire_segment(self, nbytes):
+        with self._lock:
+            fitting = [seg for seg in self._free_segments if seg.size >= nbytes]
+            if fitting:
+                segment = min(fitting, key=lambda seg: seg.size)
+                self._free_segments.remove(segment)
+                return segment
+        # Round size up to the next power of 2 to make segments reusable for similar arrays
+        size = 1 << max(20, int(nbytes - 1).bit_length())
+        return shared_memory.SharedMemory(create=True, size=size)
+
+    def _release_segment(self, segment):
+        with self._lock:
+            self._free_segments.append(segment)
+            pooled_bytes = sum(seg.size for seg in self._free_segments)
+            dropped = list()
+            while self._free_segments and pooled_bytes > self.max_pooled_bytes:
+                dropped.append(self._free_segments.pop(0))
+                pooled_bytes -= dropped[-1].size
+        for segment in dropped:
+            self._unlink(segment)
+
+    def _drop_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [token for token, export in self._exports.items()
+                       if now - export[0] > self.lease_timeout]
+        for token in expired:
+            logger.warning('Exported array was not released by the client in time.')
+            self.release_array(token)
+
+    @staticmethod
+    def _unlink(segment):
+        try:
+            segment.close()
+            segment.unlink()
+        except (FileNotFoundError, OSError):
+            pass
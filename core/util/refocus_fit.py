@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a fast fitter of the 2D and 1D gaussians of the optimizer refocus scans and
+the step estimation of the tracking refocus.
+
+The initial parameters are estimated from the moments of the background corrected data and the
+Levenberg-Marquardt optimization of core.util.batch_fit with analytic Jacobians is used. The
+iteration stops early as soon as the chi square does not improve significantly any more.
+The results mimic the lmfit ModelResult attributes used by the optimizer (success, best_values,
+best_fit, eval).
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+from collections import OrderedDict
+
+from core.util.batch_fit import BatchModel, GaussianModel, levenberg_marquardt
+
+
+class RefocusFitResult:
+    """ Result of a refocus fit with the attributes of an lmfit ModelResult used by the optimizer.
+    """
+
+    def __init__(self, success, best_values, best_fit, chisqr, function):
+        """
+        @param bool success: True if the fit converged to a valid gaussian
+        @param OrderedDict best_values: fitted parameter values
+        @param numpy.ndarray best_fit: model evaluated at the fitted parameters
+        @param float chisqr: sum of squared residuals
+        @param callable function: model with the fitted parameters as function of x
+        """
+        self.success = success
+        self.best_values = best_values
+        self.best_fit = best_fit
+        self.chisqr = chisqr
+        self._function = function
+
+    def eval(self, x):
+        """ Evaluate the fitted model.
+
+        @param numpy.ndarray x: x values (tuple of x and y values for the 2D gaussian)
+
+        @return numpy.ndarray: model values
+        """
+        return self._function(x)
+
+
+class TwoDGaussianModel(BatchModel):
+    """ amplitude * exp(-(a * du**2 + 2 * b * du * dv + c * dv**2)) + offset with
+    du = u - center_x and dv = v - center_y.
+
+    The coefficients a, b and c of the quadratic form are fitted instead of sigma_x, sigma_y and
+    theta, which keeps the derivatives simple and avoids the degeneracy of theta for round spots.
+    The x values are given as array of shape (2, points) with the u and v coordinates.
+    """
+    param_names = ('amplitude', 'center_x', 'center_y', 'a', 'b', 'c', 'offset')
+
+    @staticmethod
+    def function(x, params):
+        amplitude, center_x, center_y, a, b, c, offset = (params.T[:, :, np.newaxis])
+        du = x[0] - center_x
+        dv = x[1] - center_y
+        return amplitude * np.exp(-(a * du ** 2 + 2 * b * du * dv + c * dv ** 2)) + offset
+
+    @staticmethod
+    def jacobian(x, params):
+        amplitude, center_x, center_y, a, b, c, offset = (params.T[:, :, np.newaxis])
+        du = x[0] - center_x
+        dv = x[1] - center_y
+        gaussian = np.exp(-(a * du ** 2 + 2 * b * du * dv + c * dv ** 2))
+        scaled = amplitude * gaussian
+        return np.stack((gaussian,
+                         2 * scaled * (a * du + b * dv),
+                         2 * scaled * (b * du + c * dv),
+                         -scaled * du ** 2,
+                         -2 * scaled * du * dv,
+                         -scaled * dv ** 2,
+                         np.ones_like(gaussian)),
+                        axis=2)
+
+    @staticmethod
+    def estimate(x, data):
+        params = np.empty((data.shape[0], 7))
+        for row, row_data in enumerate(data):
+            offset, amplitude, center, covariance = _estimate_moments(x, row_data)
+            a, b, c = _get_quadratic_form(covariance)
+            params[row] = (amplitude, center[0], center[1], a, b, c, offset)
+        return params
+
+
+def _estimate_moments(x, data):
+    """ Estimate offset, amplitude, center and covariance of a single peak from the moments of the
+    data above the background.
+
+    @param numpy.ndarray x: coordinates with shape (dimensions, points)
+    @param numpy.ndarray data: data with shape (points,)
+
+    @return tuple: offset, amplitude, center with shape (dimensions,) and covariance with shape
+                   (dimensions, dimensions)
+    """
+    offset = np.percentile(data, 20)
+    amplitude = data.max() - offset
+    # Only pixels above the background contribute, so noise far away from the peak does not
+    # broaden the estimate
+    weights = np.clip(data - offset - 0.1 * amplitude, 0, None)
+    if weights.sum() <= 0:
+        weights = np.ones_like(data)
+    weights = weights / weights.sum()
+    center = np.dot(x, weights)
+    distance = x - center[:, np.newaxis]
+    covariance = np.dot(distance * weights, distance.T)
+    # The covariance is at least the pixel size to keep the estimate regular
+    steps = np.array([np.diff(np.unique(axis)).min() if np.unique(axis).size > 1 else 1.
+                      for axis in x])
+    covariance += np.diag(steps ** 2 / 4)
+    return offset, amplitude, center, covariance
+
+
+def _get_quadratic_form(covariance):
+    """ Coefficients a, b, c of the exponent of a 2D gaussian with the given covariance.
+    """
+    precision = np.linalg.inv(covariance) / 2
+    return precision[0, 0], precision[0, 1], precision[1, 1]
+
+
+def _get_sigmas_and_theta(a, b, c):
+    """ Convert the coefficients of the quadratic form to sigma_x, sigma_y and theta as defined by
+    the twoDgaussian model of the FitLogic. theta is chosen such that sigma_x is the width closer
+    to the x axis.
+
+    @return tuple(float, float, float): sigma_x, sigma_y, theta in [0, pi)
+    """
+    mean = a + c
+    difference = np.sqrt((a - c) ** 2 + 4 * b ** 2)
+    # direction of the eigenvector with the larger eigenvalue of the precision matrix
+    angle = 0.5 * np.arctan2(2 * b, a - c)
+    precision_x = mean + difference
+    if abs(angle) > np.pi / 4:
+        angle -= np.sign(angle) * np.pi / 2
+        precision_x = mean - difference
+    precision_y = 2 * mean - precision_x
+    sigma_x = 1 / np.sqrt(precision_x)
+    sigma_y = 1 / np.sqrt(precision_y)
+    return sigma_x, sigma_y, (-angle) % np.pi
+
+
+def fit_twoDgaussian(x_axis, y_axis, data, max_iterations=50, tolerance=1e-6):
+    """ Fit a 2D gaussian with offset to scattered data, e.g. the flattened xy refocus image.
+
+    @param numpy.ndarray x_axis: x coordinates of the data points with shape (points,)
+    @param numpy.ndarray y_axis: y coordinates of the data points with shape (points,)
+    @param numpy.ndarray data: data with shape (points,)
+    @param int max_iterations: maximal number of Levenberg-Marquardt iterations
+    @param float tolerance: relative change of the chi square to stop the iteration
+
+    @return RefocusFitResult: result with the best_values amplitude, center_x, center_y, sigma_x,
+                              sigma_y, theta and offset like the twoDgaussian fit of the FitLogic
+    """
+    x = np.array((np.ravel(x_axis), np.ravel(y_axis)), dtype=float)
+    data = np.asarray(data, dtype=float).ravel()
+    # Coordinates relative to the scan center and in units of the scan size keep the linear
+    # system of the optimization well conditioned
+    origin = x.mean(axis=1)
+    scale = np.maximum(np.ptp(x, axis=1), 1e-300)
+    x_scaled = (x - origin[:, np.newaxis]) / scale[:, np.newaxis]
+
+    params = TwoDGaussianModel.estimate(x_scaled, data[np.newaxis])
+    params, chi_square, converged = levenberg_marquardt(
+        TwoDGaussianModel, x_scaled, data[np.newaxis], params,
+        max_iterations=max_iterations, tolerance=tolerance)
+    amplitude, center_x, center_y, a, b, c, offset = params[0]
+    best_fit = TwoDGaussianModel.function(x_scaled, params)[0]
+
+    # The quadratic form has to be positive definite for a peak
+    success = bool(converged[0] and np.all(np.isfinite(params)) and a > 0 and a * c > b ** 2)
+    if success:
+        sigma_x, sigma_y, theta = _get_sigmas_and_theta(a / scale[0] ** 2,
+                                                        b / (scale[0] * scale[1]),
+                                                        c / scale[1] ** 2)
+    else:
+        sigma_x, sigma_y, theta = 0., 0., 0.
+
+    best_values = OrderedDict()
+    best_values['amplitude'] = amplitude
+    best_values['center_x'] = origin[0] + center_x * scale[0]
+    best_values['center_y'] = origin[1] + center_y * scale[1]
+    best_values['sigma_x'] = sigma_x
+    best_values['sigma_y'] = sigma_y
+    best_values['theta'] = theta
+    best_values['offset'] = offset
+
+    def function(xy):
+        xy_scaled = (np.array([np.ravel(axis) for axis in xy], dtype=float)
+                     - origin[:, np.newaxis]) / scale[:, np.newaxis]
+        return TwoDGaussianModel.function(xy_scaled, params)[0]
+
+    return RefocusFitResult(success, best_values, best_fit, chi_square[0], function)
+
+
+def fit_gaussian(x_axis, data, max_iterations=50, tolerance=1e-6):
+    """ Fit a 1D gaussian peak with offset, e.g. to the z refocus line.
+
+    @param numpy.ndarray x_axis: x values with shape (points,)
+    @param numpy.ndarray data: data with shape (points,)
+    @param int max_iterations: maximal number of Levenberg-Marquardt iterations
+    @param float tolerance: relative change of the chi square to stop the iteration
+
+    @return RefocusFitResult: result with the best_values amplitude, center, sigma and offset
+    """
+    x_axis = np.asarray(x_axis, dtype=float)
+    data = np.asarray(data, dtype=float)
+    origin = x_axis.mean()
+    scale = max(np.ptp(x_axis), 1e-300)
+    x_scaled = (x_axis - origin) / scale
+
+    offset, amplitude, center, covariance = _estimate_moments(x_scaled[np.newaxis], data)
+    params = np.array([[amplitude, center[0], np.sqrt(covariance[0, 0]), offset]])
+    params, chi_square, converged = levenberg_marquardt(
+        GaussianModel, x_scaled, data[np.newaxis], params,
+        max_iterations=max_iterations, tolerance=tolerance)
+    params = GaussianModel.finalize(params)
+    amplitude, center, sigma, offset = params[0]
+    best_fit = GaussianModel.function(x_scaled, params)[0]
+
+    success = bool(converged[0] and np.all(np.isfinite(params)) and sigma > 0)
+
+    best_values = OrderedDict()
+    best_values['amplitude'] = amplitude
+    best_values['center'] = origin + center * scale
+    best_values['sigma'] = sigma * scale
+    best_values['offset'] = offset
+
+    def function(x):
+        return GaussianModel.function((np.asarray(x, dtype=float) - origin) / scale, params)[0]
+
+    return RefocusFitResult(success, best_values, best_fit, chi_square[0], function)
+
+
+def estimate_peak_step(offsets, counts, max_step):
+    """ Estimate the step towards the maximum of the counts sampled at a few points around the
+    current position (e.g. the corners and center of a hexagon) from a local quadratic fit.
+
+    If the fitted quadratic has a maximum the step points to it, otherwise (far from the peak) the
+    step follows the gradient. The length of the step is limited to max_step.
+
+    @param numpy.ndarray offsets: sample positions relative to the current position with shape
+                                  (points, dimensions)
+    @param numpy.ndarray counts: counts at the sample positions with shape (points,)
+    @param float max_step: maximal length of the step, usually the size of the sample pattern
+
+    @return tuple(numpy.ndarray, bool): step with shape (dimensions,) and True if the step
+                                        points to the maximum of the quadratic
+    """
+    offsets = np.asarray(offsets, dtype=float) / max_step
+    counts = np.asarray(counts, dtype=float)
+    dimensions = offsets.shape[1]
+    pairs = [(i, j) for i in range(dimensions) for j in range(i, dimensions)]
+    design = np.column_stack([np.ones(offsets.shape[0])]
+                             + [offsets[:, i] for i in range(dimensions)]
+                             + [offsets[:, i] * offsets[:, j] for i, j in pairs])
+    coefficients = np.linalg.lstsq(design, counts, rcond=None)[0]
+    gradient = coefficients[1:1 + dimensions]
+    hessian = np.zeros((dimensions, dimensions))
+    for (i, j), coefficient in zip(pairs, coefficients[1 + dimensions:]):
+        if i == j:
+            hessian[i, i] = 2 * coefficient
+        else:
+            hessian[i, j] = hessian[j, i] = coefficient
+
+    at_maximum = bool(np.all(np.linalg.eigvalsh(hessian) < 0))
+    if at_maximum:
+        step = -np.linalg.solve(hessian, gradient)
+    else:
+        norm = np.sqrt(np.sum(gradient ** 2))
+        step = gradient / norm if norm > 0 else np.zeros(dimensions)
+    length = np.sqrt(np.sum(step ** 2))
+    if length > 1:
+        step = step / length
+        at_maximum = False
+    return step * max_step, at_maximum
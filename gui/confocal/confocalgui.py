@@ -504,6 +504,7 @@ class ConfocalGui(GUIBase):
         self._scanning_logic.signal_save_started.connect(self.logic_started_save)
         self._scanning_logic.signal_xy_data_saved.connect(self.logic_finished_save)
         self._scanning_logic.signal_depth_data_saved.connect(self.logic_finished_save)
+        self._scanning_logic.signal_save_failed.connect(self.logic_finished_save)
         self._scanning_logic.signal_continue_scanning.connect(self.logic_continued_scanning)
         self._optimizer_logic.sigRefocusStarted.connect(self.logic_started_refocus)
         # self._scanning_logic.signal_stop_scanning.connect()
@@ -923,6 +924,7 @@ class ConfocalGui(GUIBase):
         self._optimizer_logic.return_slowness = self._osd.return_slow_SpinBox.value()
         self._optimizer_logic.hw_settle_time = self._osd.hw_settle_time_SpinBox.value() / 1000
         self._optimizer_logic.do_surface_subtraction = self._osd.do_surface_subtraction_CheckBox.isChecked()
+        self._optimizer_logic.tracking_mode = self._osd.tracking_mode_CheckBox.isChecked()
         index = self._osd.opt_channel_ComboBox.currentIndex()
         self._optimizer_logic.opt_channel = int(self._osd.opt_channel_ComboBox.itemData(index, QtCore.Qt.UserRole))
 
@@ -945,6 +947,7 @@ class ConfocalGui(GUIBase):
         self._osd.return_slow_SpinBox.setValue(self._optimizer_logic.return_slowness)
         self._osd.hw_settle_time_SpinBox.setValue(self._optimizer_logic.hw_settle_time * 1000)
         self._osd.do_surface_subtraction_CheckBox.setChecked(self._optimizer_logic.do_surface_subtraction)
+        self._osd.tracking_mode_CheckBox.setChecked(self._optimizer_logic.tracking_mode)
 
         old_ch = self._optimizer_logic.opt_channel
         index = self._osd.opt_channel_ComboBox.findData(old_ch)
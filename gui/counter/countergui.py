@@ -236,28 +236,29 @@ class CounterGui(GUIBase):
         """
 
         if self._counting_logic.module_state() == 'locked':
-            if 0 < self._counting_logic.countdata_smoothed[(self._display_trace-1), -1] < 10:
-                self._mw.count_value_Label.setText(
-                    '{0:,.6f}'.format(self._counting_logic.countdata_smoothed[(self._display_trace-1), -1]))
+            latest_value = self._counting_logic.countdata_smoothed_latest[self._display_trace - 1]
+            if 0 < latest_value < 10:
+                self._mw.count_value_Label.setText('{0:,.6f}'.format(latest_value))
             else:
-                self._mw.count_value_Label.setText(
-                    '{0:,.0f}'.format(self._counting_logic.countdata_smoothed[(self._display_trace-1), -1]))
+                self._mw.count_value_Label.setText('{0:,.0f}'.format(latest_value))
 
             x_vals = (
                 np.arange(0, self._counting_logic.get_count_length())
                 / self._counting_logic.get_count_frequency())
 
+            # fetch each trace only once per redraw, every access copies the trace buffer
+            countdata = self._counting_logic.countdata
+            countdata_smoothed = self._counting_logic.countdata_smoothed
+
             ymax = -1
             ymin = 2000000000
             for i, ch in enumerate(self._counting_logic.get_channels()):
-                self.curves[2 * i].setData(y=self._counting_logic.countdata[i], x=x_vals)
-                self.curves[2 * i + 1].setData(y=self._counting_logic.countdata_smoothed[i],
-                                               x=x_vals
-                                               )
-                if ymax < self._counting_logic.countdata[i].max() and self._trace_selection[i]:
-                    ymax = self._counting_logic.countdata[i].max()
-                if ymin > self._counting_logic.countdata[i].min() and self._trace_selection[i]:
-                    ymin = self._counting_logic.countdata[i].min()
+                self.curves[2 * i].setData(y=countdata[i], x=x_vals)
+                self.curves[2 * i + 1].setData(y=countdata_smoothed[i], x=x_vals)
+                if ymax < countdata[i].max() and self._trace_selection[i]:
+                    ymax = countdata[i].max()
+                if ymin > countdata[i].min() and self._trace_selection[i]:
+                    ymin = countdata[i].min()
 
             if ymin == ymax:
                 ymax += 0.1
@@ -27,6 +27,8 @@ import os
 from collections import OrderedDict
 from core.statusvariable import StatusVar
 from core.util.modules import get_main_dir
+from core.util.mutex import get_mutex_statistics, is_mutex_profiling_enabled
+from core.util.mutex import reset_mutex_statistics, set_mutex_profiling
 from .errordialog import ErrorDialog
 from gui.guibase import GUIBase
 from qtpy import QtCore, QtWidgets, uic
@@ -164,6 +166,10 @@ class ManagerGui(GUIBase):
         self.startIPythonWidget()
         # thread widget
         self._mw.threadWidget.threadListView.setModel(self._manager.tm)
+        self._mw.threadWidget.mutexProfilingCheckBox.setChecked(is_mutex_profiling_enabled())
+        self._mw.threadWidget.mutexProfilingCheckBox.toggled.connect(set_mutex_profiling)
+        self._mw.threadWidget.mutexResetButton.clicked.connect(self.resetMutexStatistics)
+        self.checkTimer.timeout.connect(self.updateMutexStatistics)
         # remote widget
         # hide remote menu item if rpyc is not available
         self._mw.actionRemoteView.setVisible(self._manager.rm is not None)
@@ -192,8 +198,7 @@ class ManagerGui(GUIBase):
         self.stopIPythonWidget()
         self.stopIPython()
         self.checkTimer.stop()
-        if len(self.modlist) > 0:
-            self.checkTimer.timeout.disconnect()
+        self.checkTimer.timeout.disconnect()
         self.sigStartModule.disconnect()
         self.sigReloadModule.disconnect()
         self.sigStopModule.disconnect()
@@ -205,6 +210,8 @@ class ManagerGui(GUIBase):
         self._mw.action_Load_all_modules.triggered.disconnect()
         self._mw.actionAbout_Qt.triggered.disconnect()
         self._mw.actionAbout_Qudi.triggered.disconnect()
+        self._mw.threadWidget.mutexProfilingCheckBox.toggled.disconnect()
+        self._mw.threadWidget.mutexResetButton.clicked.disconnect()
         self.saveWindowPos(self._mw)
         self._mw.close()
 
@@ -215,6 +222,50 @@ class ManagerGui(GUIBase):
         self._mw.activateWindow()
         self._mw.raise_()
 
+    def updateMutexStatistics(self):
+        """ Show the lock statistics of all mutexes in the thread widget.
+        """
+        if not self._mw.threadDockWidget.isVisible() or not is_mutex_profiling_enabled():
+            return
+        headers = ('Mutex', 'Acquisitions', 'Contended', 'Wait total (s)', 'Wait max (ms)',
+                   'Hold mean (ms)', 'Hold max (ms)', 'Wait histogram', 'Waiting threads')
+        statistics = get_mutex_statistics()
+        main_dir = get_main_dir()
+        table = self._mw.threadWidget.mutexTableWidget
+        table.setSortingEnabled(False)
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setRowCount(len(statistics))
+        for row, entry in enumerate(statistics):
+            name = entry['name']
+            if name.startswith(main_dir):
+                name = os.path.relpath(name, main_dir)
+            waiting_threads = sorted(entry['waiting_threads'].items(),
+                                     key=lambda item: item[1],
+                                     reverse=True)
+            values = (name,
+                      entry['acquisitions'],
+                      entry['contended'],
+                      round(entry['wait_total'], 3),
+                      round(entry['wait_max'] * 1e3, 3),
+                      round(entry['hold_mean'] * 1e3, 3),
+                      round(entry['hold_max'] * 1e3, 3),
+                      ' '.join('{0}: {1}'.format(label, count)
+                               for label, count in entry['wait_histogram'].items() if count),
+                      ', '.join('{0} ({1:.3f} s)'.format(thread, wait)
+                                for thread, wait in waiting_threads))
+            for column, value in enumerate(values):
+                item = QtWidgets.QTableWidgetItem()
+                item.setData(QtCore.Qt.DisplayRole, value)
+                table.setItem(row, column, item)
+        table.setSortingEnabled(True)
+
+    def resetMutexStatistics(self):
+        """ Reset the lock statistics of all mutexes and clear the table.
+        """
+        reset_mutex_statistics()
+        self._mw.threadWidget.mutexTableWidget.setRowCount(0)
+
     def showAboutQudi(self):
         """Show a dialog with details about Qudi.
         """
@@ -684,3 +735,9 @@ class ModuleListItem(QtWidgets.QFrame):
                 self.cleanupButton.setEnabled(True)
 
             self.statusLabel.setText(state)
+            activation_time = getattr(self.manager, 'activation_times', dict()).get(
+                (self.base, self.name))
+            if activation_time is None:
+                self.statusLabel.setToolTip('')
+            else:
+                self.statusLabel.setToolTip('Activation took {0:.3f} s'.format(activation_time))
@@ -36,6 +36,8 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
     confocal_scanner_dummy:
         module.Class: 'confocal_scanner_dummy.ConfocalScannerDummy'
         clock_frequency: 100 # in Hz
+        number_of_emitters: 500 # optional, number of simulated emitters (e.g. NV centers)
+        position_range: [[0, 100e-6], [0, 100e-6], [0, 100e-6], [0, 1e-6]] # optional, in m
         fitlogic: 'fitlogic' # name of the fitlogic module, see default config
 
     """
@@ -45,6 +47,15 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
 
     # config
     _clock_frequency = ConfigOption('clock_frequency', 100, missing='warn')
+    _num_points = ConfigOption('number_of_emitters', 500, missing='nothing')
+    _position_range = ConfigOption('position_range',
+                                   [[0, 100e-6], [0, 100e-6], [0, 100e-6], [0, 1e-6]],
+                                   missing='nothing')
+
+    # Emitters further away from a pixel than this many standard deviations are not evaluated
+    _cutoff_sigma = 6
+    # Number of pixels of a line evaluated at once
+    _pixel_chunk_size = 256
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -53,9 +64,7 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         self._line_length = None
         self._voltage_range = [-10, 10]
 
-        self._position_range = [[0, 100e-6], [0, 100e-6], [0, 100e-6], [0, 1e-6]]
         self._current_position = [0, 0, 0, 0][0:len(self.get_scanner_axes())]
-        self._num_points = 500
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -120,6 +129,8 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         # offset
         self._points_z[:, 3] = 0
 
+        self._build_emitter_index()
+
     def on_deactivate(self):
         """ Deactivate properly the confocal scanner dummy.
         """
@@ -321,14 +332,11 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
 
         #TODO: Change the gaussian function here to the one from fitlogic and delete the local modules to calculate
         #the gaussian functions
-        x_data = np.array(line_path[0, :])
-        y_data = np.array(line_path[1, :])
-        for i in range(self._num_points):
-            count_data += self.twoD_gaussian_function((x_data, y_data), *(self._points[i])
-                ) * self.gaussian_function(np.array(z_data), *(self._points_z[i]))
+        x_data = np.array(line_path[0, :], dtype=float)
+        y_data = np.array(line_path[1, :], dtype=float)
+        count_data += self._get_emitter_counts(x_data, y_data, np.array(z_data, dtype=float))
 
         time.sleep(self._line_length * 1. / self._clock_frequency)
-        time.sleep(self._line_length * 1. / self._clock_frequency)
 
         # update the scanner position instance variable
         self._current_position = list(line_path[:, -1])
@@ -357,6 +365,126 @@ class ConfocalScannerDummy(Base, ConfocalScannerInterface):
         self.log.debug('ConfocalScannerDummy>close_scanner_clock')
         return 0
 
+    def _build_emitter_index(self):
+        """ Sort the emitters into a grid of square cells in the xy plane (cell size at least the
+        cutoff distance) and precalculate the coefficients of their gaussian spots.
+
+        The emitters are stored sorted by cell (row major), so all emitters of a range of cells
+        within one grid row are a contiguous slice.
+        """
+        points = self._points
+        points_z = self._points_z
+        # coefficients of the rotated 2D gaussians (see twoD_gaussian_function)
+        theta = points[:, 5]
+        sigma_x2 = points[:, 3]**2
+        sigma_y2 = points[:, 4]**2
+        a = np.cos(theta)**2 / (2 * sigma_x2) + np.sin(theta)**2 / (2 * sigma_y2)
+        b = -np.sin(2 * theta) / (4 * sigma_x2) + np.sin(2 * theta) / (4 * sigma_y2)
+        c = np.sin(theta)**2 / (2 * sigma_x2) + np.cos(theta)**2 / (2 * sigma_y2)
+        params = np.column_stack((points[:, 0],
+                                  points[:, 1],
+                                  points[:, 2],
+                                  a,
+                                  b,
+                                  c,
+                                  points_z[:, 0],
+                                  points_z[:, 1],
+                                  1 / (2 * points_z[:, 2]**2)))
+
+        if self._num_points > 0:
+            self._cutoff = self._cutoff_sigma * np.max(np.abs(points[:, 3:5]))
+            self._cutoff_z = self._cutoff_sigma * np.max(np.abs(points_z[:, 2]))
+            self._grid_origin = points[:, 1:3].min(axis=0)
+            extent = points[:, 1:3].max(axis=0) - self._grid_origin
+        else:
+            self._cutoff = 0
+            self._cutoff_z = 0
+            self._grid_origin = np.zeros(2)
+            extent = np.zeros(2)
+        # limit the grid to 1024 x 1024 cells
+        self._cell_size = max(self._cutoff, np.max(extent) / 1024, 1e-12)
+        self._grid_shape = (np.floor(extent / self._cell_size).astype(int) + 1)
+        cells = self._get_cells(points[:, 1], points[:, 2])
+        order = np.argsort(cells, kind='mergesort')
+        self._emitter_params = params[order]
+        # index of the first emitter of each cell (and the total number at the end)
+        self._cell_starts = np.searchsorted(cells[order],
+                                            np.arange(np.prod(self._grid_shape) + 1))
+
+    def _get_cells(self, x, y):
+        """ Get the flat grid cell index of positions in the xy plane.
+
+        @param numpy.ndarray x: x positions
+        @param numpy.ndarray y: y positions
+
+        @return numpy.ndarray: cell index (row major, clipped to the grid)
+        """
+        ix = np.clip(np.floor((x - self._grid_origin[0]) / self._cell_size).astype(int),
+                     0,
+                     self._grid_shape[0] - 1)
+        iy = np.clip(np.floor((y - self._grid_origin[1]) / self._cell_size).astype(int),
+                     0,
+                     self._grid_shape[1] - 1)
+        return iy * self._grid_shape[0] + ix
+
+    def _get_emitters_in_area(self, x_min, x_max, y_min, y_max):
+        """ Get the parameters of all emitters in the grid cells overlapping a rectangle.
+
+        @param float x_min: lower x limit
+        @param float x_max: upper x limit
+        @param float y_min: lower y limit
+        @param float y_max: upper y limit
+
+        @return numpy.ndarray: parameters of the emitters (see _build_emitter_index)
+        """
+        first_cell, last_cell = self._get_cells(np.array([x_min, x_max]), np.array([y_min, y_max]))
+        ix_min, iy_min = first_cell % self._grid_shape[0], first_cell // self._grid_shape[0]
+        ix_max, iy_max = last_cell % self._grid_shape[0], last_cell // self._grid_shape[0]
+        row_starts = np.arange(iy_min, iy_max + 1) * self._grid_shape[0]
+        slices = [self._emitter_params[self._cell_starts[row + ix_min]:
+                                       self._cell_starts[row + ix_max + 1]]
+                  for row in row_starts]
+        if len(slices) == 1:
+            return slices[0]
+        return np.concatenate(slices)
+
+    def _get_emitter_counts(self, x_data, y_data, z_data):
+        """ Calculate the fluorescence of all emitters for the pixels of a line.
+        Only the emitters within the cutoff distance of the pixels are evaluated.
+        The offsets of the gaussian spots (always 0) are neglected.
+
+        @param numpy.ndarray x_data: x positions of the pixels
+        @param numpy.ndarray y_data: y positions of the pixels
+        @param numpy.ndarray z_data: z positions of the pixels
+
+        @return numpy.ndarray: the counts of each pixel
+        """
+        counts = np.zeros(x_data.size)
+        if self._num_points == 0:
+            return counts
+        for start in range(0, x_data.size, self._pixel_chunk_size):
+            stop = start + self._pixel_chunk_size
+            x = x_data[start:stop]
+            y = y_data[start:stop]
+            z = z_data[start:stop]
+            params = self._get_emitters_in_area(x.min() - self._cutoff,
+                                                x.max() + self._cutoff,
+                                                y.min() - self._cutoff,
+                                                y.max() + self._cutoff)
+            params = params[(params[:, 7] > z.min() - self._cutoff_z)
+                            & (params[:, 7] < z.max() + self._cutoff_z)]
+            if params.shape[0] == 0:
+                continue
+            amplitude, x_zero, y_zero, a, b, c, amplitude_z, z_zero, z_factor = (
+                params.T[:, :, np.newaxis])
+            dx = x - x_zero
+            dy = y - y_zero
+            dz = z - z_zero
+            spots = amplitude * amplitude_z * np.exp(
+                -(a * dx**2 + 2 * b * dx * dy + c * dy**2 + z_factor * dz**2))
+            counts[start:stop] = spots.sum(axis=0)
+        return counts
+
 ############################################################################
 #                                                                          #
 #    the following two functions are needed to fluoreschence signal        #
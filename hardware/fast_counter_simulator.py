@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""
+This file contains a Qudi hardware module simulating the photon histogram of a fast counting
+device for the pulse sequence loaded in the dummy pulser.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import time
+import numpy as np
+
+from core.module import Base
+from core.configoption import ConfigOption
+from core.connector import Connector
+from interface.fast_counter_interface import FastCounterInterface
+
+
+class FastCounterSimulator(Base, FastCounterInterface):
+    """ Fast counter simulating the fluorescence of a single NV center for the pulse sequence loaded
+    in the dummy pulser (PulserDummy).
+
+    The laser pulses are taken from the laser channel of the loaded asset. During each laser pulse
+    the count rate starts reduced by the contrast times the dark state population and recovers with
+    the polarization time. The dark state population before each laser pulse is given by Rabi
+    oscillations driven while the microwave channel was on since the previous laser pulse.
+    The histogram accumulates Poisson distributed counts of all sweeps elapsed since the start of
+    the measurement, which are drawn in one vectorized batch on each call of get_data_trace.
+
+    If no pulser is connected or no asset is loaded, a single laser pulse of 3 us at the start of
+    each gate (record) is simulated.
+
+    Example config for copy-paste:
+
+    fastcounter_simulator:
+        module.Class: 'fast_counter_simulator.FastCounterSimulator'
+        gated: False
+        laser_channel: 'd_ch1'
+        microwave_channel: 'a_ch1'  # optional, analog or digital channel, None for no contrast
+        count_rate: 200e3  # optional, count rate of the bright state during laser pulses in 1/s
+        dark_count_rate: 500  # optional, background count rate in 1/s
+        contrast: 0.3  # optional, relative count rate reduction of the dark state
+        polarization_time: 250e-9  # optional, in s
+        rabi_frequency: 10e6  # optional, in Hz
+        sweeps_per_second: 0  # optional, 0 derives it from the length of the loaded asset
+        bin_widths: [1e-9, 2e-9, 4e-9, 8e-9, 16e-9, 32e-9]  # optional, in s
+        seed: None  # optional, seed of the random number generator for reproducible data
+        connect:
+            pulser: 'mydummypulser'  # optional
+    """
+
+    pulser = Connector(interface='PulserInterface', optional=True)
+
+    _gated = ConfigOption('gated', False, missing='warn')
+    _laser_channel = ConfigOption('laser_channel', 'd_ch1', missing='warn')
+    _microwave_channel = ConfigOption('microwave_channel', 'a_ch1', missing='nothing')
+    _count_rate = ConfigOption('count_rate', 200e3, missing='nothing')
+    _dark_count_rate = ConfigOption('dark_count_rate', 500, missing='nothing')
+    _contrast = ConfigOption('contrast', 0.3, missing='nothing')
+    _polarization_time = ConfigOption('polarization_time', 250e-9, missing='nothing')
+    _rabi_frequency = ConfigOption('rabi_frequency', 10e6, missing='nothing')
+    _sweeps_per_second = ConfigOption('sweeps_per_second', 0, missing='nothing')
+    _bin_widths = ConfigOption('bin_widths',
+                               [1e-9, 2e-9, 4e-9, 8e-9, 16e-9, 32e-9],
+                               missing='nothing')
+    _seed = ConfigOption('seed', None, missing='nothing')
+
+    # Laser pulse length in s simulated if the loaded asset is unknown
+    _default_laser_length = 3e-6
+    # Sweeps per second if the loaded asset is unknown
+    _default_sweeps_per_second = 1e5
+
+    def __init__(self, config, **kwargs):
+        super().__init__(config=config, **kwargs)
+        self.statusvar = 0
+        self._binwidth = self._bin_widths[0]
+        self._gate_length_bins = 0
+        self._number_of_gates = 0
+        self._random = None
+        self._expected_counts = None
+        self._count_data = None
+        self._sweep_rate = self._default_sweeps_per_second
+        self._elapsed_sweeps = 0
+        self._elapsed_time = 0.0
+        self._run_start_time = None
+
+    def on_activate(self):
+        """ Initialisation performed during activation of the module.
+        """
+        self._random = np.random.RandomState(self._seed)
+        self.statusvar = 0
+        self._binwidth = self._bin_widths[0]
+        self._gate_length_bins = int(np.rint(3e-6 / self._binwidth))
+        self._number_of_gates = 0
+        self._count_data = None
+        return
+
+    def on_deactivate(self):
+        """ Deinitialisation performed during deactivation of the module.
+        """
+        self.statusvar = -1
+        return
+
+    def get_constraints(self):
+        """ Retrieve the hardware constrains from the Fast counting device.
+
+        @return dict: dict with keys being the constraint names as string and
+                      items are the definition for the constaints.
+
+        See the FastCounterInterface for the meaning of the constraints.
+        """
+        constraints = dict()
+        constraints['hardware_binwidth_list'] = list(self._bin_widths)
+        return constraints
+
+    def configure(self, bin_width_s, record_length_s, number_of_gates=0):
+        """ Configuration of the fast counter.
+
+        @param float bin_width_s: Length of a single time bin in the time trace
+                                  histogram in seconds.
+        @param float record_length_s: Total length of the timetrace/each single
+                                      gate in seconds.
+        @param int number_of_gates: optional, number of gates in the pulse
+                                    sequence. Ignore for not gated counter.
+
+        @return tuple(binwidth_s, gate_length_s, number_of_gates):
+                    binwidth_s: float the actual set binwidth in seconds
+                    gate_length_s: the actual set gate length in seconds
+                    number_of_gates: the number of gated, which are accepted
+        """
+        self._binwidth = min(self._bin_widths, key=lambda width: abs(width - bin_width_s))
+        self._gate_length_bins = max(int(np.rint(record_length_s / self._binwidth)), 1)
+        self._number_of_gates = int(number_of_gates) if self._gated else 0
+        self.statusvar = 1
+        return self._binwidth, self._gate_length_bins * self._binwidth, self._number_of_gates
+
+    def get_status(self):
+        """ Receives the current status of the Fast Counter and outputs it as
+            return value.
+
+        0 = unconfigured
+        1 = idle
+        2 = running
+        3 = paused
+        -1 = error state
+        """
+        return self.statusvar
+
+    def start_measure(self):
+        """ Start a new measurement with the timing of the currently loaded pulser asset.
+        """
+        self._expected_counts = self._get_expected_counts()
+        self._count_data = np.zeros(self._expected_counts.shape, dtype='int64')
+        self._elapsed_sweeps = 0
+        self._elapsed_time = 0.0
+        self._run_start_time = time.perf_counter()
+        self.statusvar = 2
+        return 0
+
+    def pause_measure(self):
+        """ Pauses the current measurement.
+
+        Fast counter must be initially in the run state to make it pause.
+        """
+        if self.statusvar == 2:
+            self._accumulate()
+            self._elapsed_time += time.perf_counter() - self._run_start_time
+            self._run_start_time = None
+            self.statusvar = 3
+        return 0
+
+    def stop_measure(self):
+        """ Stop the fast counter. """
+        self.pause_measure()
+        self.statusvar = 1
+        return 0
+
+    def continue_measure(self):
+        """ Continues the current measurement.
+
+        If fast counter is in pause state, then fast counter will be continued.
+        """
+        if self.statusvar == 3:
+            self._run_start_time = time.perf_counter()
+            self.statusvar = 2
+        return 0
+
+    def is_gated(self):
+        """ Check the gated counting possibility.
+
+        @return bool: Boolean value indicates if the fast counter is a gated
+                      counter (TRUE) or not (FALSE).
+        """
+        return self._gated
+
+    def get_binwidth(self):
+        """ Returns the width of a single timebin in the timetrace in seconds.
+
+        @return float: current length of a single bin in seconds (seconds/bin)
+        """
+        return self._binwidth
+
+    def get_data_trace(self):
+        """ Polls the current timetrace data from the fast counter.
+
+        Return value is a numpy array (dtype = int64).
+        If the counter is NOT GATED it will return a tuple (1D-numpy-array, info_dict) with
+            returnarray[timebin_index]
+        If the counter is GATED it will return a tuple (2D-numpy-array, info_dict) with
+            returnarray[gate_index, timebin_index]
+
+        info_dict is a dictionary with keys :
+            - 'elapsed_sweeps' : the elapsed number of sweeps
+            - 'elapsed_time' : the elapsed time in seconds
+        """
+        if self._count_data is None:
+            if self._gated:
+                shape = (max(self._number_of_gates, 1), self._gate_length_bins)
+            else:
+                shape = (self._gate_length_bins,)
+            return np.zeros(shape, dtype='int64'), {'elapsed_sweeps': 0, 'elapsed_time': 0.0}
+
+        self._accumulate()
+        elapsed_time = self._elapsed_time
+        if self._run_start_time is not None:
+            elapsed_time += time.perf_counter() - self._run_start_time
+        info_dict = {'elapsed_sweeps': self._elapsed_sweeps, 'elapsed_time': elapsed_time}
+        return self._count_data.copy(), info_dict
+
+    def _accumulate(self):
+        """ Add the counts of all sweeps elapsed since the last call to the histogram.
+        """
+        if self._run_start_time is None:
+            return
+        elapsed_time = self._elapsed_time + time.perf_counter() - self._run_start_time
+        new_sweeps = int(elapsed_time * self._sweep_rate) - self._elapsed_sweeps
+        if new_sweeps > 0:
+            # The sum of Poisson distributed counts is Poisson distributed
+            self._count_data += self._random.poisson(self._expected_counts * new_sweeps)
+            self._elapsed_sweeps += new_sweeps
+        return
+
+    def _get_laser_pulses(self):
+        """ Get the timing of the laser pulses of the loaded pulser asset.
+
+        @return tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray, float):
+                    start and stop times of the laser pulses in s, dark state population before
+                    each laser pulse and the duration of one sweep in s.
+                    None if the loaded asset is unknown.
+        """
+        pulser = self.pulser()
+        if pulser is None or not hasattr(pulser, 'get_loaded_asset_info'):
+            return None
+        info = pulser.get_loaded_asset_info()
+        if info is None or info['length'] == 0:
+            return None
+        if len(info['rising'].get(self._laser_channel, [])) == 0:
+            self.log.warning('No laser pulses on channel "{0}" in the loaded asset.'
+                             ''.format(self._laser_channel))
+            return None
+
+        sample_rate = info['sample_rate']
+        duration = info['length'] / sample_rate
+        laser_starts = info['rising'][self._laser_channel] / sample_rate
+        laser_stops = info['falling'][self._laser_channel] / sample_rate
+
+        dark_population = np.zeros(laser_starts.size)
+        if len(info['rising'].get(self._microwave_channel, [])) > 0:
+            mw_starts = info['rising'][self._microwave_channel] / sample_rate
+            mw_stops = info['falling'][self._microwave_channel] / sample_rate
+            mw_durations = mw_stops - mw_starts
+            mw_cumulative = np.concatenate(([0], np.cumsum(mw_durations)))
+
+            def get_mw_time(times):
+                # Total time the microwave was on from the start of the sweep until times
+                index = np.searchsorted(mw_starts, times, side='right') - 1
+                on_time = np.where(
+                    index >= 0,
+                    np.minimum(times - mw_starts[index], mw_durations[index]),
+                    0)
+                return mw_cumulative[index + 1] + on_time
+
+            # Microwave time between the end of the previous laser pulse and each laser pulse
+            # (the sequence is played periodically)
+            mw_time = get_mw_time(laser_starts) - get_mw_time(np.roll(laser_stops, 1))
+            mw_time[0] += mw_cumulative[-1]
+            dark_population = np.sin(np.pi * self._rabi_frequency * mw_time) ** 2
+        return laser_starts, laser_stops, dark_population, duration
+
+    def _get_expected_counts(self):
+        """ Calculate the expected counts of each histogram bin for a single sweep.
+
+        @return numpy.ndarray: expected counts per sweep with the shape of the histogram
+        """
+        pulses = self._get_laser_pulses()
+        if pulses is None:
+            self.log.warning('Timing of the loaded pulser asset unknown. Simulating a single laser '
+                             'pulse per gate.')
+            laser_starts = np.zeros(1)
+            laser_stops = np.full(1, self._default_laser_length)
+            dark_population = np.zeros(1)
+            duration = None
+        else:
+            laser_starts, laser_stops, dark_population, duration = pulses
+
+        if self._sweeps_per_second > 0:
+            self._sweep_rate = self._sweeps_per_second
+        elif duration is not None:
+            self._sweep_rate = 1 / duration
+        else:
+            self._sweep_rate = self._default_sweeps_per_second
+
+        bin_times = (np.arange(self._gate_length_bins) + 0.5) * self._binwidth
+        if self._gated:
+            # Each gate starts with the rising edge of a laser pulse
+            gates = np.arange(max(self._number_of_gates, 1)) % laser_starts.size
+            laser_index = gates[:, np.newaxis]
+            times = np.broadcast_to(bin_times, (gates.size, bin_times.size))
+            in_laser = times < (laser_stops - laser_starts)[laser_index]
+            time_in_laser = times
+        else:
+            laser_index = np.searchsorted(laser_starts, bin_times, side='right') - 1
+            in_laser = (laser_index >= 0) & (bin_times < laser_stops[laser_index])
+            time_in_laser = bin_times - laser_starts[laser_index]
+
+        rate = self._count_rate * (1 - self._contrast * dark_population[laser_index]
+                                   * np.exp(-time_in_laser / self._polarization_time))
+        rate = np.where(in_laser, rate, 0) + self._dark_count_rate
+        return rate * self._binwidth
@@ -37,6 +37,7 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
         module.Class: 'odmr_counter_dummy.ODMRCounterDummy'
         clock_frequency: 100 # in Hz
         number_of_channels: 2
+        line_rate: None # optional, sweeps per second, None: limited by clock_frequency, 0: unlimited
         fitlogic: 'fitlogic' # name of the fitlogic module, see default config
 
     """
@@ -47,6 +48,14 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
     # config options
     _clock_frequency = ConfigOption('clock_frequency', 100, missing='warn')
     _number_of_channels = ConfigOption('number_of_channels', 2, missing='warn')
+    _line_rate = ConfigOption('line_rate', None, missing='nothing')
+
+    # Parameters of the simulated double Lorentzian spectrum (x in pixel)
+    _lorentzian_amplitude = -30000
+    _lorentzian_sigma = 3.
+    _offset = 50000.
+    # Mean of the background count rate
+    _background = 25000.
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -56,6 +65,8 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
         self._pulse_out_channel = 'dummy'
         self._lock_in_active = False
         self._oversampling = 10
+        self._spectrum = None
+        self._next_line_time = 0
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -120,6 +131,43 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
         self._odmr_length = length
         return 0
 
+    def _get_spectrum(self, length):
+        """ Get the count rate spectrum of all channels without noise. The spectrum is only
+        calculated again if the sweep length or the number of channels changed.
+
+        @param int length: length of microwave sweep in pixel
+
+        @return numpy.ndarray: count rates in 1/s with shape (number of channels, length)
+        """
+        if self._spectrum is None or self._spectrum.shape != (self._number_of_channels, length):
+            x = np.arange(1, length + 1)
+            sigma_square = self._lorentzian_sigma ** 2
+            lorentzians = sum(
+                self._lorentzian_amplitude * sigma_square / ((x - center) ** 2 + sigma_square)
+                for center in (length / 3, 2 * length / 3))
+            scale = np.arange(1, self._number_of_channels + 1)[:, np.newaxis]
+            self._spectrum = scale * (lorentzians + self._offset) + self._background
+        return self._spectrum
+
+    def _wait_for_line(self, length):
+        """ Wait until the scheduled end of the current line. The time the caller spent between
+        two lines is not waited for again. Returns immediately if line_rate is 0.
+
+        @param int length: length of microwave sweep in pixel
+        """
+        if self._line_rate is None:
+            line_duration = length / self._clock_frequency
+        elif self._line_rate > 0:
+            line_duration = 1 / self._line_rate
+        else:
+            return
+        now = time.perf_counter()
+        # Start a new schedule if the previous line is too long ago (e.g. after a pause)
+        self._next_line_time = max(self._next_line_time, now - line_duration) + line_duration
+        if self._next_line_time > now:
+            time.sleep(self._next_line_time - now)
+        return
+
     def count_odmr(self, length=100):
         """ Sweeps the microwave and returns the counts on that sweep.
 
@@ -137,27 +185,11 @@ class ODMRCounterDummy(Base, ODMRCounterInterface):
 
         self._odmr_length = length
 
-        lorentians, params = self._fit_logic.make_lorentziandouble_model()
-
-        sigma = 3.
-
-        params.add('l0_amplitude', value=-30000)
-        params.add('l0_center', value=length/3)
-        params.add('l0_sigma', value=sigma)
-        params.add('l1_amplitude', value=-30000)
-        params.add('l1_center', value=2*length/3)
-        params.add('l1_sigma', value=sigma)
-        params.add('offset', value=50000.)
-
-        ret = np.empty((self._number_of_channels, length))
-
-        for chnl_index in range(self._number_of_channels):
-            count_data = np.random.uniform(0, 5e4, length)
-            count_data += (chnl_index + 1) * lorentians.eval(x=np.arange(1, length + 1, 1),
-                                                             params=params)
-            ret[chnl_index] = count_data
+        # Shot noise of the photons counted within one clock period of all channels at once
+        counting_time = 1 / self._clock_frequency
+        ret = np.random.poisson(self._get_spectrum(length) * counting_time) / counting_time
 
-        time.sleep(self._odmr_length*1./self._clock_frequency)
+        self._wait_for_line(length)
 
         self.module_state.unlock()
         return False, ret
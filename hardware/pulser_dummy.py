@@ -20,7 +20,9 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import itertools
 import time
+import numpy as np
 from collections import OrderedDict
 
 from core.module import Base
@@ -72,6 +74,10 @@ class PulserDummy(Base, PulserInterface):
 
         self.waveform_set = set()
         self.sequence_dict = dict()
+        # Switch on/off edges of all channels for each waveform (see get_loaded_asset_info)
+        self._waveform_edges = dict()
+        # (waveform name of the first track, repetitions) for each step of each sequence
+        self._sequence_steps = dict()
 
         self.current_loaded_assets = dict()
 
@@ -313,6 +319,7 @@ class PulserDummy(Base, PulserInterface):
                 waveforms.append(name + chnl[1:])
                 time.sleep(number_of_samples * 8 / 1024 ** 3)
 
+        self._record_edges(waveforms, analog_samples, digital_samples, is_first_chunk)
         self.waveform_set.update(waveforms)
 
         self.log.info('Waveforms with nametag "{0}" directly written on dummy pulser.'.format(name))
@@ -340,6 +347,8 @@ class PulserDummy(Base, PulserInterface):
             del self.sequence_dict[name]
 
         self.sequence_dict[name] = len(sequence_parameter_list[0][0])
+        self._sequence_steps[name] = [(waveform_tuple[0], param_dict.get('repetitions', 0))
+                                      for waveform_tuple, param_dict in sequence_parameter_list]
         time.sleep(1)
 
         self.log.info('Sequence with name "{0}" directly written on dummy pulser.'.format(name))
@@ -374,6 +383,7 @@ class PulserDummy(Base, PulserInterface):
         for waveform in waveform_name:
             if waveform in self.waveform_set:
                 self.waveform_set.remove(waveform)
+                self._waveform_edges.pop(waveform, None)
                 deleted_waveforms.append(waveform)
 
         return deleted_waveforms
@@ -393,6 +403,7 @@ class PulserDummy(Base, PulserInterface):
         for sequence in sequence_name:
             if sequence in self.sequence_dict:
                 del self.sequence_dict[sequence]
+                self._sequence_steps.pop(sequence, None)
                 deleted_sequences.append(sequence)
 
         return deleted_sequences
@@ -525,6 +536,95 @@ class PulserDummy(Base, PulserInterface):
 
         return self.current_loaded_assets, asset_type
 
+    def get_loaded_asset_info(self):
+        """ Retrieve the timing of all channels of the currently loaded asset.
+        This is no interface method. It is used by the FastCounterSimulator to generate the
+        fluorescence response of the loaded pulse sequence.
+
+        A channel is considered on while its samples are non-zero. Sequences are unrolled, i.e. each
+        finite sequence step is repeated (repetitions + 1) times and infinite steps are played once.
+
+        @return dict: dictionary with keys
+                        'sample_rate': the sample rate in Hz
+                        'length': number of samples of one run of the asset
+                        'rising': dict with channel names as keys and sorted numpy arrays of the
+                                  sample indices the channel is switched on as values
+                        'falling': same as 'rising' for the indices the channel is switched off
+                      None if no asset is loaded or its samples are unknown.
+        """
+        assets, asset_type = self.get_loaded_assets()
+        if not assets:
+            return None
+        first_asset = assets[min(assets)]
+        if asset_type == 'waveform':
+            steps = [(first_asset, 0)]
+        else:
+            steps = self._sequence_steps.get(first_asset.rsplit('_', 1)[0])
+            if steps is None:
+                return None
+
+        length = 0
+        rising = dict()
+        falling = dict()
+        for waveform, repetitions in steps:
+            edges = self._waveform_edges.get(waveform)
+            if edges is None:
+                return None
+            offsets = length + np.arange(max(repetitions, 0) + 1) * edges['length']
+            for chnl in edges['rising']:
+                chnl_rising = np.concatenate(edges['rising'][chnl])
+                chnl_falling = np.concatenate(edges['falling'][chnl])
+                if edges['state'][chnl]:
+                    chnl_falling = np.append(chnl_falling, edges['length'])
+                rising.setdefault(chnl, list()).append(
+                    (offsets[:, np.newaxis] + chnl_rising).ravel())
+                falling.setdefault(chnl, list()).append(
+                    (offsets[:, np.newaxis] + chnl_falling).ravel())
+            length = offsets[-1] + edges['length']
+
+        info = dict()
+        info['sample_rate'] = self.sample_rate
+        info['length'] = int(length)
+        info['rising'] = {chnl: np.concatenate(edges) for chnl, edges in rising.items()}
+        info['falling'] = {chnl: np.concatenate(edges) for chnl, edges in falling.items()}
+        # Merge pulses at the boundaries of sequence steps
+        for chnl in info['rising']:
+            boundaries = np.intersect1d(info['rising'][chnl], info['falling'][chnl])
+            if boundaries.size > 0:
+                info['rising'][chnl] = np.setdiff1d(info['rising'][chnl], boundaries)
+                info['falling'][chnl] = np.setdiff1d(info['falling'][chnl], boundaries)
+        return info
+
+    def _record_edges(self, waveforms, analog_samples, digital_samples, is_first_chunk):
+        """ Store the sample indices at which each channel is switched on and off.
+
+        @param list waveforms: names of the written waveforms
+        @param dict analog_samples: analog samples of the written chunk
+        @param dict digital_samples: digital samples of the written chunk
+        @param bool is_first_chunk: Flag indicating if it is the first chunk of the waveforms
+        """
+        edges = self._waveform_edges.get(waveforms[0]) if waveforms else None
+        if is_first_chunk or edges is None:
+            edges = {'length': 0, 'state': dict(), 'rising': dict(), 'falling': dict()}
+        number_of_samples = 0
+        for chnl, samples in itertools.chain(analog_samples.items(), digital_samples.items()):
+            state = np.asarray(samples) != 0
+            number_of_samples = state.size
+            if number_of_samples == 0:
+                continue
+            changes = np.flatnonzero(state[1:] != state[:-1]) + 1
+            if state[0] != edges['state'].get(chnl, False):
+                changes = np.concatenate(([0], changes))
+            edges['rising'].setdefault(chnl, list()).append(
+                changes[state[changes]] + edges['length'])
+            edges['falling'].setdefault(chnl, list()).append(
+                changes[~state[changes]] + edges['length'])
+            edges['state'][chnl] = bool(state[-1])
+        edges['length'] += number_of_samples
+        for waveform in waveforms:
+            self._waveform_edges[waveform] = edges
+        return
+
     def clear_all(self):
         """ Clears all loaded waveform from the pulse generators RAM.
 
@@ -536,6 +636,8 @@ class PulserDummy(Base, PulserInterface):
         self.current_loaded_assets = dict()
         self.waveform_set = set()
         self.sequence_dict = dict()
+        self._waveform_edges = dict()
+        self._sequence_steps = dict()
         return 0
 
     def get_status(self):
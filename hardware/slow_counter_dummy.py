@@ -20,8 +20,6 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 import numpy as np
-
-import random
 import time
 
 from core.module import Base
@@ -92,7 +90,7 @@ class SlowCounterDummy(Base, SlowCounterInterface):
         """ Return a constraints class for the slow counter."""
         constraints = SlowCounterConstraints()
         constraints.min_count_frequency = 5e-5
-        constraints.max_count_frequency = 5e5
+        constraints.max_count_frequency = 1e7
         constraints.counting_mode = [
             CountingMode.CONTINUOUS,
             CountingMode.GATED,
@@ -140,6 +138,8 @@ class SlowCounterDummy(Base, SlowCounterInterface):
 
         @return float: the photon counts per second
         """
+        if samples is None:
+            samples = int(self._samples_number)
         count_data = np.array(
             [self._simulate_counts(samples) + i * self.mean_signal
                 for i, ch in enumerate(self.get_counter_channels())]
@@ -170,56 +170,70 @@ class SlowCounterDummy(Base, SlowCounterInterface):
 
         timestep = 1 / self._clock_frequency * samples
 
-        # count data will be written here in the NumPy array
-        count_data = np.empty([samples], dtype=np.uint32)
-
-        for i in range(samples):
-            if self.dist == 'single_gaussian':
-                count_data[i] = np.random.normal(self.mean_signal, self.noise_amplitude / 2)
-            elif self.dist == 'dark_bright_gaussian':
-                self.total_time = self.total_time + timestep
-                if self.total_time > self.current_dec_time:
-                    if self.curr_state_b:
-                        self.curr_state_b = False
-                        self.current_dec_time = np.random.exponential(self.life_time_dark)
-                        count_data[i] = np.random.poisson(self.mean_signal)
-                    else:
-                        self.curr_state_b = True
-                        self.current_dec_time = np.random.exponential(self.life_time_bright)
-                    self.total_time = 0.0
-
-                count_data[i] = (np.random.normal(self.mean_signal, self.noise_amplitude) * self.curr_state_b
-                                + np.random.normal(self.mean_signal2, self.noise_amplitude) * (1-self.curr_state_b))
-
-            elif self.dist == 'uniform':
-                count_data[i] = self.mean_signal + random.uniform(-self.noise_amplitude / 2, self.noise_amplitude / 2)
-
-            elif self.dist == 'exponential':
-                count_data[i] = np.random.exponential(self.mean_signal)
-
-            elif self.dist == 'single_poisson':
-                count_data[i] = np.random.poisson(self.mean_signal)
-
-            elif self.dist == 'dark_bright_poisson':
-                self.total_time = self.total_time + timestep
-
-                if self.total_time > self.current_dec_time:
-                    if self.curr_state_b:
-                        self.curr_state_b = False
-                        self.current_dec_time = np.random.exponential(self.life_time_dark)
-                        count_data[i] = np.random.poisson(self.mean_signal)
-                    else:
-                        self.curr_state_b = True
-                        self.current_dec_time = np.random.exponential(self.life_time_bright)
-                    self.total_time = 0.0
-
-                count_data[i] = (np.random.poisson(self.mean_signal) * self.curr_state_b
-                                + np.random.poisson(self.mean_signal2) * (1-self.curr_state_b))
-            else:
-                # make uniform as default
-                count_data[0][i] = self.mean_signal + random.uniform(-self.noise_amplitude/2, self.noise_amplitude/2)
+        if self.dist == 'single_gaussian':
+            count_data = np.random.normal(self.mean_signal, self.noise_amplitude / 2, samples)
+        elif self.dist == 'dark_bright_gaussian':
+            bright = self._simulate_bright_states(samples, timestep)
+            count_data = np.random.normal(np.where(bright, self.mean_signal, self.mean_signal2),
+                                          self.noise_amplitude)
+        elif self.dist == 'exponential':
+            count_data = np.random.exponential(self.mean_signal, samples)
+        elif self.dist == 'single_poisson':
+            count_data = np.random.poisson(self.mean_signal, samples)
+        elif self.dist == 'dark_bright_poisson':
+            bright = self._simulate_bright_states(samples, timestep)
+            count_data = np.random.poisson(np.where(bright, self.mean_signal, self.mean_signal2))
+        else:
+            # make uniform as default
+            count_data = self.mean_signal + np.random.uniform(-self.noise_amplitude / 2,
+                                                              self.noise_amplitude / 2,
+                                                              samples)
 
-        return count_data
+        return count_data.astype(np.uint32)
+
+    def _simulate_bright_states(self, samples, timestep):
+        """ Simulate the blinking of the emitter between bright and dark state for each sample.
+
+        The emitter stays in a state for an exponentially distributed life time. The life times
+        needed for the requested samples are drawn at once and converted to the number of samples
+        spent in each state.
+
+        @param int samples: number of samples
+        @param float timestep: time passing per sample
+
+        @return numpy.ndarray: bool array, True for samples in the bright state
+        """
+        bright = np.empty(samples, dtype=bool)
+        # samples left in the current state (the state changes with the first sample exceeding
+        # the current life time)
+        remaining = max(0, int(np.floor((self.current_dec_time - self.total_time) / timestep)))
+        if remaining >= samples:
+            bright[:] = self.curr_state_b
+            self.total_time += samples * timestep
+            return bright
+        bright[:remaining] = self.curr_state_b
+        position = remaining
+        while position < samples:
+            # every state lasts at least one sample, estimate the number of state changes needed
+            mean_samples = min(self.life_time_dark, self.life_time_bright) / timestep + 1
+            number_of_states = min(samples - position,
+                                   int(2 * (samples - position) / mean_samples) + 16)
+            # states alternate, starting with the opposite of the current state
+            states = np.arange(number_of_states) % 2 == (1 if self.curr_state_b else 0)
+            life_times = np.random.exponential(
+                np.where(states, self.life_time_bright, self.life_time_dark))
+            lengths = np.floor(life_times / timestep).astype(np.int64) + 1
+            ends = np.cumsum(lengths)
+            # index of the state of the last sample simulated in this iteration
+            last = min(int(np.searchsorted(ends, samples - position)), number_of_states - 1)
+            state_samples = np.repeat(states[:last + 1], lengths[:last + 1])[:samples - position]
+            bright[position:position + state_samples.size] = state_samples
+            position += state_samples.size
+            # keep the state of the last sample for the next call
+            self.curr_state_b = bool(states[last])
+            self.current_dec_time = life_times[last]
+            self.total_time = (state_samples.size - (ends[last] - lengths[last]) - 1) * timestep
+        return bright
 
     def close_counter(self):
         """ Closes the counter and cleans up afterwards.
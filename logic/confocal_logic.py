@@ -21,6 +21,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 from qtpy import QtCore
 from collections import OrderedDict
+from concurrent.futures import wait
 from copy import copy
 import time
 import datetime
@@ -273,6 +274,7 @@ class ConfocalLogic(GenericLogic):
     signal_save_started = QtCore.Signal()
     signal_xy_data_saved = QtCore.Signal()
     signal_depth_data_saved = QtCore.Signal()
+    signal_save_failed = QtCore.Signal()
     signal_tilt_correction_active = QtCore.Signal(bool)
     signal_tilt_correction_update = QtCore.Signal()
     signal_draw_figure_completed = QtCore.Signal()
@@ -869,13 +871,16 @@ class ConfocalLogic(GenericLogic):
         @param: bool block (optional) If False, return immediately; if True, block until save completes."""
 
         if block:
-            self._save_xy_data(colorscale_range, percentile_range)
+            wait([self._save_xy_data(colorscale_range, percentile_range)])
         else:
             self._signal_save_xy.emit(colorscale_range, percentile_range)
 
     @QtCore.Slot(object, object)
     def _save_xy_data(self, colorscale_range=None, percentile_range=None):
         """ Execute save operation. Slot for _signal_save_xy.
+        The files are written in the background by the save logic.
+
+        @return concurrent.futures.Future: future of the last save job
         """
         self.signal_save_started.emit()
         filepath = self._save_logic.get_path_for_module('Confocal')
@@ -915,6 +920,7 @@ class ConfocalLogic(GenericLogic):
                 for n, ch in enumerate(self.get_scanner_count_channels())}
 
         # Save the image data and figure
+        futures = list()
         for n, ch in enumerate(self.get_scanner_count_channels()):
             # data for the text-array "image":
             image_data = OrderedDict()
@@ -924,14 +930,14 @@ class ConfocalLogic(GenericLogic):
                 'of entries where the Signal is in counts/s:'] = self.xy_image[:, :, 3 + n]
 
             filelabel = 'confocal_xy_image_{0}'.format(ch.replace('/', ''))
-            self._save_logic.save_data(image_data,
-                                       filepath=filepath,
-                                       timestamp=timestamp,
-                                       parameters=parameters,
-                                       filelabel=filelabel,
-                                       fmt='%.6e',
-                                       delimiter='\t',
-                                       plotfig=figs[ch])
+            futures.append(self._save_logic.save_data_async(image_data,
+                                                            filepath=filepath,
+                                                            timestamp=timestamp,
+                                                            parameters=parameters,
+                                                            filelabel=filelabel,
+                                                            fmt='%.6e',
+                                                            delimiter='\t',
+                                                            plotfig=figs.pop(ch)))
 
         # prepare the full raw data in an OrderedDict:
         data = OrderedDict()
@@ -944,17 +950,17 @@ class ConfocalLogic(GenericLogic):
 
         # Save the raw data to file
         filelabel = 'confocal_xy_data'
-        self._save_logic.save_data(data,
-                                   filepath=filepath,
-                                   timestamp=timestamp,
-                                   parameters=parameters,
-                                   filelabel=filelabel,
-                                   fmt='%.6e',
-                                   delimiter='\t')
-
-        self.log.debug('Confocal Image saved.')
-        self.signal_xy_data_saved.emit()
-        return
+        future = self._save_logic.save_data_async(data,
+                                                  filepath=filepath,
+                                                  timestamp=timestamp,
+                                                  parameters=parameters,
+                                                  filelabel=filelabel,
+                                                  fmt='%.6e',
+                                                  delimiter='\t')
+        futures.append(future)
+        # The save jobs are processed in order. All files are written when the last one is done.
+        future.add_done_callback(lambda f: self._data_saved(futures, self.signal_xy_data_saved))
+        return future
 
     def save_depth_data(self, colorscale_range=None, percentile_range=None, block=True):
         """ Save the current confocal depth data to file.
@@ -972,13 +978,17 @@ class ConfocalLogic(GenericLogic):
         
         @param: bool block (optional) If False, return immediately; if True, block until save completes."""
         if block:
-            self._save_depth_data(colorscale_range, percentile_range)
+            wait([self._save_depth_data(colorscale_range, percentile_range)])
         else:
             self._signal_save_depth.emit(colorscale_range, percentile_range)
 
     @QtCore.Slot(object, object)
     def _save_depth_data(self, colorscale_range=None, percentile_range=None):
-        """ Execute save operation. Slot for _signal_save_depth. """
+        """ Execute save operation. Slot for _signal_save_depth.
+        The files are written in the background by the save logic.
+
+        @return concurrent.futures.Future: future of the last save job
+        """
         self.signal_save_started.emit()
         filepath = self._save_logic.get_path_for_module('Confocal')
         timestamp = datetime.datetime.now()
@@ -1024,6 +1034,7 @@ class ConfocalLogic(GenericLogic):
                 for n, ch in enumerate(self.get_scanner_count_channels())}
 
         # Save the image data and figure
+        futures = list()
         for n, ch in enumerate(self.get_scanner_count_channels()):
             # data for the text-array "image":
             image_data = OrderedDict()
@@ -1033,14 +1044,14 @@ class ConfocalLogic(GenericLogic):
                 'of entries where the Signal is in counts/s:'] = self.depth_image[:, :, 3 + n]
 
             filelabel = 'confocal_depth_image_{0}'.format(ch.replace('/', ''))
-            self._save_logic.save_data(image_data,
-                                       filepath=filepath,
-                                       timestamp=timestamp,
-                                       parameters=parameters,
-                                       filelabel=filelabel,
-                                       fmt='%.6e',
-                                       delimiter='\t',
-                                       plotfig=figs[ch])
+            futures.append(self._save_logic.save_data_async(image_data,
+                                                            filepath=filepath,
+                                                            timestamp=timestamp,
+                                                            parameters=parameters,
+                                                            filelabel=filelabel,
+                                                            fmt='%.6e',
+                                                            delimiter='\t',
+                                                            plotfig=figs.pop(ch)))
 
         # prepare the full raw data in an OrderedDict:
         data = OrderedDict()
@@ -1053,17 +1064,34 @@ class ConfocalLogic(GenericLogic):
 
         # Save the raw data to file
         filelabel = 'confocal_depth_data'
-        self._save_logic.save_data(data,
-                                   filepath=filepath,
-                                   timestamp=timestamp,
-                                   parameters=parameters,
-                                   filelabel=filelabel,
-                                   fmt='%.6e',
-                                   delimiter='\t')
-
+        future = self._save_logic.save_data_async(data,
+                                                  filepath=filepath,
+                                                  timestamp=timestamp,
+                                                  parameters=parameters,
+                                                  filelabel=filelabel,
+                                                  fmt='%.6e',
+                                                  delimiter='\t')
+        futures.append(future)
+        # The save jobs are processed in order. All files are written when the last one is done.
+        future.add_done_callback(
+            lambda f: self._data_saved(futures, self.signal_depth_data_saved))
+        return future
+
+    def _data_saved(self, futures, signal):
+        """ Called by the background writer of the save logic when all files of an image are
+        saved.
+
+        @param list futures: the futures of all save jobs of the image
+        @param QtCore.Signal signal: the signal to emit if all files have been saved successfully
+        """
+        for future in futures:
+            if future.cancelled() or future.exception() is not None \
+                    or not isinstance(future.result(), str):
+                self.log.error('Saving the confocal image failed.')
+                self.signal_save_failed.emit()
+                return
         self.log.debug('Confocal Image saved.')
-        self.signal_depth_data_saved.emit()
-        return
+        signal.emit()
 
     def draw_figure(self, data, image_extent, scan_axis=None, cbar_range=None, percentile_range=None,  crosshair_pos=None):
         """ Create a 2-D color map figure of the scan image.
@@ -25,10 +25,12 @@ import numpy as np
 import time
 import matplotlib.pyplot as plt
 
+from core.configoption import ConfigOption
 from core.connector import Connector
 from core.statusvariable import StatusVar
 from logic.generic_logic import GenericLogic
 from interface.slow_counter_interface import CountingMode
+from core.util.buffers import CircularTrace, RecordingBuffer, RunningMedian
 from core.util.mutex import Mutex
 
 
@@ -59,6 +61,10 @@ class CounterLogic(GenericLogic):
     counter1 = Connector(interface='SlowCounterInterface')
     savelogic = Connector(interface='SaveLogic')
 
+    # config options
+    # Size in bytes from which on recorded count data is stored in a memory mapped file (0: never)
+    _recording_spill_bytes = ConfigOption('recording_spill_bytes', 0, missing='nothing')
+
     # status vars
     _count_length = StatusVar('count_length', 300)
     _smooth_window_length = StatusVar('smooth_window_length', 10)
@@ -112,11 +118,10 @@ class CounterLogic(GenericLogic):
         number_of_detectors = constraints.max_detectors
 
         # initialize data arrays
-        self.countdata = np.zeros([len(self.get_channels()), self._count_length])
-        self.countdata_smoothed = np.zeros([len(self.get_channels()), self._count_length])
-        self.rawdata = np.zeros([len(self.get_channels()), self._counting_samples])
+        self._initialize_traces()
+        self.rawdata = np.zeros([len(self._counter_channels), self._counting_samples])
         self._already_counted_samples = 0  # For gated counting
-        self._data_to_save = []
+        self._data_to_save = self._create_recording_buffer()
 
         # Flag to stop the loop
         self.stopRequested = False
@@ -137,9 +142,54 @@ class CounterLogic(GenericLogic):
         if self.module_state() == 'locked':
             self._stopCount_wait()
 
+        self._data_to_save.close()
         self.sigCountDataNext.disconnect()
         return
 
+    def _create_recording_buffer(self):
+        """ Creates the buffer for recorded count data (timestamp + one column per channel).
+
+        @return RecordingBuffer: the empty recording buffer
+        """
+        return RecordingBuffer(number_of_columns=len(self.get_channels()) + 1,
+                               initial_rows=max(1024, 60 * int(self._count_frequency)),
+                               spill_bytes=self._recording_spill_bytes)
+
+    def _initialize_traces(self):
+        """ Initializes the ring buffers for the count traces and the running median.
+        The counter channels are queried once from hardware here and not during counting.
+        """
+        self._counter_channels = self.get_channels()
+        number_of_channels = len(self._counter_channels)
+        self._count_trace = CircularTrace(number_of_channels, self._count_length)
+        self._smoothed_trace = CircularTrace(number_of_channels, self._count_length)
+        self._running_median = RunningMedian(
+            number_of_channels, min(self._smooth_window_length, self._count_length))
+        return
+
+    @property
+    def countdata(self):
+        """ The count trace of all channels (newest value last).
+        A contiguous copy of the ring buffer is created on every access, so fetch it once per
+        redraw.
+        """
+        return self._count_trace.get_trace()
+
+    @property
+    def countdata_smoothed(self):
+        """ The median smoothed count trace of all channels (newest value last).
+        A contiguous copy of the ring buffer is created on every access, so fetch it once per
+        redraw.
+        """
+        return self._smoothed_trace.get_trace()
+
+    @property
+    def countdata_smoothed_latest(self):
+        """ The most recent value of the median smoothed count trace of each channel.
+        Only these values are copied, not the whole trace.
+        """
+        return self._smoothed_trace.latest.copy()
+
     def get_hardware_constraints(self):
         """
         Retrieve the hardware constrains from the counter device.
@@ -263,7 +313,8 @@ class CounterLogic(GenericLogic):
         @return bool: saving state
         """
         if not resume:
-            self._data_to_save = []
+            self._data_to_save.close()
+            self._data_to_save = self._create_recording_buffer()
             self._saving_start_time = time.time()
 
         self._saving = True
@@ -308,19 +359,19 @@ class CounterLogic(GenericLogic):
             for i, detector in enumerate(self.get_channels()):
                 header = header + ',Signal{0} (counts/s)'.format(i)
 
-            data = {header: self._data_to_save}
+            data = {header: self._data_to_save.data}
             filepath = self._save_logic.get_path_for_module(module_name='Counter')
 
             if save_figure:
-                fig = self.draw_figure(data=np.array(self._data_to_save))
+                fig = self.draw_figure(data=self._data_to_save.data)
             else:
                 fig = None
-            self._save_logic.save_data(data, filepath=filepath, parameters=parameters,
-                                       filelabel=filelabel, plotfig=fig, delimiter='\t')
+            self._save_logic.save_data_async(data, filepath=filepath, parameters=parameters,
+                                             filelabel=filelabel, plotfig=fig, delimiter='\t')
             self.log.info('Counter Trace saved to:\n{0}'.format(filepath))
 
         self.sigSavingStatusChanged.emit(self._saving)
-        return self._data_to_save, parameters
+        return self._data_to_save.data, parameters
 
     def draw_figure(self, data):
         """ Draw figure to save with data file.
@@ -425,10 +476,9 @@ class CounterLogic(GenericLogic):
                 return -1
 
             # initialising the data arrays
-            self.rawdata = np.zeros([len(self.get_channels()), self._counting_samples])
-            self.countdata = np.zeros([len(self.get_channels()), self._count_length])
-            self.countdata_smoothed = np.zeros([len(self.get_channels()), self._count_length])
-            self._sampling_data = np.empty([len(self.get_channels()), self._counting_samples])
+            self._initialize_traces()
+            self.rawdata = np.zeros([len(self._counter_channels), self._counting_samples])
+            self._sampling_data = np.empty([len(self._counter_channels), self._counting_samples])
 
             # the sample index for gated counting
             self._already_counted_samples = 0
@@ -509,8 +559,9 @@ class CounterLogic(GenericLogic):
         else:
             filelabel = 'snapshot_count_trace_' + name_tag
 
+        countdata = self.countdata
         stop_time = self._count_length / self._count_frequency
-        time_step_size = stop_time / len(self.countdata)
+        time_step_size = stop_time / len(countdata)
         x_axis = np.arange(0, stop_time, time_step_size)
 
         # prepare the data in a dict or in an OrderedDict:
@@ -521,7 +572,7 @@ class CounterLogic(GenericLogic):
         datastr = 'Time (s)'
 
         for i, ch in enumerate(chans):
-            savearr[i+1] = self.countdata[i]
+            savearr[i+1] = countdata[i]
             datastr += ',Signal {0} (counts/s)'.format(i)
 
         data[datastr] = savearr.transpose()
@@ -535,8 +586,8 @@ class CounterLogic(GenericLogic):
         parameters['Smooth Window Length (# of events)'] = self._smooth_window_length
 
         filepath = self._save_logic.get_path_for_module(module_name='Counter')
-        self._save_logic.save_data(data, filepath=filepath, parameters=parameters,
-                                   filelabel=filelabel, delimiter='\t')
+        self._save_logic.save_data_async(data, filepath=filepath, parameters=parameters,
+                                         filelabel=filelabel, delimiter='\t')
 
         self.log.debug('Current Counter Trace saved to: {0}'.format(filepath))
         return data, filepath, parameters, filelabel
@@ -553,39 +604,21 @@ class CounterLogic(GenericLogic):
         Processes the raw data from the counting device
         @return:
         """
-        for i, ch in enumerate(self.get_channels()):
-            # remember the new count data in circular array
-            self.countdata[i, 0] = np.average(self.rawdata[i])
-        # move the array to the left to make space for the new data
-        self.countdata = np.roll(self.countdata, -1, axis=1)
-        # also move the smoothing array
-        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1, axis=1)
+        # remember the new count data in circular array
+        new_counts = np.mean(self.rawdata[:len(self._counter_channels)], axis=1)
+        self._count_trace.append(new_counts)
         # calculate the median and save it
-        window = -int(self._smooth_window_length / 2) - 1
-        for i, ch in enumerate(self.get_channels()):
-            self.countdata_smoothed[i, window:] = np.median(self.countdata[i,
-                                                            -self._smooth_window_length:])
+        self._update_smoothed_trace(new_counts)
 
         # save the data if necessary
         if self._saving:
              # if oversampling is necessary
             if self._counting_samples > 1:
-                chans = self.get_channels()
-                self._sampling_data = np.empty([len(chans) + 1, self._counting_samples])
-                self._sampling_data[0, :] = time.time() - self._saving_start_time
-                for i, ch in enumerate(chans):
-                    self._sampling_data[i+1, 0] = self.rawdata[i]
-
-                self._data_to_save.extend(list(self._sampling_data))
+                self._record_samples()
             # if we don't want to use oversampling
             else:
-                # append tuple to data stream (timestamp, average counts)
-                chans = self.get_channels()
-                newdata = np.empty((len(chans) + 1, ))
-                newdata[0] = time.time() - self._saving_start_time
-                for i, ch in enumerate(chans):
-                    newdata[i+1] = self.countdata[i, -1]
-                self._data_to_save.append(newdata)
+                # append row to data stream (timestamp, average counts)
+                self._record_counts(new_counts)
         return
 
     def _process_data_gated(self):
@@ -594,28 +627,20 @@ class CounterLogic(GenericLogic):
         @return:
         """
         # remember the new count data in circular array
-        self.countdata[0] = np.average(self.rawdata[0])
-        # move the array to the left to make space for the new data
-        self.countdata = np.roll(self.countdata, -1)
-        # also move the smoothing array
-        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1)
+        new_counts = np.mean(self.rawdata[:len(self._counter_channels)], axis=1)
+        self._count_trace.append(new_counts)
         # calculate the median and save it
-        self.countdata_smoothed[-int(self._smooth_window_length / 2) - 1:] = np.median(
-            self.countdata[-self._smooth_window_length:])
+        self._update_smoothed_trace(new_counts)
 
         # save the data if necessary
         if self._saving:
             # if oversampling is necessary
             if self._counting_samples > 1:
-                self._sampling_data = np.empty((self._counting_samples, 2))
-                self._sampling_data[:, 0] = time.time() - self._saving_start_time
-                self._sampling_data[:, 1] = self.rawdata[0]
-                self._data_to_save.extend(list(self._sampling_data))
+                self._record_samples()
             # if we don't want to use oversampling
             else:
-                # append tuple to data stream (timestamp, average counts)
-                self._data_to_save.append(np.array((time.time() - self._saving_start_time,
-                                                    self.countdata[-1])))
+                # append row to data stream (timestamp, average counts)
+                self._record_counts(new_counts)
         return
 
     def _process_data_finite_gated(self):
@@ -623,21 +648,54 @@ class CounterLogic(GenericLogic):
         Processes the raw data from the counting device
         @return:
         """
-        if self._already_counted_samples+len(self.rawdata[0]) >= len(self.countdata):
-            needed_counts = len(self.countdata) - self._already_counted_samples
-            self.countdata[0:needed_counts] = self.rawdata[0][0:needed_counts]
-            self.countdata = np.roll(self.countdata, -needed_counts)
+        if self._already_counted_samples+len(self.rawdata[0]) >= len(self._count_trace):
+            needed_counts = len(self._count_trace) - self._already_counted_samples
+            self._count_trace.append(self.rawdata[:, 0:needed_counts])
             self._already_counted_samples = 0
             self.stopRequested = True
         else:
-            # replace the first part of the array with the new data:
-            self.countdata[0:len(self.rawdata[0])] = self.rawdata[0]
-            # roll the array by the amount of data it had been inserted:
-            self.countdata = np.roll(self.countdata, -len(self.rawdata[0]))
+            # append the new data to the trace
+            self._count_trace.append(self.rawdata)
             # increment the index counter:
             self._already_counted_samples += len(self.rawdata[0])
         return
 
+    def _record_counts(self, new_counts):
+        """
+        Appends a row (timestamp, counts of each channel) to the recorded data.
+
+        @param numpy.ndarray new_counts: the latest count value of each channel
+        """
+        newdata = np.empty((self._data_to_save.number_of_columns, ))
+        newdata[0] = time.time() - self._saving_start_time
+        newdata[1:] = new_counts[:newdata.size - 1]
+        self._data_to_save.append(newdata)
+        return
+
+    def _record_samples(self):
+        """
+        Appends one row (timestamp, counts of each channel) per oversampling sample of the current
+        raw data to the recorded data.
+        """
+        number_of_channels = self._data_to_save.number_of_columns - 1
+        self._sampling_data = np.empty((self._counting_samples, number_of_channels + 1))
+        self._sampling_data[:, 0] = time.time() - self._saving_start_time
+        self._sampling_data[:, 1:] = self.rawdata[:number_of_channels].transpose()
+        self._data_to_save.extend(self._sampling_data)
+        return
+
+    def _update_smoothed_trace(self, new_counts):
+        """
+        Appends the running median of the count trace to the smoothed trace. The median is assigned
+        to the last (smooth_window_length / 2 + 1) values of the smoothed trace.
+
+        @param numpy.ndarray new_counts: the latest count value of each channel
+        """
+        medians = self._running_median.append(new_counts)
+        self._smoothed_trace.append(medians)
+        self._smoothed_trace.set_latest(medians, int(self._smooth_window_length / 2) + 1)
+        return
+
     def _stopCount_wait(self, timeout=5.0):
         """
         Stops the counter and waits until it actually has stopped.
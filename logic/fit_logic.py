@@ -20,23 +20,38 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import ast
+import hashlib
 import importlib
 import inspect
-import lmfit
 from qtpy import QtCore
 import numpy as np
 import os
 import sys
+import time
 from collections import OrderedDict
 from distutils.version import LooseVersion
 
 from logic.generic_logic import GenericLogic
+from core.util.batch_fit import batch_fit
 from core.util.modules import get_main_dir
 from core.util.mutex import Mutex
 from core.config import load, save
 from core.configoption import ConfigOption
 
 
+def import_lmfit():
+    """ Imports lmfit on first use, so FitLogic and FitContainer can be loaded without importing
+    lmfit and scipy (see the lazy_fit_methods config option of FitLogic).
+
+    @return module: the lmfit module
+    """
+    import lmfit
+    if LooseVersion(lmfit.__version__) < LooseVersion('0.9.2'):
+        raise Exception('lmfit needs to be at least version 0.9.2!')
+    return lmfit
+
+
 class FitLogic(GenericLogic):
     """
     Documentation to add a new fit model/estimator/function can be found in
@@ -54,13 +69,17 @@ class FitLogic(GenericLogic):
     _additional_methods_import_path = ConfigOption(name='additional_fit_methods_path',
                                                    default=None,
                                                    missing='nothing')
+    # Only index the fit method files on startup and import each file on first use of a method
+    _lazy_fit_methods = ConfigOption(name='lazy_fit_methods', default=False, missing='nothing')
+    # Number of worker processes used by batch_fit (None: fit in the calling thread)
+    _batch_fit_processes = ConfigOption(name='batch_fit_processes', default=None, missing='nothing')
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # locking for thread safety
         self.lock = Mutex()
 
-        filenames = []
+        filenames = OrderedDict()
         # for path in directories:
         path_list = [os.path.join(get_main_dir(), 'logic', 'fitmethods')]
         # adding additional path, to be defined in the config
@@ -85,7 +104,7 @@ class FitLogic(GenericLogic):
         for path in path_list:
             for f in os.listdir(path):
                 if os.path.isfile(os.path.join(path, f)) and f.endswith('.py'):
-                    filenames.append(f[:-3])
+                    filenames[f[:-3]] = os.path.join(path, f)
                     if path not in sys.path:
                         sys.path.append(path)
 
@@ -95,31 +114,30 @@ class FitLogic(GenericLogic):
         self.fit_list['2d'] = OrderedDict()
         self.fit_list['3d'] = OrderedDict()
 
-        # Go through the fitmethods files and import all methods.
+        # Go through the fitmethods files and import all methods (or only index them in lazy mode).
         # Also determine which methods need to be added to the fit_list dictionary
         estimators_for_dict = list()
         models_for_dict = list()
         fits_for_dict = list()
-
-        for files in filenames:
-            mod = importlib.import_module('{0}'.format(files))
-            for method in dir(mod):
-                ref = getattr(mod, method)
-                if callable(ref) and (inspect.ismethod(ref) or inspect.isfunction(ref)):
-                    method_str = str(method)
-                    try:
-                        # import methods in Fitlogic
-                        setattr(FitLogic, method, ref)
-                        # append method to a list of methods to include in the fit_list dictionary
-                        if method_str.startswith('make_') and method_str.endswith('_fit'):
-                            fits_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
-                        elif method_str.startswith('make_') and method_str.endswith('_model'):
-                            models_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
-                        elif method_str.startswith('estimate_'):
-                            estimators_for_dict.append(method_str.split('_', 1)[1])
-                    except:
-                        self.log.error('Method "{0}" could not be imported to FitLogic.'
-                                       ''.format(str(method)))
+        # Method names of files not imported yet and the name of the file defining them
+        self._unloaded_fit_methods = dict()
+
+        for files, file_path in filenames.items():
+            if self._lazy_fit_methods:
+                method_names = self._index_fit_method_file(file_path)
+                for method_str in method_names:
+                    if not hasattr(FitLogic, method_str):
+                        self._unloaded_fit_methods.setdefault(method_str, files)
+            else:
+                method_names = self._import_fit_method_file(files)
+            for method_str in method_names:
+                # append method to a list of methods to include in the fit_list dictionary
+                if method_str.startswith('make_') and method_str.endswith('_fit'):
+                    fits_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
+                elif method_str.startswith('make_') and method_str.endswith('_model'):
+                    models_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
+                elif method_str.startswith('estimate_'):
+                    estimators_for_dict.append(method_str.split('_', 1)[1])
 
         fits_for_dict.sort()
         models_for_dict.sort()
@@ -140,11 +158,12 @@ class FitLogic(GenericLogic):
             # Attach make_*_fit method to fit_list
             if fit_name not in self.fit_list[dimension]:
                 self.fit_list[dimension][fit_name] = OrderedDict()
-            self.fit_list[dimension][fit_name]['make_fit'] = getattr(self, fit_method)
+            self.fit_list[dimension][fit_name]['make_fit'] = self._get_fit_method(fit_method)
 
             # Attach make_*_model method to fit_list
             if fit_name in models_for_dict:
-                self.fit_list[dimension][fit_name]['make_model'] = getattr(self, model_method)
+                self.fit_list[dimension][fit_name]['make_model'] = self._get_fit_method(
+                    model_method)
             else:
                 self.log.error('No make_*_model method for fit "{0}" found in FitLogic.'
                                ''.format(fit_name))
@@ -154,11 +173,13 @@ class FitLogic(GenericLogic):
             for estimator_name in estimators_for_dict:
                 estimator_method = 'estimate_' + estimator_name
                 if fit_name == estimator_name:
-                    self.fit_list[dimension][fit_name]['generic'] = getattr(self, estimator_method)
+                    self.fit_list[dimension][fit_name]['generic'] = self._get_fit_method(
+                        estimator_method)
                     found_estimator = True
                 elif estimator_name.startswith(fit_name + '_'):
                     custom_name = estimator_name.split('_', 1)[1]
-                    self.fit_list[dimension][fit_name][custom_name] = getattr(self, estimator_method)
+                    self.fit_list[dimension][fit_name][custom_name] = self._get_fit_method(
+                        estimator_method)
                     found_estimator = True
             if not found_estimator:
                 self.log.error('No estimator method for fit "{0}" found in FitLogic.'
@@ -167,13 +188,78 @@ class FitLogic(GenericLogic):
         self.log.info('Methods were included to FitLogic, but only if naming is right: check the'
                       ' doxygen documentation if you added a new method and it does not show.')
 
+    def __getattr__(self, name):
+        """ Imports the fit method file defining the requested method on first access.
+        Only called if the attribute is not found otherwise (i.e. in lazy mode).
+        """
+        unloaded = self.__dict__.get('_unloaded_fit_methods')
+        if unloaded and name in unloaded:
+            self._import_fit_method_file(unloaded[name])
+            return getattr(self, name)
+        raise AttributeError('{0} object has no attribute {1}'.format(type(self).__name__, name))
+
+    @staticmethod
+    def _index_fit_method_file(file_path):
+        """ Get the names of all functions defined in a fit method file without executing it.
+
+        @param str file_path: path of the fit method python file
+
+        @return list: names of the functions defined on module level
+        """
+        with open(file_path, 'r', encoding='utf-8') as file:
+            tree = ast.parse(file.read(), filename=file_path)
+        return [node.name for node in tree.body if isinstance(node, ast.FunctionDef)]
+
+    def _import_fit_method_file(self, module_name):
+        """ Import a fit method file and attach all its functions as methods to FitLogic.
+
+        @param str module_name: name of the fit method file without extension
+
+        @return list: names of the attached methods
+        """
+        with self.lock:
+            # Remove the file from the unloaded ones first, failed imports are not retried.
+            for method_str, file in list(self._unloaded_fit_methods.items()):
+                if file == module_name:
+                    del self._unloaded_fit_methods[method_str]
+            method_names = list()
+            try:
+                mod = importlib.import_module('{0}'.format(module_name))
+            except:
+                self.log.exception('Fit method file "{0}" could not be imported.'
+                                   ''.format(module_name))
+                return method_names
+            for method in dir(mod):
+                ref = getattr(mod, method)
+                if callable(ref) and (inspect.ismethod(ref) or inspect.isfunction(ref)):
+                    try:
+                        # import methods in Fitlogic
+                        setattr(FitLogic, method, ref)
+                        method_names.append(str(method))
+                    except:
+                        self.log.error('Method "{0}" could not be imported to FitLogic.'
+                                       ''.format(str(method)))
+        return method_names
+
+    def _get_fit_method(self, method_name):
+        """ Get a fit method for the fit_list. Methods of files not imported yet are returned
+        as LazyFitMethod, which imports the file on first call.
+
+        @param str method_name: name of the fit method
+
+        @return callable: the bound fit method or a LazyFitMethod
+        """
+        if method_name in self._unloaded_fit_methods:
+            return LazyFitMethod(self, method_name)
+        return getattr(self, method_name)
+
     def on_activate(self):
         """ Initialisation performed during activation of the module.
         """
         # FIXME: load all the fits here, otherwise reloading this module is really questionable
-        fitversion = LooseVersion(lmfit.__version__)
-        if fitversion < LooseVersion('0.9.2'):
-            raise Exception('lmfit needs to be at least version 0.9.2!')
+        # With lazy fit methods lmfit is imported (and its version checked) on first use
+        if not self._lazy_fit_methods:
+            import_lmfit()
 
     def on_deactivate(self):
         """ """
@@ -216,7 +302,7 @@ class FitLogic(GenericLogic):
                                'make_model': self.fit_list[dim][fname]['make_model'],
                                'estimator': self.fit_list[dim][fname][fit['estimator']]}
                     try:
-                        par = lmfit.parameter.Parameters()
+                        par = import_lmfit().parameter.Parameters()
                         par.loads(fit['parameters'])
                     except:
                         model, par = self.fit_list[dim][fname]['make_model']()
@@ -283,14 +369,57 @@ class FitLogic(GenericLogic):
       
         return FitContainer(self, container_name, dimension)
 
+    def batch_fit(self, model, x_data, y_data, initial_params=None, processes=None):
+        """ Fit the same model to many data sets at once, e.g. an ODMR spectrum per pixel of a
+        map. All data sets are estimated and optimized together with vectorized numpy operations
+        instead of one lmfit fit per data set (see core.util.batch_fit).
+
+            @param model str: name of the model ('lorentzian', 'gaussian', 'sine' or
+                              'decayexponential')
+            @param x_data numpy.ndarray: x values of all data sets, shape (points,)
+            @param y_data numpy.ndarray: data sets, shape (N, points)
+            @param initial_params dict: optional, initial values (scalar or array of shape (N,))
+                                        for all parameters of the model. Estimated if None.
+            @param processes int: optional, number of worker processes. Defaults to the config
+                                  option batch_fit_processes.
+
+            @return OrderedDict: 'params' and 'errors' (OrderedDicts with an array of shape (N,)
+                                 for each parameter), 'reduced_chi_square' and 'success' arrays
+        """
+        if processes is None:
+            processes = self._batch_fit_processes
+        return batch_fit(model, x_data, y_data, initial_params=initial_params, processes=processes)
+
+
+class LazyFitMethod:
+    """ Callable standing in for a method of FitLogic whose fit method file is not imported yet.
+    The file is imported on the first call.
+    """
+
+    def __init__(self, fit_logic, method_name):
+        """
+        @param FitLogic fit_logic: the FitLogic instance the method belongs to
+        @param str method_name: name of the fit method
+        """
+        self.fit_logic = fit_logic
+        self.__name__ = method_name
+
+    def __call__(self, *args, **kwargs):
+        return getattr(self.fit_logic, self.__name__)(*args, **kwargs)
+
+    def __repr__(self):
+        return '<lazy fit method {0}>'.format(self.__name__)
+
 
 class FitContainer(QtCore.QObject):
     """ A class for managing a single flexible fit setting in a logic module.
     """
     sigFitUpdated = QtCore.Signal()
     sigCurrentFit = QtCore.Signal(str)
-    sigNewFitResult = QtCore.Signal(str, lmfit.model.ModelResult)
-    sigNewFitParameters = QtCore.Signal(str, lmfit.parameter.Parameters)
+    # Arguments: fit name and lmfit.model.ModelResult or lmfit.parameter.Parameters.
+    # The types are object, so lmfit is not imported with this module.
+    sigNewFitResult = QtCore.Signal(str, object)
+    sigNewFitParameters = QtCore.Signal(str, object)
 
     def __init__(self, fit_logic, name, dimension):
         """ Create a fit container.
@@ -316,11 +445,18 @@ class FitContainer(QtCore.QObject):
         # variables for fitting
         self.fit_granularity_fact = 10
         self.current_fit = 'No Fit'
-        self.current_fit_param = lmfit.parameter.Parameters()
+        self.current_fit_param = import_lmfit().parameter.Parameters()
         self.current_fit_result = None
         self.use_settings = None
         self.units = ['independent variable {0}'.format(i+1) for i in range(self.dim)]
         self.units.append('dependent variable')
+        # fit session (see start_fit_session)
+        self.fit_session_active = False
+        self._session_results = dict()
+        # lmfit models used to evaluate the fit results, one per fit function
+        self._models = dict()
+        # duration, number of function evaluations, warm start and cache flags of the last fit
+        self.fit_statistics = dict()
 
     def set_units(self, units):
         """ Set units for this fit.
@@ -340,6 +476,8 @@ class FitContainer(QtCore.QObject):
             self.fit_list = self.fit_logic.validate_load_fits(fit_dict)[self.dimension]
         except KeyError:
             self.fit_list = OrderedDict()
+        self._models = dict()
+        self._session_results = dict()
 
     def save_to_dict(self):
         """ Convert self.fit_list to a storable dictionary.
@@ -352,7 +490,7 @@ class FitContainer(QtCore.QObject):
     def clear_result(self):
         """ Reset fit result and fit parameters from result for this container.
         """
-        self.current_fit_param = lmfit.parameter.Parameters()
+        self.current_fit_param = import_lmfit().parameter.Parameters()
         self.current_fit_result = None
 
     @QtCore.Slot(dict)
@@ -361,6 +499,8 @@ class FitContainer(QtCore.QObject):
             @param fit_functions dict: configured fit functions dictionary
         """
         self.fit_list = fit_functions
+        self._models = dict()
+        self._session_results = dict()
         self.set_current_fit(self.current_fit)
 
     @QtCore.Slot(str)
@@ -378,7 +518,7 @@ class FitContainer(QtCore.QObject):
             self.current_fit = current_fit
             if current_fit != 'No Fit':
                 use_settings = self.fit_list[self.current_fit]['use_settings']
-                self.use_settings = lmfit.parameter.Parameters()
+                self.use_settings = import_lmfit().parameter.Parameters()
                 # Update the use parameter dictionary
                 for para in use_settings:
                     if use_settings[para]:
@@ -389,7 +529,55 @@ class FitContainer(QtCore.QObject):
         self.sigCurrentFit.emit(self.current_fit)
         return self.current_fit, self.use_settings
 
-    def do_fit(self, x_data, y_data):
+    def start_fit_session(self):
+        """ Start a fit session for repeated fits of slowly changing data, e.g. live fits during
+        a running measurement.
+
+        Within a session a fit starts from the parameters (incl. bounds) of the previous result of
+        the same fit function and data size instead of running the estimator. If that fit fails,
+        the fit is repeated with the estimator. A fit of unchanged data returns the previous result
+        without fitting again.
+        """
+        self.fit_session_active = True
+        self._session_results = dict()
+
+    def stop_fit_session(self):
+        """ Stop the fit session and forget the previous results.
+        """
+        self.fit_session_active = False
+        self._session_results = dict()
+
+    def _get_model(self, fit_name):
+        """ Get the (cached) lmfit model of a configured fit.
+
+            @param fit_name str: name of the configured fit
+
+            @return lmfit.Model: the model created by the make_model method of the fit
+        """
+        if fit_name not in self._models:
+            self._models[fit_name] = self.fit_list[fit_name]['make_model']()[0]
+        return self._models[fit_name]
+
+    @staticmethod
+    def _get_warm_start_estimator(previous_params):
+        """ Create an estimator setting the parameters to the values of a previous fit.
+
+            @param previous_params lmfit.Parameters: parameters of the previous fit result
+
+            @return function: estimator with the signature of the fit method estimators
+        """
+        def estimator(*args, **kwargs):
+            params = kwargs['params'] if 'params' in kwargs else args[2]
+            for name, previous in previous_params.items():
+                if name in params and params[name].expr is None and previous.expr is None:
+                    params[name].set(value=previous.value,
+                                     min=previous.min,
+                                     max=previous.max,
+                                     vary=previous.vary)
+            return 0, params
+        return estimator
+
+    def do_fit(self, x_data, y_data, session_key=None):
         """Performs the chosen fit on the measured data.
         @param array x_data: optional, 1D np.array or 1D list with the x values.
                              If None is passed then the module x values are
@@ -398,6 +586,8 @@ class FitContainer(QtCore.QObject):
                              If None is passed then the module y values are
                              taken. If passed, then it should have the same size
                              as x_data.
+        @param session_key: optional, hashable key distinguishing different data sets fitted
+                            alternately with this container within a fit session.
 
         @return: tuple (fit_x, fit_y, str_dict, fit_result)
             np.array fit_x: 1D array containing the x values of the fit
@@ -416,6 +606,8 @@ class FitContainer(QtCore.QObject):
                             then result is set to None.
         """
         self.clear_result()
+        start_time = time.perf_counter()
+        self.fit_statistics = {'time': 0.0, 'nfev': 0, 'warm_start': False, 'cached': False}
 
         fit_x = np.linspace(
             start=x_data[0],
@@ -430,11 +622,38 @@ class FitContainer(QtCore.QObject):
             'add_params': self.use_settings}
 
         result = None
+        fit_y = None
 
         if self.current_fit in self.fit_list:
-            result = self.fit_list[self.current_fit]['make_fit'](
-                estimator=self.fit_list[self.current_fit]['estimator'],
-                **kwargs)
+            previous = None
+            data_hash = None
+            if self.fit_session_active:
+                previous = self._session_results.get(session_key)
+                if previous is not None and previous['fit'] != self.current_fit:
+                    previous = None
+                data_hash = hashlib.blake2b(np.ascontiguousarray(x_data, dtype=float).tobytes())
+                data_hash.update(np.ascontiguousarray(y_data, dtype=float).tobytes())
+                data_hash = data_hash.hexdigest()
+
+            if previous is not None and previous['hash'] == data_hash:
+                result = previous['result']
+                fit_y = previous['fit_y']
+                self.fit_statistics['cached'] = True
+            else:
+                if (previous is not None and previous['size'] == len(x_data)
+                        and previous['result'].success):
+                    result = self.fit_list[self.current_fit]['make_fit'](
+                        estimator=self._get_warm_start_estimator(previous['result'].params),
+                        **kwargs)
+                    self.fit_statistics['warm_start'] = True
+                    self.fit_statistics['nfev'] += result.nfev
+                    if not result.success or not np.isfinite(result.chisqr):
+                        result = None
+                if result is None:
+                    result = self.fit_list[self.current_fit]['make_fit'](
+                        estimator=self.fit_list[self.current_fit]['estimator'],
+                        **kwargs)
+                    self.fit_statistics['nfev'] += result.nfev
 
         elif self.current_fit == 'No Fit':
             fit_y = np.zeros(fit_x.shape)
@@ -447,13 +666,33 @@ class FitContainer(QtCore.QObject):
 
             self.current_fit = 'No Fit'
 
-        if self.current_fit != 'No Fit':
+        if self.current_fit != 'No Fit' and fit_y is None:
             # after the fit was performed, retrieve the fitting function and
             # evaluate the fitted parameters according to the function:
-            model, params = self.fit_list[self.current_fit]['make_model']()
-            fit_y = model.eval(x=fit_x, params=result.params)
-
+            fit_y = self._get_model(self.current_fit).eval(x=fit_x, params=result.params)
+            if self.fit_session_active:
+                self._session_results[session_key] = {'fit': self.current_fit,
+                                                      'size': len(x_data),
+                                                      'hash': data_hash,
+                                                      'result': result,
+                                                      'fit_y': fit_y}
+
+        self.fit_statistics['time'] = time.perf_counter() - start_time
         if result is not None:
+            if self.fit_statistics['cached']:
+                mode = ', unchanged data'
+            elif self.fit_statistics['warm_start']:
+                mode = ', warm start'
+            else:
+                mode = ''
+            message = '{0} fit "{1}" took {2:.1f} ms ({3:d} function evaluations{4}).'.format(
+                self.name,
+                self.current_fit,
+                self.fit_statistics['time'] * 1e3,
+                self.fit_statistics['nfev'],
+                mode)
+            self.fit_logic.log.debug(message)
+
             self.current_fit_param = result.params
             self.current_fit_result = result
             self.sigNewFitParameters.emit(self.current_fit, result.params)
@@ -429,8 +429,9 @@ class NuclearOperationsLogic(GenericLogic):
         if meas_type in ['Nuclear_Rabi', 'Nuclear_Frequency_Scan']:
 
 
-            entry_indices = np.where(self._gc_logic.countdata>50)
-            trunc_countdata = self._gc_logic.countdata[entry_indices]
+            countdata = self._gc_logic.countdata
+            entry_indices = np.where(countdata>50)
+            trunc_countdata = countdata[entry_indices]
 
             flip_prop, param = self._trace_ana_logic.analyze_flip_prob(trunc_countdata)
 
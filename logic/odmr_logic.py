@@ -30,6 +30,7 @@ import datetime
 import matplotlib.pyplot as plt
 
 from logic.generic_logic import GenericLogic
+from core.util.buffers import RunningAverageBuffer
 from core.util.mutex import Mutex
 from core.connector import Connector
 from core.configoption import ConfigOption
@@ -122,12 +123,8 @@ class ODMRLogic(GenericLogic):
 
         # Initalize the ODMR data arrays (mean signal and sweep matrix)
         self._initialize_odmr_plots()
-        # Raw data array
-        self.odmr_raw_data = np.zeros(
-            [self.number_of_lines,
-             len(self._odmr_counter.get_odmr_channels()),
-            self.odmr_plot_x.size]
-            )
+        # Raw data buffer
+        self._initialize_odmr_raw_data(self.number_of_lines)
 
         # Switch off microwave and set CW frequency and power
         self.mw_off()
@@ -212,6 +209,25 @@ class ODMRLogic(GenericLogic):
         self.sigOdmrFitUpdated.emit(self.odmr_fit_x, self.odmr_fit_y, {}, current_fit)
         return
 
+    def _initialize_odmr_raw_data(self, number_of_sweeps):
+        """ Initializing the buffer holding all raw ODMR sweeps of a measurement.
+
+        @param int number_of_sweeps: number of sweeps to preallocate memory for
+        """
+        self._odmr_raw_buffer = RunningAverageBuffer(
+            entry_shape=(len(self.get_odmr_channels()), self.odmr_plot_x.size),
+            capacity=number_of_sweeps,
+            padding=self.number_of_lines,
+            window=max(0, self.lines_to_average))
+        return
+
+    @property
+    def odmr_raw_data(self):
+        """ All raw ODMR sweeps of the current measurement with the newest sweep first.
+        Shape is (sweeps, channels, frequencies). This is a view into the raw data buffer.
+        """
+        return self._odmr_raw_buffer.data[::-1]
+
     def set_trigger(self, trigger_pol, frequency):
         """
         Set trigger polarity of external microwave trigger (for list and sweep mode).
@@ -243,18 +259,8 @@ class ODMRLogic(GenericLogic):
         """
         self.lines_to_average = int(lines_to_average)
 
-        if self.lines_to_average <= 0:
-            self.odmr_plot_y = np.mean(
-                self.odmr_raw_data[:max(1, self.elapsed_sweeps), :, :],
-                axis=0,
-                dtype=np.float64
-            )
-        else:
-            self.odmr_plot_y = np.mean(
-                self.odmr_raw_data[:max(1, min(self.lines_to_average, self.elapsed_sweeps)), :, :],
-                axis=0,
-                dtype=np.float64
-            )
+        self._odmr_raw_buffer.window = max(0, self.lines_to_average)
+        self.odmr_plot_y = self._odmr_raw_buffer.get_window_mean()
 
         self.sigOdmrPlotsUpdated.emit(self.odmr_plot_x, self.odmr_plot_y, self.odmr_plot_xy)
         self.sigParameterUpdated.emit({'average_length': self.lines_to_average})
@@ -584,6 +590,8 @@ class ODMRLogic(GenericLogic):
             self._clearOdmrData = False
             self.stopRequested = False
             self.fc.clear_result()
+            # Repeated fits during the measurement start from the previous fit results
+            self.fc.start_fit_session()
 
             self.elapsed_sweeps = 0
             self.elapsed_time = 0.0
@@ -594,12 +602,14 @@ class ODMRLogic(GenericLogic):
             if odmr_status < 0:
                 mode, is_running = self._mw_device.get_status()
                 self.sigOutputStateUpdated.emit(mode, is_running)
+                self.fc.stop_fit_session()
                 self.module_state.unlock()
                 return -1
 
             mode, is_running = self.mw_sweep_on()
             if not is_running:
                 self._stop_odmr_counter()
+                self.fc.stop_fit_session()
                 self.module_state.unlock()
                 return -1
 
@@ -611,11 +621,7 @@ class ODMRLogic(GenericLogic):
                 estimated_number_of_lines = self.number_of_lines
             self.log.debug('Estimated number of raw data lines: {0:d}'
                            ''.format(estimated_number_of_lines))
-            self.odmr_raw_data = np.zeros(
-                [estimated_number_of_lines,
-                 len(self._odmr_counter.get_odmr_channels()),
-                 self.odmr_plot_x.size]
-            )
+            self._initialize_odmr_raw_data(estimated_number_of_lines)
             self.sigNextLine.emit()
             return 0
 
@@ -634,6 +640,8 @@ class ODMRLogic(GenericLogic):
             self.module_state.lock()
             self.stopRequested = False
             self.fc.clear_result()
+            # Repeated fits during the measurement start from the previous fit results
+            self.fc.start_fit_session()
 
             self._startTime = time.time() - self.elapsed_time
             self.sigOdmrElapsedTimeUpdated.emit(self.elapsed_time, self.elapsed_sweeps)
@@ -642,12 +650,14 @@ class ODMRLogic(GenericLogic):
             if odmr_status < 0:
                 mode, is_running = self._mw_device.get_status()
                 self.sigOutputStateUpdated.emit(mode, is_running)
+                self.fc.stop_fit_session()
                 self.module_state.unlock()
                 return -1
 
             mode, is_running = self.mw_sweep_on()
             if not is_running:
                 self._stop_odmr_counter()
+                self.fc.stop_fit_session()
                 self.module_state.unlock()
                 return -1
 
@@ -689,6 +699,7 @@ class ODMRLogic(GenericLogic):
                 self.stopRequested = False
                 self.mw_off()
                 self._stop_odmr_counter()
+                self.fc.stop_fit_session()
                 self.module_state.unlock()
                 return
 
@@ -708,45 +719,17 @@ class ODMRLogic(GenericLogic):
                 self.sigNextLine.emit()
                 return
 
-            # Add new count data to raw_data array and append if array is too small
+            # Add new count data to raw data buffer. The buffer grows automatically if needed.
             if self._clearOdmrData:
-                self.odmr_raw_data[:, :, :] = 0
+                self._odmr_raw_buffer.clear()
                 self._clearOdmrData = False
-            if self.elapsed_sweeps == (self.odmr_raw_data.shape[0] - 1):
-                expanded_array = np.zeros(self.odmr_raw_data.shape)
-                self.odmr_raw_data = np.concatenate((self.odmr_raw_data, expanded_array), axis=0)
-                self.log.warning('raw data array in ODMRLogic was not big enough for the entire '
-                                 'measurement. Array will be expanded.\nOld array shape was '
-                                 '({0:d}, {1:d}), new shape is ({2:d}, {3:d}).'
-                                 ''.format(self.odmr_raw_data.shape[0] - self.number_of_lines,
-                                           self.odmr_raw_data.shape[1],
-                                           self.odmr_raw_data.shape[0],
-                                           self.odmr_raw_data.shape[1]))
-
-            # shift data in the array "up" and add new data at the "bottom"
-            self.odmr_raw_data = np.roll(self.odmr_raw_data, 1, axis=0)
-
-            self.odmr_raw_data[0] = new_counts
-
-            # Add new count data to mean signal
-            if self._clearOdmrData:
-                self.odmr_plot_y[:, :] = 0
-
-            if self.lines_to_average <= 0:
-                self.odmr_plot_y = np.mean(
-                    self.odmr_raw_data[:max(1, self.elapsed_sweeps), :, :],
-                    axis=0,
-                    dtype=np.float64
-                )
-            else:
-                self.odmr_plot_y = np.mean(
-                    self.odmr_raw_data[:max(1, min(self.lines_to_average, self.elapsed_sweeps)), :, :],
-                    axis=0,
-                    dtype=np.float64
-                )
+            self._odmr_raw_buffer.append(new_counts)
+
+            # Update mean signal (running sums, no re-averaging of all sweeps)
+            self.odmr_plot_y = self._odmr_raw_buffer.get_window_mean()
 
-            # Set plot slice of matrix
-            self.odmr_plot_xy = self.odmr_raw_data[:self.number_of_lines, :, :]
+            # Set plot slice of matrix (newest sweep first, view without copy)
+            self.odmr_plot_xy = self._odmr_raw_buffer.get_latest(self.number_of_lines)
 
             # Update elapsed time/sweeps
             self.elapsed_sweeps += 1
@@ -779,9 +762,11 @@ class ODMRLogic(GenericLogic):
         """
         Execute the currently configured fit on the measurement data. Optionally on passed data
         """
+        session_key = None
         if (x_data is None) or (y_data is None):
             x_data = self.odmr_plot_x
             y_data = self.odmr_plot_y[channel_index]
+            session_key = channel_index
 
         if fit_function is not None and isinstance(fit_function, str):
             if fit_function in self.get_fit_functions():
@@ -792,7 +777,8 @@ class ODMRLogic(GenericLogic):
                     self.log.warning('Fit function "{0}" not available in ODMRLogic fit container.'
                                      ''.format(fit_function))
 
-        self.odmr_fit_x, self.odmr_fit_y, result = self.fc.do_fit(x_data, y_data)
+        self.odmr_fit_x, self.odmr_fit_y, result = self.fc.do_fit(x_data, y_data,
+                                                                 session_key=session_key)
 
         if result is None:
             result_str_dict = {}
@@ -849,22 +835,22 @@ class ODMRLogic(GenericLogic):
                 cbar_range=colorscale_range,
                 percentile_range=percentile_range)
 
-            self._save_logic.save_data(data,
-                                       filepath=filepath,
-                                       parameters=parameters,
-                                       filelabel=filelabel,
-                                       fmt='%.6e',
-                                       delimiter='\t',
-                                       timestamp=timestamp,
-                                       plotfig=fig)
-
-            self._save_logic.save_data(data2,
-                                       filepath=filepath2,
-                                       parameters=parameters,
-                                       filelabel=filelabel2,
-                                       fmt='%.6e',
-                                       delimiter='\t',
-                                       timestamp=timestamp)
+            self._save_logic.save_data_async(data,
+                                             filepath=filepath,
+                                             parameters=parameters,
+                                             filelabel=filelabel,
+                                             fmt='%.6e',
+                                             delimiter='\t',
+                                             timestamp=timestamp,
+                                             plotfig=fig)
+
+            self._save_logic.save_data_async(data2,
+                                             filepath=filepath2,
+                                             parameters=parameters,
+                                             filelabel=filelabel2,
+                                             fmt='%.6e',
+                                             delimiter='\t',
+                                             timestamp=timestamp)
 
             self.log.info('ODMR data saved to:\n{0}'.format(filepath))
         return
@@ -24,20 +24,43 @@ import numpy as np
 import time
 
 from logic.generic_logic import GenericLogic
+from core.configoption import ConfigOption
 from core.connector import Connector
 from core.statusvariable import StatusVar
 from core.util.mutex import Mutex
+from core.util.refocus_fit import fit_twoDgaussian, fit_gaussian, estimate_peak_step
 
 
 class OptimizerLogic(GenericLogic):
 
     """This is the Logic class for optimizing scanner position on bright features.
+
+    The refocus scans are fitted with lmfit by the FitLogic or, with the fit backend 'fast', with
+    the dedicated gaussian fitter of core.util.refocus_fit using analytic derivatives.
+
+    In tracking mode a refocus samples only the corners and center of a small hexagon in xy and
+    three points in z around the initial position and steps to the maximum of a local quadratic
+    fit. The full raster scans are used instead if the peak counts of the pattern drop below
+    tracking_threshold times the peak counts of the last raster refocus (with the same caller tag
+    and nearby position), if the tracking does not converge or if surface subtraction is enabled.
+
+    Example config for copy-paste:
+
+    optimizerlogic:
+        module.Class: 'optimizer_logic.OptimizerLogic'
+        fit_backend: 'fast'  # optional, 'lmfit' (default) or 'fast'
+        connect:
+            confocalscanner1: 'scanner_tilt_interfuse'
+            fitlogic: 'fitlogic'
     """
 
     # declare connectors
     confocalscanner1 = Connector(interface='ConfocalScannerInterface')
     fitlogic = Connector(interface='FitLogic')
 
+    # config options
+    _fit_backend = ConfigOption('fit_backend', 'lmfit', missing='nothing')
+
     # declare status vars
     _clock_frequency = StatusVar('clock_frequency', 50)
     return_slowness = StatusVar(default=20)
@@ -50,6 +73,15 @@ class OptimizerLogic(GenericLogic):
     do_surface_subtraction = StatusVar('surface_subtraction', False)
     surface_subtr_scan_offset = StatusVar('surface_subtraction_offset', 1e-6)
     opt_channel = StatusVar('optimization_channel', 0)
+    tracking_mode = StatusVar('tracking_mode', False)
+    tracking_xy_radius = StatusVar('tracking_xy_radius', 0.1e-6)
+    tracking_z_radius = StatusVar('tracking_z_radius', 0.3e-6)
+    tracking_samples = StatusVar('tracking_samples', 4)
+    tracking_threshold = StatusVar('tracking_threshold', 0.5)
+
+    # Maximal number of steps of a tracking refocus per optimization step before falling back to
+    # the raster scan
+    _tracking_max_iterations = 4
 
     # "private" signals to keep track of activities here in the optimizer logic
     _sigScanNextXyLine = QtCore.Signal()
@@ -57,6 +89,7 @@ class OptimizerLogic(GenericLogic):
     _sigCompletedXyOptimizerScan = QtCore.Signal()
     _sigDoNextOptimizationStep = QtCore.Signal()
     _sigFinishedAllOptimizationSteps = QtCore.Signal()
+    _sigTrackPosition = QtCore.Signal()
 
     # public signals
     sigImageUpdated = QtCore.Signal()
@@ -79,6 +112,11 @@ class OptimizerLogic(GenericLogic):
         # Keep track of who called the refocus
         self._caller_tag = ''
 
+        # Reference for tracking refocus: caller tag -> (position, peak counts of the last raster
+        # refocus)
+        self._tracking_references = dict()
+        self._peak_counts = None
+
     def on_activate(self):
         """ Initialisation performed during activation of the module.
 
@@ -87,6 +125,11 @@ class OptimizerLogic(GenericLogic):
         self._scanning_device = self.confocalscanner1()
         self._fit_logic = self.fitlogic()
 
+        if self._fit_backend not in ('lmfit', 'fast'):
+            self.log.error('Unknown fit backend "{0}" for the optimizer. Use "lmfit" or "fast". '
+                           'Falling back to "lmfit".'.format(self._fit_backend))
+            self._fit_backend = 'lmfit'
+
         # Reads in the maximal scanning range. The unit of that scan range is micrometer!
         self.x_range = self._scanning_device.get_position_range()[0]
         self.y_range = self._scanning_device.get_position_range()[1]
@@ -129,6 +172,7 @@ class OptimizerLogic(GenericLogic):
 
         self._sigDoNextOptimizationStep.connect(self._do_next_optimization_step, QtCore.Qt.QueuedConnection)
         self._sigFinishedAllOptimizationSteps.connect(self.finish_refocus)
+        self._sigTrackPosition.connect(self._track_position, QtCore.Qt.QueuedConnection)
         self._initialize_xy_refocus_image()
         self._initialize_z_refocus_image()
         return 0
@@ -223,6 +267,7 @@ class OptimizerLogic(GenericLogic):
         #
         self._xy_scan_line_count = 0
         self._optimization_step = 0
+        self._peak_counts = None
         self.check_optimization_sequence()
 
         scanner_status = self.start_scanner()
@@ -232,7 +277,10 @@ class OptimizerLogic(GenericLogic):
                 [self.optim_pos_x, self.optim_pos_y, self.optim_pos_z, 0])
             return
         self.sigRefocusStarted.emit(tag)
-        self._sigDoNextOptimizationStep.emit()
+        if self._get_tracking_reference() is not None:
+            self._sigTrackPosition.emit()
+        else:
+            self._sigDoNextOptimizationStep.emit()
 
     def stop_refocus(self):
         """Stops refocus."""
@@ -388,11 +436,14 @@ class OptimizerLogic(GenericLogic):
         xy_fit_data = self.xy_refocus_image[:, :, 3+self.opt_channel].ravel()
         axes = np.empty((len(self._X_values) * len(self._Y_values), 2))
         axes = (fit_x.flatten(), fit_y.flatten())
-        result_2D_gaus = self._fit_logic.make_twoDgaussian_fit(
-            xy_axes=axes,
-            data=xy_fit_data,
-            estimator=self._fit_logic.estimate_twoDgaussian_MLE
-        )
+        if self._fit_backend == 'fast':
+            result_2D_gaus = fit_twoDgaussian(x_axis=axes[0], y_axis=axes[1], data=xy_fit_data)
+        else:
+            result_2D_gaus = self._fit_logic.make_twoDgaussian_fit(
+                xy_axes=axes,
+                data=xy_fit_data,
+                estimator=self._fit_logic.estimate_twoDgaussian_MLE
+            )
         # print(result_2D_gaus.fit_report())
 
         if result_2D_gaus.success is False:
@@ -411,6 +462,8 @@ class OptimizerLogic(GenericLogic):
                         self.optim_pos_y = result_2D_gaus.best_values['center_y']
                         self.optim_sigma_x = result_2D_gaus.best_values['sigma_x']
                         self.optim_sigma_y = result_2D_gaus.best_values['sigma_y']
+                        self._peak_counts = (result_2D_gaus.best_values['amplitude']
+                                             + result_2D_gaus.best_values['offset'])
             else:
                 self.optim_pos_x = self._initial_pos_x
                 self.optim_pos_y = self._initial_pos_y
@@ -427,8 +480,14 @@ class OptimizerLogic(GenericLogic):
         self._scan_z_line()
 
         # z-fit
+        # The fast backend fits a gaussian with free offset, so the offset constraints need no
+        # adjustment for surface subtraction. Custom parameters are only supported by lmfit.
+        if self._fit_backend == 'fast' and not any(self.use_custom_params.values()):
+            result = fit_gaussian(x_axis=self._zimage_Z_values,
+                                  data=self.z_refocus_line[:, self.opt_channel])
+            self.z_params = self._get_z_params_from_fast_fit(result)
         # If subtracting surface, then data can go negative and the gaussian fit offset constraints need to be adjusted
-        if self.do_surface_subtraction:
+        elif self.do_surface_subtraction:
             adjusted_param = {'offset': {
                 'value': 1e-12,
                 'min': -self.z_refocus_line[:, self.opt_channel].max(),
@@ -438,6 +497,7 @@ class OptimizerLogic(GenericLogic):
                 x_axis=self._zimage_Z_values,
                 data=self.z_refocus_line[:, self.opt_channel],
                 add_params=adjusted_param)
+            self.z_params = result.params
         else:
             if any(self.use_custom_params.values()):
                 result = self._fit_logic.make_gausspeaklinearoffset_fit(
@@ -452,7 +512,7 @@ class OptimizerLogic(GenericLogic):
                     units='m',
                     estimator=self._fit_logic.estimate_gaussianlinearoffset_peak
                     )
-        self.z_params = result.params
+            self.z_params = result.params
 
         if result.success is False:
             self.log.error('error in 1D Gaussian Fit.')
@@ -467,9 +527,10 @@ class OptimizerLogic(GenericLogic):
                 if self.z_range[0] <= result.best_values['center'] <= self.z_range[1]:
                     self.optim_pos_z = result.best_values['center']
                     self.optim_sigma_z = result.best_values['sigma']
-                    gauss, params = self._fit_logic.make_gaussianlinearoffset_model()
-                    self.z_fit_data = gauss.eval(
-                        x=self._fit_zimage_Z_values, params=result.params)
+                    self.z_fit_data = result.eval(x=self._fit_zimage_Z_values)
+                    if not self.do_surface_subtraction:
+                        self._peak_counts = (result.best_values['amplitude']
+                                             + result.best_values['offset'])
                 else:  # new pos is too far away
                     # checks if new pos is too high
                     self.optim_sigma_z = 0.
@@ -489,10 +550,31 @@ class OptimizerLogic(GenericLogic):
         self.sigImageUpdated.emit()
         self._sigDoNextOptimizationStep.emit()
 
+    def _get_z_params_from_fast_fit(self, result):
+        """ Copy the result of the fast z fit into the parameters of the gaussianlinearoffset model
+        shown by the GUI. The fast fit has a constant offset, hence the slope is zero.
+
+        @param RefocusFitResult result: result of core.util.refocus_fit.fit_gaussian
+
+        @return lmfit.Parameters: the z fit parameters
+        """
+        params = self.z_params.copy()
+        for name, value in result.best_values.items():
+            params[name].set(value=value, min=-np.inf, max=np.inf)
+        params['slope'].set(value=0.)
+        return params
+
     def finish_refocus(self):
         """ Finishes up and releases hardware after the optimizer scans."""
         self.kill_scanner()
 
+        # The peak counts of a successful raster refocus are the reference of the tracking mode
+        if self._peak_counts is not None:
+            self._tracking_references[self._caller_tag] = (
+                np.array([self.optim_pos_x, self.optim_pos_y, self.optim_pos_z]),
+                self._peak_counts)
+            self._peak_counts = None
+
         self.log.info(
                 'Optimised from ({0:.3e},{1:.3e},{2:.3e}) to local '
                 'maximum at ({3:.3e},{4:.3e},{5:.3e}).'.format(
@@ -635,6 +717,121 @@ class OptimizerLogic(GenericLogic):
             self._initialize_z_refocus_image()
             self._sigScanZLine.emit()
 
+    def _get_tracking_reference(self):
+        """ Get the reference peak counts for a tracking refocus of the current caller.
+
+        @return float: peak counts of the last raster refocus, None if a raster refocus is needed
+        """
+        if not self.tracking_mode or self.do_surface_subtraction:
+            return None
+        reference = self._tracking_references.get(self._caller_tag)
+        if reference is None:
+            return None
+        position, peak_counts = reference
+        # A refocus far from the reference position is most likely on a different emitter
+        initial_pos = np.array([self._initial_pos_x, self._initial_pos_y, self._initial_pos_z])
+        max_distance = 0.5 * np.array(
+            [self.refocus_XY_size, self.refocus_XY_size, self.refocus_Z_size])
+        if np.any(np.abs(initial_pos - position) > max_distance):
+            return None
+        return peak_counts
+
+    def _scan_tracking_points(self, points, settle=False):
+        """ Measure the counts at a few scanner positions for the tracking refocus.
+
+        @param numpy.ndarray points: x, y, z positions with shape (3, number of points)
+        @param bool settle: move to the first point slowly and wait for the scanner to settle
+
+        @return numpy.ndarray: mean counts of the optimization channel at each point or None if
+                               the scan went wrong
+        """
+        samples = max(int(self.tracking_samples), 1)
+        if settle and self._move_to_start_pos(points[:, 0]) < 0:
+            return None
+
+        n_ch = len(self._scanning_device.get_scanner_axes())
+        line = np.repeat(points, samples, axis=1)
+        if n_ch <= 3:
+            line = line[0:n_ch]
+        else:
+            line = np.vstack((line, np.zeros(line.shape[1])))
+
+        line_counts = self._scanning_device.scan_line(line)
+        if np.any(line_counts == -1):
+            return None
+        return line_counts[:, self.opt_channel].reshape(-1, samples).mean(axis=1)
+
+    def _track_position(self):
+        """ Tracking refocus: for each step of the optimization sequence sample a small pattern
+        around the position and step to the maximum of a local quadratic fit until the maximum
+        lies within the pattern. Falls back to the raster scans if the signal dropped or the
+        tracking did not converge.
+        """
+        reference_counts = self._get_tracking_reference()
+        angles = np.arange(6) * np.pi / 3
+        xy_pattern = self.tracking_xy_radius * np.array([np.concatenate(([0], np.cos(angles))),
+                                                         np.concatenate(([0], np.sin(angles)))])
+        z_pattern = self.tracking_z_radius * np.array([[0., -1., 1.]])
+        ranges = np.array([self.x_range, self.y_range, self.z_range], dtype=float)
+
+        position = np.array([self.optim_pos_x, self.optim_pos_y, self.optim_pos_z], dtype=float)
+        settle = True
+        for step in self.optimization_sequence:
+            if step == 'XY':
+                axes, pattern, radius = [0, 1], xy_pattern, self.tracking_xy_radius
+            else:
+                axes, pattern, radius = [2], z_pattern, self.tracking_z_radius
+
+            converged = False
+            for _ in range(self._tracking_max_iterations):
+                if self.stopRequested:
+                    with self.threadlock:
+                        self.stopRequested = False
+                    self.finish_refocus()
+                    return
+
+                points = np.repeat(position[:, np.newaxis], pattern.shape[1], axis=1)
+                points[axes] += pattern
+                points = np.clip(points, ranges[:, 0:1], ranges[:, 1:2])
+                counts = self._scan_tracking_points(points, settle=settle)
+                settle = False
+                if counts is None:
+                    self.log.error('The tracking scan went wrong, using the raster scan instead.')
+                    self._start_raster_refocus()
+                    return
+                if counts.max() < self.tracking_threshold * reference_counts:
+                    self.log.info('Signal dropped to {0:.3g} of the reference, using the raster '
+                                  'scan instead of tracking.'.format(counts.max() / reference_counts))
+                    self._start_raster_refocus()
+                    return
+
+                offsets = (points[axes] - position[axes, np.newaxis]).T
+                shift, at_maximum = estimate_peak_step(offsets, counts, radius)
+                position[axes] = np.clip(position[axes] + shift, ranges[axes, 0], ranges[axes, 1])
+                if at_maximum and np.sqrt(np.sum(shift ** 2)) < 0.5 * radius:
+                    converged = True
+                    break
+
+            if not converged:
+                self.log.info('Tracking of {0} did not converge, using the raster scan instead.'
+                              ''.format(step))
+                self._start_raster_refocus()
+                return
+
+        self.optim_pos_x, self.optim_pos_y, self.optim_pos_z = position
+        # Follow the drift, but keep the peak counts of the raster refocus as reference
+        self._tracking_references[self._caller_tag] = (position, reference_counts)
+        self._sigFinishedAllOptimizationSteps.emit()
+
+    def _start_raster_refocus(self):
+        """ Start the raster scans of the optimization sequence from the initial position.
+        """
+        self.optim_pos_x = self._initial_pos_x
+        self.optim_pos_y = self._initial_pos_y
+        self.optim_pos_z = self._initial_pos_z
+        self._optimization_step = 0
+        self._sigDoNextOptimizationStep.emit()
+
     def set_position(self, tag, x=None, y=None, z=None, a=None):
         """ Set focus position.
 
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the sampling of entire PulseBlockEnsembles in worker processes, used by the
+SequenceGeneratorLogic to sample the distinct ensembles of a PulseSequence in parallel.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+
+from logic.pulsed.sampling_functions import SamplingFunctions
+
+# Paths the sampling functions of this (worker) process have been imported from
+_imported_sampling_function_paths = None
+
+
+def get_ensemble_sampling_plan(ensemble, get_block):
+    """ Creates a picklable description of a PulseBlockEnsemble for sample_ensemble_arrays.
+    Sampling functions are described by their dict representation, so the worker processes do not
+    need to unpickle instances of dynamically imported sampling function classes.
+
+    @param PulseBlockEnsemble ensemble: The ensemble to describe
+    @param callable get_block: Function returning the PulseBlock instance for a block name
+
+    @return list: [(<list of elements>, <repetitions>), ...] with each element given as
+                  (<dict of sampling function dicts per analog channel>, <digital_high dict>)
+    """
+    plan = list()
+    for block_name, reps in ensemble.block_list:
+        elements = [({chnl: func.get_dict_representation()
+                      for chnl, func in element.pulse_function.items()},
+                     dict(element.digital_high))
+                    for element in get_block(block_name).element_list]
+        plan.append((elements, reps))
+    return plan
+
+
+def sample_ensemble_arrays(sampling_plan, ensemble_info, rotating_frame, sample_rate, amplitudes,
+                           sampling_function_paths):
+    """ Samples an entire PulseBlockEnsemble (without rotating frame offset from previous
+    ensembles) into newly allocated sample arrays. Runs in a worker process.
+
+    @param list sampling_plan: ensemble description created by get_ensemble_sampling_plan
+    @param dict ensemble_info: information about the ensemble returned by analyze_block_ensemble
+    @param bool rotating_frame: rotating frame flag of the ensemble
+    @param float sample_rate: The sample rate in samples/s
+    @param dict amplitudes: normalization amplitude (half pp-amplitude) of each analog channel
+    @param list sampling_function_paths: paths to import the sampling functions from
+
+    @return tuple: (analog_samples, digital_samples) dicts with channel descriptors as keys and
+                   the sample arrays as values
+    """
+    global _imported_sampling_function_paths
+    if _imported_sampling_function_paths != sampling_function_paths:
+        SamplingFunctions.import_sampling_functions(sampling_function_paths)
+        _imported_sampling_function_paths = list(sampling_function_paths)
+
+    number_of_samples = ensemble_info['number_of_samples']
+    analog_samples = dict()
+    digital_samples = dict()
+    for chnl in ensemble_info['analog_channels']:
+        analog_samples[chnl] = np.empty(number_of_samples, dtype='float32')
+    for chnl in ensemble_info['digital_channels']:
+        digital_samples[chnl] = np.empty(number_of_samples, dtype=bool)
+
+    offset_bin = 0
+    write_index = 0
+    element_count = 0
+    for elements, reps in sampling_plan:
+        functions = [{chnl: getattr(SamplingFunctions, func['name'])(**func['params'])
+                      for chnl, func in pulse_function.items()}
+                     for pulse_function, _ in elements]
+        # Without rotating frame each repetition of an element yields the same samples
+        element_samples = dict()
+        for rep_no in range(reps + 1):
+            for element_index, (_, digital_high) in enumerate(elements):
+                element_length_bins = ensemble_info['elements_length_bins'][element_count]
+                end_index = write_index + element_length_bins
+                for chnl, high in digital_high.items():
+                    digital_samples[chnl][write_index:end_index] = high
+                for chnl, function in functions[element_index].items():
+                    key = (element_index, chnl, element_length_bins)
+                    samples = None if rotating_frame else element_samples.get(key)
+                    if samples is None:
+                        time_arr = (offset_bin + np.arange(element_length_bins,
+                                                           dtype='float64')) / sample_rate
+                        samples = function.get_samples(time_arr) / amplitudes[chnl]
+                        if not rotating_frame:
+                            element_samples[key] = samples
+                    analog_samples[chnl][write_index:end_index] = samples
+                write_index = end_index
+                if rotating_frame:
+                    offset_bin += element_length_bins
+                element_count += 1
+    return analog_samples, digital_samples
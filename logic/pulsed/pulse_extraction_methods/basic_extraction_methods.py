@@ -254,6 +254,129 @@ class BasicPulseExtractor(PulseExtractorBase):
         return_dict['laser_indices_falling'] = falling_ind
         return return_dict
 
+    def ungated_fast_conv_deriv(self, count_data, conv_std_dev=20.0):
+        """ Detects the laser pulses in the ungated timetrace data and extracts them.
+        Vectorized version of ungated_conv_deriv yielding the same results for well separated
+        laser pulses.
+
+        @param numpy.ndarray count_data: The raw timetrace data (1D) from an ungated fast counter
+        @param float conv_std_dev: The standard deviation of the gaussian used for smoothing
+
+        @return 2D numpy.ndarray:   2D array, the extracted laser pulses of the timetrace.
+                                    dimensions: 0: laser number, 1: time bin
+
+        Procedure:
+            Edge Detection:
+            ---------------
+
+            Same as in ungated_conv_deriv the timetrace is smoothed with a gaussian filter and the
+            derivative is taken. Instead of searching the global maximum/minimum iteratively for
+            each laser pulse, all local maxima (minima) of the derivative are found at once.
+            Only points being the maximum (minimum) within +-2*conv_std_dev are considered
+            (non-maximum suppression with a maximum filter). From these candidates the
+            number_of_lasers largest (smallest) ones are taken as rising (falling) flanks.
+            The flank positions are refined afterwards using a derivative with a small and fixed
+            smoothing width (10 bins) within +-conv_std_dev around the found positions.
+            Finally all laser pulses are sliced from the timetrace with a single fancy indexing.
+
+            If less candidates than laser pulses are found, the method falls back to
+            ungated_conv_deriv.
+        """
+        # Create return dictionary
+        return_dict = {'laser_counts_arr': np.empty(0, dtype='int64'),
+                       'laser_indices_rising': np.empty(0, dtype='int64'),
+                       'laser_indices_falling': np.empty(0, dtype='int64')}
+
+        number_of_lasers = self.measurement_settings.get('number_of_lasers')
+        if not isinstance(number_of_lasers, int):
+            return return_dict
+
+        # apply gaussian filter to remove noise and compute the gradient of the timetrace sum
+        try:
+            conv = ndimage.filters.gaussian_filter1d(count_data.astype(float), conv_std_dev)
+            conv_deriv = np.gradient(conv)
+        except:
+            conv_deriv = np.zeros(count_data.size)
+
+        # if gaussian smoothing or derivative failed, the returned array only contains zeros.
+        # Check for that and return also only zeros to indicate a failed pulse extraction.
+        if len(conv_deriv.nonzero()[0]) == 0:
+            return_dict['laser_counts_arr'] = np.zeros((number_of_lasers, 10), dtype='int64')
+            return return_dict
+
+        # use a reference for array, because the exact position of the peaks or dips
+        # (i.e. maxima or minima, which are the inflection points in the pulse) are distorted by
+        # a large conv_std_dev value.
+        try:
+            conv = ndimage.filters.gaussian_filter1d(count_data.astype(float), 10)
+            conv_deriv_ref = np.gradient(conv)
+        except:
+            conv_deriv_ref = np.zeros(conv_deriv.size)
+
+        # Find rising (maxima of derivative) and falling flanks (minima of derivative)
+        suppression_size = 2 * int(2 * conv_std_dev) + 1
+        flank_indices = list()
+        for deriv, deriv_ref in ((conv_deriv, conv_deriv_ref), (-conv_deriv, -conv_deriv_ref)):
+            local_max = ndimage.filters.maximum_filter1d(deriv, size=suppression_size,
+                                                         mode='nearest')
+            candidates = np.flatnonzero((deriv == local_max) & (deriv > 0))
+            # Remove multiple candidates on the same plateau
+            if candidates.size > 1:
+                keep = np.ones(candidates.size, dtype=bool)
+                keep[1:] = np.diff(candidates) >= suppression_size // 2
+                candidates = candidates[keep]
+            if candidates.size < number_of_lasers:
+                self.log.debug('Vectorized flank detection found only {0:d} candidates for {1:d} '
+                               'laser pulses. Falling back to ungated_conv_deriv.'
+                               ''.format(candidates.size, number_of_lasers))
+                return self.ungated_conv_deriv(count_data=count_data, conv_std_dev=conv_std_dev)
+            # Take the number_of_lasers most pronounced flanks
+            if candidates.size > number_of_lasers:
+                largest = np.argpartition(deriv[candidates], -number_of_lasers)[-number_of_lasers:]
+                candidates = candidates[largest]
+            # refine flank positions
+            flank_indices.append(
+                np.sort(self._refine_flank_indices(candidates, deriv_ref, conv_std_dev)))
+        rising_ind, falling_ind = flank_indices
+
+        # find the maximum laser length to use as size for the laser array
+        laser_length = np.max(falling_ind - rising_ind)
+        if laser_length < 1:
+            return_dict['laser_counts_arr'] = np.zeros((number_of_lasers, 10), dtype='int64')
+            return return_dict
+
+        # slice the detected laser pulses of the timetrace according to the found rising edges.
+        # Samples beyond the end of the timetrace are set to zero.
+        gather_indices = rising_ind[:, np.newaxis] + np.arange(laser_length, dtype='int64')
+        in_range = gather_indices < count_data.size
+        laser_arr = count_data[np.minimum(gather_indices, count_data.size - 1)].astype('int64')
+        laser_arr[~in_range] = 0
+
+        return_dict['laser_counts_arr'] = laser_arr
+        return_dict['laser_indices_rising'] = rising_ind
+        return_dict['laser_indices_falling'] = falling_ind
+        return return_dict
+
+    @staticmethod
+    def _refine_flank_indices(indices, deriv_ref, half_width):
+        """
+        Refines the flank positions by searching the maximum of deriv_ref within
+        [index - half_width, index + half_width) for all indices at once.
+
+        @param numpy.ndarray indices: The coarse flank indices
+        @param numpy.ndarray deriv_ref: The reference derivative to search the maximum in
+        @param float half_width: The half width of the search window in bins
+
+        @return numpy.ndarray: The refined flank indices
+        """
+        start_ind = np.clip(np.floor(indices - half_width).astype('int64'), 0, deriv_ref.size)
+        stop_ind = np.clip(np.floor(indices + half_width).astype('int64'), 0, deriv_ref.size)
+        stop_ind = np.maximum(stop_ind, start_ind + 1)
+        window_ind = start_ind[:, np.newaxis] + np.arange(np.max(stop_ind - start_ind))
+        window_values = deriv_ref[np.minimum(window_ind, deriv_ref.size - 1)]
+        window_values[window_ind >= stop_ind[:, np.newaxis]] = -np.inf
+        return start_ind + np.argmax(window_values, axis=1)
+
     def ungated_threshold(self, count_data, count_threshold=10, min_laser_length=200e-9,
                           threshold_tolerance=20e-9):
         """
@@ -23,6 +23,7 @@ import os
 import sys
 import inspect
 import importlib
+import numpy as np
 
 from core.util.modules import get_main_dir
 from core.util.helpers import natural_sort
@@ -78,6 +79,14 @@ class PulseExtractor(PulseExtractorBase):
        default data type.
     8) The keyword "method" must not be used in the extraction method parameters
 
+    In incremental mode (ConfigOption "incremental_extraction" of PulsedMeasurementLogic) the
+    laser pulse positions found by an ungated extraction method are cached. As long as the shape
+    of the timetrace and the extraction settings do not change, the laser pulses are just sliced
+    from new data at the cached positions without running the extraction method again.
+    The edge detection is repeated whenever the total number of counts in the timetrace has doubled
+    since the last detection (to benefit from the improved statistics) or has decreased (new
+    measurement).
+
     See BasicPulseExtractor class for an example usage.
     """
 
@@ -93,6 +102,10 @@ class PulseExtractor(PulseExtractorBase):
         # Currently selected extraction method
         self._current_extraction_method = None
 
+        # Flag indicating use of incremental extraction and the cached laser pulse positions
+        self.incremental_extraction = bool(pulsedmeasurementlogic.incremental_extraction)
+        self._incremental_cache = None
+
         # import path for extraction modules from default directory (logic.pulse_extraction_methods)
         path_list = [os.path.join(get_main_dir(), 'logic', 'pulsed', 'pulse_extraction_methods')]
         # import path for extraction modules from non-default directory if a path has been given
@@ -223,8 +236,99 @@ class PulseExtractor(PulseExtractorBase):
         else:
             extraction_method = self._ungated_extraction_methods[self._current_extraction_method]
         kwargs = self._get_extraction_method_kwargs(extraction_method)
+        if self.incremental_extraction and not self.is_gated and count_data.ndim == 1:
+            return self._extract_laser_pulses_incremental(extraction_method, count_data, kwargs)
         return extraction_method(count_data=count_data, **kwargs)
 
+    def reset_incremental_extraction(self):
+        """
+        Discard the cached laser pulse positions of the incremental extraction mode.
+        The next call to extract_laser_pulses will run the full extraction method again.
+        """
+        self._incremental_cache = None
+        return
+
+    def _extract_laser_pulses_incremental(self, extraction_method, count_data, kwargs):
+        """
+        Extract laser pulses from an ungated timetrace by re-using cached laser pulse positions.
+        The full extraction method is only called if the cache is invalid (see class docstring).
+
+        @param extraction_method: reference to the callable extraction method
+        @param numpy.ndarray count_data: 1D numpy array containing the timetrace
+        @param dict kwargs: keyword arguments for the extraction method
+
+        @return dict: result dictionary of the extraction method
+        """
+        total_counts = int(count_data.sum())
+        cache_key = (self._current_extraction_method,
+                     tuple(sorted(kwargs.items())),
+                     count_data.shape,
+                     self.measurement_settings.get('number_of_lasers'))
+
+        cache = self._incremental_cache
+        if cache is None or cache['key'] != cache_key or total_counts < cache[
+                'total_counts'] or total_counts >= 2 * cache['detection_counts']:
+            return_dict = extraction_method(count_data=count_data, **kwargs)
+            self._incremental_cache = self._create_incremental_cache(count_data, return_dict)
+            if self._incremental_cache is not None:
+                self._incremental_cache['key'] = cache_key
+                self._incremental_cache['total_counts'] = total_counts
+                self._incremental_cache['detection_counts'] = max(total_counts, 1)
+            return return_dict
+
+        cache['total_counts'] = total_counts
+        laser_arr = count_data[cache['gather_indices']]
+        if cache['gather_mask'] is not None:
+            laser_arr[~cache['gather_mask']] = 0
+        return {'laser_counts_arr': laser_arr.astype('int64', copy=False),
+                'laser_indices_rising': cache['laser_indices_rising'].copy(),
+                'laser_indices_falling': cache['laser_indices_falling'].copy()}
+
+    @staticmethod
+    def _create_incremental_cache(count_data, return_dict):
+        """
+        Creates the fancy-index arrays to slice laser pulses from a timetrace according to the
+        rising (and falling) flank indices returned by an extraction method.
+        The cache is only created if slicing reproduces the laser pulses returned by the extraction
+        method exactly. Two flavours are tested: Laser pulses of equal length starting at the rising
+        flanks (zero padded at the end of the timetrace) and laser pulses ranging from the rising to
+        the falling flank (zero padded to the maximum laser length).
+
+        @param numpy.ndarray count_data: 1D numpy array containing the timetrace
+        @param dict return_dict: result dictionary of the extraction method
+
+        @return dict: The created cache or None if the extraction result can not be reproduced
+        """
+        laser_arr = return_dict.get('laser_counts_arr')
+        rising_ind = return_dict.get('laser_indices_rising')
+        falling_ind = return_dict.get('laser_indices_falling')
+        if laser_arr is None or rising_ind is None or falling_ind is None:
+            return None
+        laser_arr = np.asarray(laser_arr)
+        rising_ind = np.asarray(rising_ind, dtype='int64')
+        falling_ind = np.asarray(falling_ind, dtype='int64')
+        if laser_arr.ndim != 2 or laser_arr.shape[1] == 0 or not laser_arr.any():
+            return None
+        if not (laser_arr.shape[0] == rising_ind.size == falling_ind.size):
+            return None
+        if rising_ind.min() < 0 or rising_ind.max() >= count_data.size:
+            return None
+
+        gather_indices = rising_ind[:, np.newaxis] + np.arange(laser_arr.shape[1], dtype='int64')
+        in_range = gather_indices < count_data.size
+        gather_indices[~in_range] = count_data.size - 1
+        flank_mask = in_range & (gather_indices <= falling_ind[:, np.newaxis])
+
+        for mask in (in_range, flank_mask):
+            test_arr = count_data[gather_indices]
+            test_arr[~mask] = 0
+            if np.array_equal(test_arr, laser_arr):
+                return {'gather_indices': gather_indices,
+                        'gather_mask': None if mask.all() else mask,
+                        'laser_indices_rising': rising_ind,
+                        'laser_indices_falling': falling_ind}
+        return None
+
     def _get_extraction_method_kwargs(self, method):
         """
         Get the proper values for keyword arguments other than "count_data" for <method>.
@@ -57,6 +57,10 @@ class PulsedMeasurementLogic(GenericLogic):
     analysis_import_path = ConfigOption(name='additional_analysis_path', default=None)
     # Optional file type descriptor for saving raw data to file
     _raw_data_save_type = ConfigOption(name='raw_data_save_type', default='text')
+    # Optional flag to re-use laser pulse positions found in ungated timetraces (see PulseExtractor)
+    incremental_extraction = ConfigOption(name='incremental_extraction',
+                                          default=False,
+                                          missing='nothing')
 
     # status variables
     # ext. microwave settings
@@ -774,9 +778,12 @@ class PulsedMeasurementLogic(GenericLogic):
                 # Clear previous fits
                 self.do_fit('No Fit', False)
                 self.do_fit('No Fit', True)
+                # Repeated fits during the measurement start from the previous fit results
+                self.fc.start_fit_session()
 
                 # initialize data arrays
                 self._initialize_data_arrays()
+                self._pulseextractor.reset_incremental_extraction()
 
                 # recall stashed raw data
                 if stashed_raw_data_tag in self._saved_raw_data:
@@ -844,6 +851,7 @@ class PulsedMeasurementLogic(GenericLogic):
                 # Set measurement paused flag
                 self.__is_paused = False
 
+                self.fc.stop_fit_session()
                 self.module_state.unlock()
                 self.sigMeasurementStatusUpdated.emit(False, False)
         return
@@ -995,7 +1003,7 @@ class PulsedMeasurementLogic(GenericLogic):
             self.log.debug('The data you are trying to fit does not contain enough data for a fit.')
             return
 
-        x_fit, y_fit, result = self.fc.do_fit(data[0], data[1])
+        x_fit, y_fit, result = self.fc.do_fit(data[0], data[1], session_key=use_alternative_data)
 
         fit_data = np.array([x_fit, y_fit])
 
@@ -1286,14 +1294,14 @@ class PulsedMeasurementLogic(GenericLogic):
             parameters['gated counting'] = self.fast_counter_settings['is_gated']
             parameters['extraction parameters'] = self.extraction_settings
 
-            self.savelogic().save_data(data,
-                                       timestamp=timestamp,
-                                       parameters=parameters,
-                                       filepath=filepath,
-                                       filelabel=filelabel,
-                                       filetype='text',
-                                       fmt='%d',
-                                       delimiter='\t')
+            self.savelogic().save_data_async(data,
+                                             timestamp=timestamp,
+                                             parameters=parameters,
+                                             filepath=filepath,
+                                             filelabel=filelabel,
+                                             filetype='text',
+                                             fmt='%d',
+                                             delimiter='\t')
 
         #####################################################################
         ####                Save measurement data                        ####
@@ -1559,10 +1567,10 @@ class PulsedMeasurementLogic(GenericLogic):
             else:
                 fig = None
 
-            self.savelogic().save_data(data, timestamp=timestamp,
-                                       parameters=parameters, fmt='%.15e',
-                                       filepath=filepath, filelabel=filelabel, filetype='text',
-                                       delimiter='\t', plotfig=fig)
+            self.savelogic().save_data_async(data, timestamp=timestamp,
+                                             parameters=parameters, fmt='%.15e',
+                                             filepath=filepath, filelabel=filelabel,
+                                             filetype='text', delimiter='\t', plotfig=fig)
 
         #####################################################################
         ####                Save raw data timetrace                      ####
@@ -1582,11 +1590,11 @@ class PulsedMeasurementLogic(GenericLogic):
         parameters['alternating'] = self._alternating
         parameters['Controlled variable'] = list(self.signal_data[0])
 
-        self.savelogic().save_data(data, timestamp=timestamp,
-                                   parameters=parameters, fmt='%d',
-                                   filepath=filepath, filelabel=filelabel,
-                                   filetype=self._raw_data_save_type,
-                                   delimiter='\t')
+        self.savelogic().save_data_async(data, timestamp=timestamp,
+                                         parameters=parameters, fmt='%d',
+                                         filepath=filepath, filelabel=filelabel,
+                                         filetype=self._raw_data_save_type,
+                                         delimiter='\t')
         return filepath
 
     def _compute_alt_data(self):
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a cache for already sampled PulseBlockElement analog samples used by the
+SequenceGeneratorLogic.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import numpy as np
+import threading
+from collections import OrderedDict
+
+
+class SampleCache:
+    """
+    Content-addressed cache for the (normalized, float32) analog samples of a single
+    PulseBlockElement channel.
+
+    Samples are identified by the dict representation of the sampling function, the element length
+    in bins, the phase offset (the offset bin modulo the period of the sampling function), the
+    sample rate and the normalization amplitude. Hence repeated elements (e.g. within repetitions
+    of a PulseBlock) are only calculated once and just copied afterwards.
+
+    The total size of all cached arrays is limited by max_bytes. If the limit is exceeded the
+    least recently used entries are discarded. Arrays larger than max_bytes are not cached at all.
+
+    Access to the cache is thread-safe.
+    """
+
+    def __init__(self, max_bytes=0):
+        self._lock = threading.RLock()
+        self._max_bytes = 0
+        self._current_bytes = 0
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.max_bytes = max_bytes
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        with self._lock:
+            self._max_bytes = max(0, int(value))
+            self._evict()
+
+    @property
+    def enabled(self):
+        return self._max_bytes > 0
+
+    @property
+    def current_bytes(self):
+        return self._current_bytes
+
+    def clear(self):
+        """ Remove all cached samples and reset hit/miss counters.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+        return
+
+    @staticmethod
+    def get_key(sampling_function, length_bins, offset_bin, sample_rate, amplitude):
+        """ Create the cache key for the samples of a single sampling function.
+
+        @param SamplingBase sampling_function: The sampling function instance to sample
+        @param int length_bins: Number of samples to create
+        @param int offset_bin: Absolute bin offset of the first sample (rotating frame)
+        @param float sample_rate: The sample rate in Hz
+        @param float amplitude: The amplitude the samples are normalized to
+
+        @return tuple: (key, phase_bin) with key being a hashable object or None if the samples of
+                       this function can not be cached. phase_bin is the bin offset to use for
+                       sampling (offset_bin modulo the sampling function period).
+        """
+        try:
+            period_bins = sampling_function.get_period_bins(sample_rate)
+        except AttributeError:
+            period_bins = None
+        if not period_bins:
+            return None, offset_bin
+        phase_bin = int(offset_bin) % int(period_bins)
+
+        dict_repr = sampling_function.get_dict_representation()
+        try:
+            params = tuple(sorted(dict_repr['params'].items()))
+            key = (dict_repr['name'],
+                   params,
+                   int(length_bins),
+                   phase_bin,
+                   float(sample_rate),
+                   float(amplitude))
+            hash(key)
+        except TypeError:
+            return None, offset_bin
+        return key, phase_bin
+
+    def get(self, key):
+        """ Returns the cached (read-only) samples for key or None if not present.
+        Marks the entry as most recently used.
+
+        @param key: The key as returned by get_key
+        @return numpy.ndarray: The cached samples or None
+        """
+        with self._lock:
+            samples = self._cache.get(key)
+            if samples is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+        return samples
+
+    def put(self, key, samples):
+        """ Adds samples to the cache. The cache holds its own read-only copy of the array.
+
+        @param key: The key as returned by get_key
+        @param numpy.ndarray samples: The samples to cache
+        @return bool: True if the samples have been cached, False otherwise
+        """
+        if key is None or samples.nbytes > self._max_bytes:
+            return False
+        samples = np.array(samples, copy=True)
+        samples.flags.writeable = False
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return True
+            self._cache[key] = samples
+            self._current_bytes += samples.nbytes
+            self._evict()
+        return True
+
+    def _evict(self):
+        while self._cache and self._current_bytes > self._max_bytes:
+            _, samples = self._cache.popitem(last=False)
+            self._current_bytes -= samples.nbytes
+        return
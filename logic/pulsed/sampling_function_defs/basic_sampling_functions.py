@@ -37,6 +37,9 @@ class Idle(SamplingBase):
         samples_arr = np.zeros(len(time_array))
         return samples_arr
 
+    def get_period_bins(self, sample_rate):
+        return 1
+
 
 class DC(SamplingBase):
     """
@@ -61,6 +64,9 @@ class DC(SamplingBase):
         samples_arr = self._get_dc(time_array, self.voltage)
         return samples_arr
 
+    def get_period_bins(self, sample_rate):
+        return 1
+
 
 class Sin(SamplingBase):
     """
@@ -96,6 +102,9 @@ class Sin(SamplingBase):
         samples_arr = self._get_sine(time_array, self.amplitude, self.frequency, phase_rad)
         return samples_arr
 
+    def get_period_bins(self, sample_rate):
+        return self._get_common_period_bins((self.frequency,), sample_rate)
+
 
 class DoubleSinSum(SamplingBase):
     """
@@ -154,6 +163,9 @@ class DoubleSinSum(SamplingBase):
         samples_arr += self._get_sine(time_array, self.amplitude_2, self.frequency_2, phase_rad)
         return samples_arr
 
+    def get_period_bins(self, sample_rate):
+        return self._get_common_period_bins((self.frequency_1, self.frequency_2), sample_rate)
+
 
 class DoubleSinProduct(SamplingBase):
     """
@@ -212,6 +224,9 @@ class DoubleSinProduct(SamplingBase):
         samples_arr *= self._get_sine(time_array, self.amplitude_2, self.frequency_2, phase_rad)
         return samples_arr
 
+    def get_period_bins(self, sample_rate):
+        return self._get_common_period_bins((self.frequency_1, self.frequency_2), sample_rate)
+
 
 class TripleSinSum(SamplingBase):
     """
@@ -292,6 +307,9 @@ class TripleSinSum(SamplingBase):
         samples_arr += self._get_sine(time_array, self.amplitude_3, self.frequency_3, phase_rad)
         return samples_arr
 
+    def get_period_bins(self, sample_rate):
+        return self._get_common_period_bins((self.frequency_1, self.frequency_2, self.frequency_3), sample_rate)
+
 
 class TripleSinProduct(SamplingBase):
     """
@@ -372,6 +390,9 @@ class TripleSinProduct(SamplingBase):
         samples_arr *= self._get_sine(time_array, self.amplitude_3, self.frequency_3, phase_rad)
         return samples_arr
 
+    def get_period_bins(self, sample_rate):
+        return self._get_common_period_bins((self.frequency_1, self.frequency_2, self.frequency_3), sample_rate)
+
 
 class Chirp(SamplingBase):
     """
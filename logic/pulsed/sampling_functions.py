@@ -24,8 +24,10 @@ import os
 import importlib
 import sys
 import inspect
+import math
 import copy
 import logging
+from fractions import Fraction
 from collections import OrderedDict
 
 
@@ -75,6 +77,48 @@ class SamplingBase:
             dict_repr['params'][param] = getattr(self, param)
         return dict_repr
 
+    def get_period_bins(self, sample_rate):
+        """
+        Number of samples after which the output of get_samples repeats itself exactly, i.e.
+        get_samples(t) == get_samples(t + period_bins / sample_rate) for all t.
+        Sampling functions that are time-independent should return 1.
+        This information is used to re-use already calculated samples
+        (see logic.pulsed.sample_cache).
+
+        @param float sample_rate: The sample rate in Hz used to create the time array
+        @return int: Period in bins or None if the samples are not periodic (or unknown)
+        """
+        return None
+
+    @staticmethod
+    def _get_common_period_bins(frequencies, sample_rate, max_period_bins=2**24):
+        """
+        Helper method to calculate the common period (in bins) of a superposition/product of
+        sine waves with given frequencies. The period is only reported if it is an exact integer
+        number of bins not exceeding max_period_bins.
+
+        @param iterable frequencies: The frequencies in Hz of all contributing sine waves
+        @param float sample_rate: The sample rate in Hz
+        @param int max_period_bins: Maximum period length to report
+        @return int: The common period in bins or None if there is none
+        """
+        period_bins = 1
+        try:
+            for freq in frequencies:
+                if freq == 0:
+                    continue
+                # exact rational representation of the frequency in units of the sample rate
+                ratio = Fraction(freq) / Fraction(sample_rate)
+                denominator = ratio.denominator
+                if denominator > max_period_bins:
+                    return None
+                period_bins = period_bins * denominator // math.gcd(period_bins, denominator)
+                if period_bins > max_period_bins:
+                    return None
+        except (TypeError, ValueError, OverflowError, ZeroDivisionError):
+            return None
+        return period_bins
+
 
 class SamplingFunctions:
     """
@@ -27,6 +27,8 @@ import time
 import copy
 import traceback
 
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
 from qtpy import QtCore
 from collections import OrderedDict
 from core.statusvariable import StatusVar
@@ -39,6 +41,8 @@ from logic.generic_logic import GenericLogic
 from logic.pulsed.pulse_objects import PulseBlock, PulseBlockEnsemble, PulseSequence
 from logic.pulsed.pulse_objects import PulseObjectGenerator, PulseBlockElement
 from logic.pulsed.sampling_functions import SamplingFunctions
+from logic.pulsed.sample_cache import SampleCache
+from logic.pulsed.ensemble_sampling import get_ensemble_sampling_plan, sample_ensemble_arrays
 from interface.pulser_interface import SequenceOption
 
 
@@ -65,6 +69,16 @@ class SequenceGeneratorLogic(GenericLogic):
                                        default=os.path.join(get_home_dir(), 'saved_pulsed_assets'),
                                        missing='warn')
     _overhead_bytes = ConfigOption(name='overhead_bytes', default=0, missing='nothing')
+    # Memory limit in bytes for caching sampled analog elements. 0 disables the cache.
+    _sample_cache_bytes = ConfigOption(name='sample_cache_bytes', default=0, missing='nothing')
+    # If True and chunkwise sampling is used (overhead_bytes), the next chunk is sampled while the
+    # previous one is written to the device in a worker thread. Needs twice the overhead_bytes.
+    _pipelined_sampling = ConfigOption(name='pipelined_sampling', default=False, missing='nothing')
+    # Number of worker processes used to sample the distinct ensembles of a PulseSequence without
+    # rotating frame in parallel. 0 or 1 disables parallel sampling.
+    _parallel_sampling_workers = ConfigOption(name='parallel_sampling_workers',
+                                              default=0,
+                                              missing='nothing')
     # Optional additional paths to import from
     _additional_methods_import_path = ConfigOption(name='additional_predefined_methods_path',
                                                    default=None,
@@ -129,10 +143,16 @@ class SequenceGeneratorLogic(GenericLogic):
 
         # A flag indicating if sampling of a sequence is in progress
         self.__sequence_generation_in_progress = False
+        # Samples of PulseBlockEnsembles calculated in parallel during sequence sampling.
+        # Keys are waveform names, values are tuples (<Future>, <size in bytes>)
+        self.__presampled_ensembles = dict()
 
         # Get instance of PulseObjectGenerator which takes care of collecting all predefined methods
         self._pog = None
 
+        # Cache for analog samples of repeatedly occurring PulseBlockElements
+        self._sample_cache = SampleCache()
+
         # The created pulse objects (PulseBlock, PulseBlockEnsemble, PulseSequence) are saved in
         # these dictionaries. The keys are the names.
         self._saved_pulse_blocks = OrderedDict()
@@ -183,6 +203,11 @@ class SequenceGeneratorLogic(GenericLogic):
                 self.log.error('ConfigOption additional_sampling_functions_path needs to either be a string or '
                                'a list of strings.')
         SamplingFunctions.import_sampling_functions(sf_path_list)
+        # Worker processes of the parallel sequence sampling import from the same paths
+        self._sampling_function_paths = sf_path_list
+
+        # (Re-)initialize the cache for sampled elements
+        self._sample_cache = SampleCache(max_bytes=self._sample_cache_bytes)
 
         # Read back settings from device and update instance variables accordingly
         self._read_settings_from_device()
@@ -204,6 +229,7 @@ class SequenceGeneratorLogic(GenericLogic):
     def on_deactivate(self):
         """ Deinitialisation performed during deactivation of the module.
         """
+        self._sample_cache.clear()
         return
 
     # @_saved_pulse_blocks.constructor
@@ -1696,6 +1722,228 @@ class SequenceGeneratorLogic(GenericLogic):
         # Take current time
         start_time = time.time()
 
+        # get important parameters from the ensemble and extend it if needed to match the
+        # waveform length granularity of the pulse generator
+        ensemble_info = self._extend_ensemble_to_granularity(ensemble)
+
+        # Calculate the byte size per sample.
+        # One analog sample per channel is 4 bytes (np.float32) and one digital sample per channel
+        # is 1 byte (np.bool).
+        bytes_per_sample = len(ensemble_info['analog_channels']) * 4 + len(
+            ensemble_info['digital_channels'])
+
+        # Calculate the bytes estimate for the entire ensemble
+        bytes_per_ensemble = bytes_per_sample * ensemble_info['number_of_samples']
+
+        # Determine the size of the sample arrays to be written as a whole.
+        if bytes_per_ensemble <= self._overhead_bytes or self._overhead_bytes == 0:
+            array_length = ensemble_info['number_of_samples']
+        else:
+            array_length = self._overhead_bytes // bytes_per_sample
+
+        # set of written waveform names on the device
+        written_waveforms = set()
+
+        # Check if the samples for this waveform have already been calculated in parallel
+        # (see sample_pulse_sequence). In that case they only need to be written to the device.
+        presampled = self.__presampled_ensembles.pop(waveform_name, None)
+        if presampled is not None:
+            write_ok = self._write_presampled_ensemble(presampled,
+                                                       waveform_name=waveform_name,
+                                                       ensemble=ensemble,
+                                                       ensemble_info=ensemble_info,
+                                                       array_length=array_length,
+                                                       written_waveforms=written_waveforms)
+            del presampled
+            if not write_ok:
+                if not self.__sequence_generation_in_progress:
+                    self.module_state.unlock()
+                self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
+                self.sigSampleEnsembleComplete.emit(None)
+                return -1, list(), dict()
+            if ensemble.rotating_frame:
+                offset_bin += ensemble_info['number_of_samples']
+        else:
+            # Use two alternating sets of sample arrays if the ensemble is written in several
+            # chunks and pipelined sampling is enabled. While one set is written to the device in a
+            # worker thread the other one is filled with the next chunk.
+            use_pipeline = bool(self._pipelined_sampling) and \
+                           array_length < ensemble_info['number_of_samples']
+
+            # Allocate the sample arrays that are used for a single write command.
+            # These buffers are re-used for all chunks.
+            buffer_sets = list()
+            try:
+                for _ in range(2 if use_pipeline else 1):
+                    analog_buffer = dict()
+                    digital_buffer = dict()
+                    for chnl in ensemble_info['analog_channels']:
+                        analog_buffer[chnl] = np.empty(array_length, dtype='float32')
+                    for chnl in ensemble_info['digital_channels']:
+                        digital_buffer[chnl] = np.empty(array_length, dtype=bool)
+                    buffer_sets.append((analog_buffer, digital_buffer))
+            except MemoryError:
+                self.log.error('Sampling of PulseBlockEnsemble "{0}" failed due to a MemoryError.\n'
+                               'The sample array needed is too large to allocate in memory.\n'
+                               'Try using the overhead_bytes ConfigOption to limit memory usage.'
+                               ''.format(ensemble.name))
+                if not self.__sequence_generation_in_progress:
+                    self.module_state.unlock()
+                self.sigSampleEnsembleComplete.emit(None)
+                return -1, list(), dict()
+
+            analog_samples, digital_samples = buffer_sets[0]
+            buffer_index = 0
+            # Single worker thread to write chunks to the device and the pending write job
+            write_executor = ThreadPoolExecutor(max_workers=1) if use_pipeline else None
+            pending_write = None
+
+            # integer to keep track of the sampls already processed
+            processed_samples = 0
+            # Index to keep track of the samples written into the preallocated samples array
+            array_write_index = 0
+            # Keep track of the number of elements already written
+            element_count = 0
+            # Iterate over all blocks within the PulseBlockEnsemble object
+            for block_name, reps in ensemble.block_list:
+                block = self.get_block(block_name)
+                # Iterate over all repetitions of the current block
+                for rep_no in range(reps + 1):
+                    # Iterate over the PulseBlockElement instances inside the current block
+                    for element in block.element_list:
+                        digital_high = element.digital_high
+                        pulse_function = element.pulse_function
+                        element_length_bins = ensemble_info['elements_length_bins'][element_count]
+
+                        # Indicator on how many samples of this element have been written already
+                        element_samples_written = 0
+
+                        while element_samples_written != element_length_bins:
+                            samples_to_add = min(array_length - array_write_index,
+                                                 element_length_bins - element_samples_written)
+
+                            # Calculate respective part of the sample arrays
+                            for chnl in digital_high:
+                                digital_samples[chnl][array_write_index:array_write_index + samples_to_add] = digital_high[
+                                    chnl]
+                            for chnl in pulse_function:
+                                analog_samples[chnl][array_write_index:array_write_index + samples_to_add] = self._get_analog_samples(
+                                    pulse_function[chnl], chnl, samples_to_add, offset_bin)
+
+                            element_samples_written += samples_to_add
+                            array_write_index += samples_to_add
+                            processed_samples += samples_to_add
+                            # if the rotating frame should be preserved (default) increment the offset
+                            # counter for the time array.
+                            if ensemble.rotating_frame:
+                                offset_bin += samples_to_add
+
+                            # Check if the temporary sample array is full and write to the device if so.
+                            if array_write_index == array_length:
+                                # Set first/last chunk flags
+                                is_first_chunk = array_write_index == processed_samples
+                                is_last_chunk = processed_samples == ensemble_info['number_of_samples']
+                                write_kwargs = {
+                                    'name': waveform_name,
+                                    'analog_samples': {chnl: arr[:array_length] for chnl, arr in
+                                                       analog_samples.items()},
+                                    'digital_samples': {chnl: arr[:array_length] for chnl, arr in
+                                                        digital_samples.items()},
+                                    'is_first_chunk': is_first_chunk,
+                                    'is_last_chunk': is_last_chunk,
+                                    'total_number_of_samples': ensemble_info['number_of_samples']}
+
+                                if use_pipeline:
+                                    # Wait for the previous chunk to be written before queueing the
+                                    # next one. Afterwards continue sampling into the other buffer set.
+                                    write_ok = self._check_written_chunk(pending_write,
+                                                                         written_waveforms,
+                                                                         ensemble.name)
+                                    pending_write = None
+                                    if write_ok:
+                                        pending_write = (
+                                            write_executor.submit(self.pulsegenerator().write_waveform,
+                                                                  **write_kwargs),
+                                            array_length,
+                                            block_name)
+                                        buffer_index = (buffer_index + 1) % len(buffer_sets)
+                                        analog_samples, digital_samples = buffer_sets[buffer_index]
+                                else:
+                                    write_ok = self._check_written_chunk(
+                                        (self.pulsegenerator().write_waveform(**write_kwargs),
+                                         array_length,
+                                         block_name),
+                                        written_waveforms,
+                                        ensemble.name)
+
+                                if not write_ok:
+                                    if write_executor is not None:
+                                        write_executor.shutdown(wait=True)
+                                    if not self.__sequence_generation_in_progress:
+                                        self.module_state.unlock()
+                                    self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
+                                    self.sigSampleEnsembleComplete.emit(None)
+                                    return -1, list(), dict()
+
+                                # Reset array write start pointer
+                                array_write_index = 0
+
+                                # check if the temporary write array needs to be truncated for the next
+                                # part. (because it is the last part of the ensemble to write which can
+                                # be shorter than the previous chunks). The preallocated buffers are
+                                # re-used and only partially filled in this case.
+                                if array_length > ensemble_info['number_of_samples'] - processed_samples:
+                                    array_length = ensemble_info['number_of_samples'] - processed_samples
+
+                        # Increment element index
+                        element_count += 1
+
+            # Wait for the last chunk to be written to the device
+            if write_executor is not None:
+                write_ok = self._check_written_chunk(pending_write, written_waveforms, ensemble.name)
+                write_executor.shutdown(wait=True)
+                if not write_ok:
+                    if not self.__sequence_generation_in_progress:
+                        self.module_state.unlock()
+                    self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
+                    self.sigSampleEnsembleComplete.emit(None)
+                    return -1, list(), dict()
+
+        # Save sampling related parameters to the sampling_information container within the
+        # PulseBlockEnsemble.
+        # This step is only performed if the resulting waveforms are named by the PulseBlockEnsemble
+        # and not by a sequence nametag
+        if waveform_name == ensemble.name:
+            ensemble.sampling_information = dict()
+            ensemble.sampling_information.update(ensemble_info)
+            ensemble.sampling_information['pulse_generator_settings'] = self.pulse_generator_settings
+            ensemble.sampling_information['waveforms'] = natural_sort(written_waveforms)
+            self.save_ensemble(ensemble)
+
+        self.log.info('Time needed for sampling and writing PulseBlockEnsemble {0} to device: {1} sec'
+                      ''.format(ensemble.name, int(np.rint(time.time() - start_time))))
+        if self._sample_cache.enabled:
+            self.log.debug('Sample cache: {0:d} hits, {1:d} misses, {2:d} entries ({3:d} bytes).'
+                           ''.format(self._sample_cache.hits, self._sample_cache.misses,
+                                     len(self._sample_cache), self._sample_cache.current_bytes))
+        if ensemble_info['number_of_samples'] == 0:
+            self.log.warning('Empty waveform (0 samples) created from PulseBlockEnsemble "{0}".'
+                             ''.format(ensemble.name))
+        if not self.__sequence_generation_in_progress:
+            self.module_state.unlock()
+        self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
+        self.sigSampleEnsembleComplete.emit(ensemble)
+        return offset_bin, natural_sort(written_waveforms), ensemble_info
+
+    def _extend_ensemble_to_granularity(self, ensemble):
+        """ Analyzes the PulseBlockEnsemble and makes sure the length of the resulting waveform is a
+        multiple of the step size (granularity) of the pulse generator.
+        This is done by appending an idle block to the ensemble if necessary.
+
+        @param PulseBlockEnsemble ensemble: The ensemble to analyze (and extend)
+
+        @return dict: information about the ensemble returned by analyze_block_ensemble
+        """
         # get important parameters from the ensemble
         ensemble_info = self.analyze_block_ensemble(ensemble)
 
@@ -1737,161 +1985,171 @@ class SequenceGeneratorLogic(GenericLogic):
             else:
                 self.log.warn('Extending waveform {0} by {2} bins. New length {1}.'.format(
                     ensemble.name, ensemble_info['number_of_samples'], extension_samples))
+        return ensemble_info
+
+    def _submit_presampling(self, ensemble_queue, executor):
+        """ Submits PulseBlockEnsembles from the queue for sampling in worker processes.
+        The number of presampled but not yet written ensembles is limited to the number of workers,
+        so not the sample arrays of the whole sequence are kept in memory at once. Their total size
+        is additionally limited by the overhead_bytes ConfigOption (if set).
+        At least one ensemble is always pending.
+
+        @param list ensemble_queue: PulseBlockEnsemble instances to sample. Submitted ensembles are
+                                    removed from the list.
+        @param ProcessPoolExecutor executor: The executor to submit the sampling jobs to
+        """
+        max_pending = max(1, int(self._parallel_sampling_workers))
+        pending_bytes = sum(nbytes for _, nbytes in self.__presampled_ensembles.values())
+        while ensemble_queue and len(self.__presampled_ensembles) < max_pending:
+            ensemble = ensemble_queue[0]
+            # Analysis (and extension) of the ensemble has to be done in this thread since it can
+            # alter the saved blocks and ensembles.
+            ensemble_info = self._extend_ensemble_to_granularity(ensemble)
+            nbytes = ensemble_info['number_of_samples'] * (
+                    len(ensemble_info['analog_channels']) * 4 + len(
+                ensemble_info['digital_channels']))
+            if self._overhead_bytes > 0 and self.__presampled_ensembles and \
+                    pending_bytes + nbytes > self._overhead_bytes:
+                break
+            del ensemble_queue[0]
+            amplitudes = {chnl: self.__analog_levels[0][chnl] / 2
+                          for chnl in ensemble_info['analog_channels']}
+            future = executor.submit(sample_ensemble_arrays,
+                                     get_ensemble_sampling_plan(ensemble, self.get_block),
+                                     ensemble_info,
+                                     ensemble.rotating_frame,
+                                     self.__sample_rate,
+                                     amplitudes,
+                                     self._sampling_function_paths)
+            self.__presampled_ensembles[ensemble.name] = (future, nbytes)
+            pending_bytes += nbytes
+        return
 
-        # Calculate the byte size per sample.
-        # One analog sample per channel is 4 bytes (np.float32) and one digital sample per channel
-        # is 1 byte (np.bool).
-        bytes_per_sample = len(ensemble_info['analog_channels']) * 4 + len(
-            ensemble_info['digital_channels'])
+    def _write_presampled_ensemble(self, presampled, waveform_name, ensemble, ensemble_info,
+                                   array_length, written_waveforms):
+        """ Writes the samples of a PulseBlockEnsemble calculated by sample_ensemble_arrays to the
+        pulse generator device (chunkwise if array_length is smaller than the number of samples).
 
-        # Calculate the bytes estimate for the entire ensemble
-        bytes_per_ensemble = bytes_per_sample * ensemble_info['number_of_samples']
+        @param tuple presampled: (<Future>, <size in bytes>) as created by _submit_presampling
+        @param str waveform_name: The waveform name to use (without channel suffix)
+        @param PulseBlockEnsemble ensemble: The ensemble the samples belong to
+        @param dict ensemble_info: information about the ensemble returned by
+                                   analyze_block_ensemble
+        @param int array_length: Maximum number of samples to write with a single call
+        @param set written_waveforms: Set of written waveform names to update
 
-        # Determine the size of the sample arrays to be written as a whole.
-        if bytes_per_ensemble <= self._overhead_bytes or self._overhead_bytes == 0:
-            array_length = ensemble_info['number_of_samples']
-        else:
-            array_length = self._overhead_bytes // bytes_per_sample
-
-        # Allocate the sample arrays that are used for a single write command
-        analog_samples = dict()
-        digital_samples = dict()
+        @return bool: True if the write was successful, False otherwise
+        """
         try:
-            for chnl in ensemble_info['analog_channels']:
-                analog_samples[chnl] = np.empty(array_length, dtype='float32')
-            for chnl in ensemble_info['digital_channels']:
-                digital_samples[chnl] = np.empty(array_length, dtype=bool)
-        except MemoryError:
-            self.log.error('Sampling of PulseBlockEnsemble "{0}" failed due to a MemoryError.\n'
-                           'The sample array needed is too large to allocate in memory.\n'
-                           'Try using the overhead_bytes ConfigOption to limit memory usage.'
-                           ''.format(ensemble.name))
-            if not self.__sequence_generation_in_progress:
-                self.module_state.unlock()
-            self.sigSampleEnsembleComplete.emit(None)
-            return -1, list(), dict()
-
-        # integer to keep track of the sampls already processed
-        processed_samples = 0
-        # Index to keep track of the samples written into the preallocated samples array
-        array_write_index = 0
-        # Keep track of the number of elements already written
-        element_count = 0
-        # set of written waveform names on the device
-        written_waveforms = set()
-        # Iterate over all blocks within the PulseBlockEnsemble object
-        for block_name, reps in ensemble.block_list:
-            block = self.get_block(block_name)
-            # Iterate over all repetitions of the current block
-            for rep_no in range(reps + 1):
-                # Iterate over the PulseBlockElement instances inside the current block
-                for element in block.element_list:
-                    digital_high = element.digital_high
-                    pulse_function = element.pulse_function
-                    element_length_bins = ensemble_info['elements_length_bins'][element_count]
-
-                    # Indicator on how many samples of this element have been written already
-                    element_samples_written = 0
-
-                    while element_samples_written != element_length_bins:
-                        samples_to_add = min(array_length - array_write_index,
-                                             element_length_bins - element_samples_written)
-                        # create floating point time array for the current element inside rotating
-                        # frame if analog samples are to be calculated.
-                        if pulse_function:
-                            time_arr = (offset_bin + np.arange(
-                                samples_to_add, dtype='float64')) / self.__sample_rate
-
-                        # Calculate respective part of the sample arrays
-                        for chnl in digital_high:
-                            digital_samples[chnl][array_write_index:array_write_index + samples_to_add] = digital_high[
-                                chnl]
-                        for chnl in pulse_function:
-                            analog_samples[chnl][array_write_index:array_write_index + samples_to_add] = pulse_function[
-                                                                                                             chnl].get_samples(
-                                time_arr) / (self.__analog_levels[0][chnl] / 2)
-
-                        # Free memory
-                        if pulse_function:
-                            del time_arr
-
-                        element_samples_written += samples_to_add
-                        array_write_index += samples_to_add
-                        processed_samples += samples_to_add
-                        # if the rotating frame should be preserved (default) increment the offset
-                        # counter for the time array.
-                        if ensemble.rotating_frame:
-                            offset_bin += samples_to_add
-
-                        # Check if the temporary sample array is full and write to the device if so.
-                        if array_write_index == array_length:
-                            # Set first/last chunk flags
-                            is_first_chunk = array_write_index == processed_samples
-                            is_last_chunk = processed_samples == ensemble_info['number_of_samples']
-                            written_samples, wfm_list = self.pulsegenerator().write_waveform(
-                                name=waveform_name,
-                                analog_samples=analog_samples,
-                                digital_samples=digital_samples,
-                                is_first_chunk=is_first_chunk,
-                                is_last_chunk=is_last_chunk,
-                                total_number_of_samples=ensemble_info['number_of_samples'])
-
-                            # Update written waveforms set
-                            written_waveforms.update(wfm_list)
-
-                            # check if write process was successful
-                            if written_samples != array_length:
-                                self.log.error('Sampling of block "{0}" in ensemble "{1}" failed. '
-                                               'Write to device was unsuccessful.\nThe number of '
-                                               'actually written samples ({2:d}) does not match '
-                                               'the number of samples staged to write ({3:d}).'
-                                               ''.format(block_name, ensemble.name, written_samples,
-                                                         array_length))
-                                if not self.__sequence_generation_in_progress:
-                                    self.module_state.unlock()
-                                self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
-                                self.sigSampleEnsembleComplete.emit(None)
-                                return -1, list(), dict()
-
-                            # Reset array write start pointer
-                            array_write_index = 0
-
-                            # check if the temporary write array needs to be truncated for the next
-                            # part. (because it is the last part of the ensemble to write which can
-                            # be shorter than the previous chunks)
-                            if array_length > ensemble_info['number_of_samples'] - processed_samples:
-                                array_length = ensemble_info['number_of_samples'] - processed_samples
-                                analog_samples = dict()
-                                digital_samples = dict()
-                                for chnl in ensemble_info['analog_channels']:
-                                    analog_samples[chnl] = np.empty(array_length, dtype='float32')
-                                for chnl in ensemble_info['digital_channels']:
-                                    digital_samples[chnl] = np.empty(array_length, dtype=bool)
-
-                    # Increment element index
-                    element_count += 1
-
-        # Save sampling related parameters to the sampling_information container within the
-        # PulseBlockEnsemble.
-        # This step is only performed if the resulting waveforms are named by the PulseBlockEnsemble
-        # and not by a sequence nametag
-        if waveform_name == ensemble.name:
-            ensemble.sampling_information = dict()
-            ensemble.sampling_information.update(ensemble_info)
-            ensemble.sampling_information['pulse_generator_settings'] = self.pulse_generator_settings
-            ensemble.sampling_information['waveforms'] = natural_sort(written_waveforms)
-            self.save_ensemble(ensemble)
-
-        self.log.info('Time needed for sampling and writing PulseBlockEnsemble {0} to device: {1} sec'
-                      ''.format(ensemble.name, int(np.rint(time.time() - start_time))))
-        if ensemble_info['number_of_samples'] == 0:
-            self.log.warning('Empty waveform (0 samples) created from PulseBlockEnsemble "{0}".'
-                             ''.format(ensemble.name))
-        if not self.__sequence_generation_in_progress:
-            self.module_state.unlock()
-        self.sigAvailableWaveformsUpdated.emit(self.sampled_waveforms)
-        self.sigSampleEnsembleComplete.emit(ensemble)
-        return offset_bin, natural_sort(written_waveforms), ensemble_info
+            analog_samples, digital_samples = presampled[0].result()
+        except Exception:
+            self.log.exception('Parallel sampling of PulseBlockEnsemble "{0}" failed.'
+                               ''.format(ensemble.name))
+            return False
+
+        number_of_samples = ensemble_info['number_of_samples']
+        for samples in (*analog_samples.values(), *digital_samples.values()):
+            if samples.size != number_of_samples:
+                self.log.error('Parallel sampling of PulseBlockEnsemble "{0}" failed. Number of '
+                               'samples ({1:d}) does not match the expected number ({2:d}).'
+                               ''.format(ensemble.name, samples.size, number_of_samples))
+                return False
+
+        written_samples = 0
+        while written_samples < number_of_samples:
+            chunk_end = min(written_samples + array_length, number_of_samples)
+            write_result = self.pulsegenerator().write_waveform(
+                name=waveform_name,
+                analog_samples={chnl: arr[written_samples:chunk_end] for chnl, arr in
+                                analog_samples.items()},
+                digital_samples={chnl: arr[written_samples:chunk_end] for chnl, arr in
+                                 digital_samples.items()},
+                is_first_chunk=written_samples == 0,
+                is_last_chunk=chunk_end == number_of_samples,
+                total_number_of_samples=number_of_samples)
+            if not self._check_written_chunk((write_result, chunk_end - written_samples, None),
+                                             written_waveforms,
+                                             ensemble.name):
+                return False
+            written_samples = chunk_end
+        return True
+
+    def _check_written_chunk(self, write_job, written_waveforms, ensemble_name):
+        """ Checks the result of a single write_waveform call on the pulse generator and updates
+        the set of written waveforms.
+
+        @param tuple write_job: (write_result, number_of_samples, block_name) with write_result
+                                being either the return value of write_waveform or a Future
+                                object returning it. Can be None to indicate nothing to check.
+                                block_name is only used for error messages and can be None.
+        @param set written_waveforms: Set of already written waveform names to update
+        @param str ensemble_name: Name of the PulseBlockEnsemble currently being sampled
+
+        @return bool: True if the write was successful, False otherwise
+        """
+        if write_job is None:
+            return True
+        write_result, number_of_samples, block_name = write_job
+        if block_name is None:
+            failed_str = 'Sampling of ensemble "{0}" failed.'.format(ensemble_name)
+        else:
+            failed_str = 'Sampling of block "{0}" in ensemble "{1}" failed.'.format(block_name,
+                                                                                   ensemble_name)
+        if isinstance(write_result, Future):
+            try:
+                write_result = write_result.result()
+            except Exception:
+                self.log.exception('{0} Write to device raised an exception.'.format(failed_str))
+                return False
+        written_samples, wfm_list = write_result
+
+        # Update written waveforms set
+        written_waveforms.update(wfm_list)
+
+        # check if write process was successful
+        if written_samples != number_of_samples:
+            self.log.error('{0} Write to device was unsuccessful.\nThe number of '
+                           'actually written samples ({1:d}) does not match '
+                           'the number of samples staged to write ({2:d}).'
+                           ''.format(failed_str, written_samples, number_of_samples))
+            return False
+        return True
+
+    def _get_analog_samples(self, sampling_function, channel, number_of_samples, offset_bin):
+        """ Calculates the normalized analog samples of a single sampling function.
+
+        If the sample cache is enabled, already calculated samples are re-used if the same sampling
+        function has been sampled before with the same length and phase offset.
+
+        @param SamplingBase sampling_function: The sampling function instance to sample
+        @param str channel: The analog channel descriptor (needed for normalization)
+        @param int number_of_samples: Number of samples to calculate
+        @param int offset_bin: Absolute bin offset of the first sample (rotating frame)
+
+        @return numpy.ndarray: The samples normalized to the analog channel amplitude
+        """
+        amplitude = self.__analog_levels[0][channel] / 2
+        key = None
+        if self._sample_cache.enabled:
+            key, offset_bin = self._sample_cache.get_key(sampling_function=sampling_function,
+                                                         length_bins=number_of_samples,
+                                                         offset_bin=offset_bin,
+                                                         sample_rate=self.__sample_rate,
+                                                         amplitude=amplitude)
+            if key is not None:
+                samples = self._sample_cache.get(key)
+                if samples is not None:
+                    return samples
+
+        # create floating point time array for the current element inside rotating frame
+        time_arr = (offset_bin + np.arange(number_of_samples, dtype='float64')) / self.__sample_rate
+        samples = sampling_function.get_samples(time_arr) / amplitude
+        del time_arr
+
+        if key is not None:
+            samples = samples.astype('float32')
+            self._sample_cache.put(key, samples)
+        return samples
 
     @QtCore.Slot(str)
     def sample_pulse_sequence(self, sequence):
@@ -1963,51 +2221,84 @@ class SequenceGeneratorLogic(GenericLogic):
         # of the sampled Pulse_Block_Ensembles one has to introduce a running number as an
         # additional name tag, so keep the sampled files separate.
         offset_bin = 0  # that will be used for phase preservation
-        for step_index, seq_step in enumerate(sequence):
-            if sequence.rotating_frame:
-                # to make something like 001
-                name_tag = seq_step.ensemble + '_' + str(step_index).zfill(3)
-            else:
-                name_tag = seq_step.ensemble
-                offset_bin = 0  # Keep the offset at 0
-
-            # Only sample ensembles if they have not already been sampled
-            if sequence.rotating_frame or \
-                    not self.get_ensemble(name_tag).sampling_information or \
-                    self.get_ensemble(name_tag).sampling_information['pulse_generator_settings'] != self.pulse_generator_settings:
-
-                offset_bin, waveform_list, ensemble_info = self.sample_pulse_block_ensemble(
-                    ensemble=seq_step.ensemble,
-                    offset_bin=offset_bin,
-                    name_tag=name_tag)
-
-                if len(waveform_list) == 0:
-                    self.log.error('Sampling of PulseBlockEnsemble "{0}" failed during sampling of '
-                                   'PulseSequence "{1}".\nFailed to create waveforms on device.'
-                                   ''.format(seq_step.ensemble, sequence.name))
-                    self.module_state.unlock()
-                    self.__sequence_generation_in_progress = False
-                    self.sigSampleSequenceComplete.emit(None)
-                    return
 
-                # Add to generated ensembles
-                ensemble_info['waveforms'] = waveform_list
-                generated_ensembles[name_tag] = ensemble_info
-
-                # Add created waveform names to the set
-                written_waveforms.update(waveform_list)
-            else:
-                self.log.debug('Waveform already sampled: {0}'.format(name_tag))
-                ensemble_info = self.get_ensemble(name_tag).sampling_information.copy()
-                del(ensemble_info['pulse_generator_settings'])
-                generated_ensembles[name_tag] = ensemble_info
-
-                # Add created waveform names to the set
-                written_waveforms.update(ensemble_info['waveforms'])
-
-            # Append written sequence step to sequence_param_dict_list
-            sequence_param_dict_list.append(
-                (tuple(generated_ensembles[name_tag]['waveforms']), seq_step))
+        # Without rotating frame the distinct ensembles of the sequence are independent of each
+        # other and can be sampled in parallel worker processes. Writing the samples to the device
+        # is still done step by step in sample_pulse_block_ensemble.
+        presample_queue = list()
+        sampling_executor = None
+        try:
+            if not sequence.rotating_frame and self._parallel_sampling_workers > 1:
+                for seq_step in sequence:
+                    ensemble = self.get_ensemble(seq_step.ensemble)
+                    if ensemble.name in (queued.name for queued in presample_queue):
+                        continue
+                    if ensemble.sampling_information and ensemble.sampling_information[
+                            'pulse_generator_settings'] == self.pulse_generator_settings:
+                        continue
+                    presample_queue.append(ensemble)
+                if len(presample_queue) > 1:
+                    sampling_executor = ProcessPoolExecutor(
+                        max_workers=int(self._parallel_sampling_workers))
+                    self._submit_presampling(presample_queue, sampling_executor)
+
+            for step_index, seq_step in enumerate(sequence):
+                if sequence.rotating_frame:
+                    # to make something like 001
+                    name_tag = seq_step.ensemble + '_' + str(step_index).zfill(3)
+                else:
+                    name_tag = seq_step.ensemble
+                    offset_bin = 0  # Keep the offset at 0
+
+                # Only sample ensembles if they have not already been sampled
+                if sequence.rotating_frame or \
+                        not self.get_ensemble(name_tag).sampling_information or \
+                        self.get_ensemble(name_tag).sampling_information['pulse_generator_settings'] != self.pulse_generator_settings:
+
+                    offset_bin, waveform_list, ensemble_info = self.sample_pulse_block_ensemble(
+                        ensemble=seq_step.ensemble,
+                        offset_bin=offset_bin,
+                        name_tag=name_tag)
+
+                    if len(waveform_list) == 0:
+                        self.log.error('Sampling of PulseBlockEnsemble "{0}" failed during '
+                                       'sampling of PulseSequence "{1}".\nFailed to create '
+                                       'waveforms on device.'.format(seq_step.ensemble,
+                                                                     sequence.name))
+                        self.module_state.unlock()
+                        self.__sequence_generation_in_progress = False
+                        self.sigSampleSequenceComplete.emit(None)
+                        return
+
+                    # Add to generated ensembles
+                    ensemble_info['waveforms'] = waveform_list
+                    generated_ensembles[name_tag] = ensemble_info
+
+                    # Add created waveform names to the set
+                    written_waveforms.update(waveform_list)
+
+                    # Queue more ensembles for parallel sampling if memory allows
+                    if sampling_executor is not None:
+                        self._submit_presampling(presample_queue, sampling_executor)
+                else:
+                    self.log.debug('Waveform already sampled: {0}'.format(name_tag))
+                    ensemble_info = self.get_ensemble(name_tag).sampling_information.copy()
+                    del(ensemble_info['pulse_generator_settings'])
+                    generated_ensembles[name_tag] = ensemble_info
+
+                    # Add created waveform names to the set
+                    written_waveforms.update(ensemble_info['waveforms'])
+
+                # Append written sequence step to sequence_param_dict_list
+                sequence_param_dict_list.append(
+                    (tuple(generated_ensembles[name_tag]['waveforms']), seq_step))
+        finally:
+            # Also clean up if sampling failed, so no presampled arrays are left for the next run
+            if sampling_executor is not None:
+                for future, _ in self.__presampled_ensembles.values():
+                    future.cancel()
+                sampling_executor.shutdown(wait=True)
+            self.__presampled_ensembles = dict()
 
         # pass the whole information to the sequence creation method:
         steps_written = self.pulsegenerator().write_sequence(sequence.name,
@@ -116,11 +116,15 @@ class QDPlotLogic(GenericLogic):
         self._fit_method = list()
 
         self.set_number_of_plots(self._default_plot_number)
+        # Scripts update the plotted data repeatedly, so repeated fits of the same data set start
+        # from the previous fit results
+        self.fit_container.start_fit_session()
 
     def on_deactivate(self):
         """ De-initialisation performed during deactivation of the module. """
         for i in reversed(range(self.number_of_plots)):
             self.remove_plot(i)
+        self.fit_container.stop_fit_session()
         self._save_logic = None
         self._fit_logic = None
 
@@ -203,6 +207,8 @@ class QDPlotLogic(GenericLogic):
             del self._fit_data[plot_index]
             del self._fit_results[plot_index]
             del self._fit_method[plot_index]
+            # Plot indices of the following plots change, forget their previous fit results
+            self.fit_container.start_fit_session()
             self.sigPlotNumberChanged.emit(self.number_of_plots)
 
             update_range = (-1,) if plot_index == -1 else range(plot_index, self.number_of_plots)
@@ -350,7 +356,8 @@ class QDPlotLogic(GenericLogic):
                             self.fit_container.current_fit)
 
                 # actually do the fit
-                fit_x, fit_y, result_set = self.fit_container.do_fit(np.array(x_data), np.array(y_data))
+                fit_x, fit_y, result_set = self.fit_container.do_fit(
+                    np.array(x_data), np.array(y_data), session_key=(plot_index, data_set))
                 fit_data_set = np.array([fit_x, fit_y])
                 fit_data.append(fit_data_set)
 
@@ -19,7 +19,9 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from cycler import cycler
+import copy
 import datetime
 import inspect
 import logging
@@ -27,17 +29,21 @@ import matplotlib.pyplot as plt
 import numpy as np
 import os
 import sys
+import threading
 import time
 
 from collections import OrderedDict
 from core.configoption import ConfigOption
 from core.util import units
+from core.util.binary_storage import Hdf5DataWriter, NpyDataWriter
 from core.util.mutex import Mutex
 from core.util.network import netobtain
 from logic.generic_logic import GenericLogic
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.backends.backend_pdf import PdfPages
 from PIL import Image
 from PIL import PngImagePlugin
+from qtpy import QtCore
 
 
 class DailyLogHandler(logging.FileHandler):
@@ -129,6 +135,8 @@ class SaveLogic(GenericLogic):
         log_into_daily_directory: True
         save_pdf: True
         save_png: True
+        hdf5_compression: 'gzip'  # optional, compression filter for data saved as HDF5
+        save_queue_size: 10  # optional, max. number of pending jobs of save_data_async
     """
 
     _win_data_dir = ConfigOption('win_data_directory', 'C:/Data/')
@@ -136,6 +144,12 @@ class SaveLogic(GenericLogic):
     log_into_daily_directory = ConfigOption('log_into_daily_directory', False, missing='warn')
     save_pdf = ConfigOption('save_pdf', False)
     save_png = ConfigOption('save_png', True)
+    hdf5_compression = ConfigOption('hdf5_compression', None, missing='nothing')
+    save_queue_size = ConfigOption('save_queue_size', 10, missing='nothing')
+
+    # Emitted by the background writer after a job of save_data_async has been saved successfully.
+    # Argument is the path of the saved data file.
+    sigDataSaved = QtCore.Signal(str)
 
     # Matplotlib style definition for saving plots
     mpl_qd_style = {
@@ -201,6 +215,8 @@ class SaveLogic(GenericLogic):
                 self.log_into_daily_directory = False
 
         self._daily_loghandler = None
+        self._save_executor = None
+        self._save_queue_semaphore = None
 
     def on_activate(self):
         """ Definition, configuration and initialisation of the SaveLogic.
@@ -217,7 +233,16 @@ class SaveLogic(GenericLogic):
         else:
             self._daily_loghandler = None
 
+        # Background writer for save_data_async. Max. number of queued + running jobs is limited
+        # by the semaphore.
+        self._save_executor = ThreadPoolExecutor(max_workers=1)
+        self._save_queue_semaphore = threading.BoundedSemaphore(max(1, int(self.save_queue_size)))
+
     def on_deactivate(self):
+        # Finish all pending save jobs
+        if self._save_executor is not None:
+            self._save_executor.shutdown(wait=True)
+            self._save_executor = None
         if self._daily_loghandler is not None:
             # removes the log handler logging into the daily directory
             logging.getLogger().removeHandler(self._daily_loghandler)
@@ -284,7 +309,12 @@ class SaveLogic(GenericLogic):
                                    filename and a timestamp, because then the timestamp will be
                                    ignored.
         @param string filetype: optional, the file format the data should be saved in. Valid inputs
-                                are 'text', 'xml' and 'npz'. Default is 'text'.
+                                are 'text', 'npz', 'npy' and 'hdf5'. Default is 'text'.
+                                'npy' creates a directory with one .npy file per data column and
+                                the parameters in a metadata.json file. 'hdf5' creates a .h5 file
+                                with one dataset per column and the parameters as attributes
+                                (requires h5py). For both, 2D arrays are split into their columns
+                                if the key contains one comma separated header per column.
         @param string or list of strings fmt: optional, format specifier for saved data. See python
                                               documentation for
                                               "Format Specification Mini-Language". If you want for
@@ -328,12 +358,129 @@ class SaveLogic(GenericLogic):
 
         YOU ARE RESPONSIBLE FOR THE IDENTIFIER! DO NOT FORGET THE UNITS FOR THE SAVED TIME
         TRACE/MATRIX.
+
+        @return str: path of the saved data file (-1 on error)
+        """
+        return self._save_data(data=data,
+                               module_name=self._get_calling_module_name(),
+                               poi_name=self.active_poi_name,
+                               filepath=filepath,
+                               parameters=parameters,
+                               filename=filename,
+                               filelabel=filelabel,
+                               timestamp=timestamp,
+                               filetype=filetype,
+                               fmt=fmt,
+                               delimiter=delimiter,
+                               plotfig=plotfig)
+
+    def save_data_async(self, data, filepath=None, parameters=None, filename=None, filelabel=None,
+                        timestamp=None, filetype='text', fmt='%.15e', delimiter='\t',
+                        plotfig=None):
+        """
+        Saves data like save_data but in a background thread, so the calling (measurement) thread
+        does not have to wait for the data and figure files to be written.
+
+        The data arrays and parameters are copied when the job is submitted, so the caller can
+        continue to modify them. The figure is closed in pyplot right away (pyplot is not
+        thread-safe) and rendered by the save job with the Agg canvas. It must not be used by the
+        caller afterwards.
+        If already <save_queue_size> jobs are pending, this method blocks until a job is finished.
+
+        See save_data for a description of the parameters.
+
+        @return concurrent.futures.Future: future of the save job. Its result is the path of the
+                                           saved data file (-1 on error).
+                                           sigDataSaved is emitted additionally on success.
+        """
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        module_name = self._get_calling_module_name()
+        if plotfig is not None:
+            # Remove the figure from pyplot in the calling thread and render it without pyplot
+            plt.close(plotfig)
+            FigureCanvasAgg(plotfig)
+        # Snapshot of the data at submit time
+        try:
+            data = OrderedDict((key, np.array(netobtain(value), copy=True))
+                               for key, value in data.items())
+        except Exception:
+            self.log.exception('Casting data into numpy.ndarray failed. Could not save data.')
+            future = Future()
+            future.set_result(-1)
+            return future
+        if parameters is not None:
+            try:
+                parameters = copy.deepcopy(parameters)
+            except Exception:
+                parameters = copy.copy(parameters)
+
+        job = dict(data=data,
+                   module_name=module_name,
+                   poi_name=self.active_poi_name,
+                   filepath=filepath,
+                   parameters=parameters,
+                   filename=filename,
+                   filelabel=filelabel,
+                   timestamp=timestamp,
+                   filetype=filetype,
+                   fmt=fmt,
+                   delimiter=delimiter,
+                   plotfig=plotfig,
+                   close_figure=False)
+
+        if self._save_executor is None:
+            self.log.warning('Background writer of SaveLogic is not running. Saving synchronously.')
+            future = Future()
+            future.set_result(self._save_data(**job))
+            return future
+
+        # Back-pressure: wait for a free slot in the queue
+        self._save_queue_semaphore.acquire()
+        try:
+            future = self._save_executor.submit(self._save_data, **job)
+        except:
+            self._save_queue_semaphore.release()
+            raise
+        future.add_done_callback(self._save_job_finished)
+        return future
+
+    def _save_job_finished(self, future):
+        """
+        Callback of finished save_data_async jobs (called in the background writer thread).
+        """
+        self._save_queue_semaphore.release()
+        try:
+            result = future.result()
+        except Exception:
+            self.log.exception('Saving data in background failed:')
+            return
+        if isinstance(result, str):
+            self.sigDataSaved.emit(result)
+        return
+
+    def _save_data(self, data, module_name, poi_name, filepath, parameters, filename, filelabel,
+                   timestamp, filetype, fmt, delimiter, plotfig, close_figure=True):
+        """
+        Implementation of save_data. See save_data for a description of the parameters.
+
+        @param str module_name: name of the module saving the data
+        @param str poi_name: name of the active POI ('' for none)
+        @param bool close_figure: close the figure with pyplot after saving. Must be False if not
+                                  called in the thread the figure has been created in.
+
+        @return str: path of the saved data file (-1 on error)
         """
         start_time = time.time()
         # Create timestamp if none is present
         if timestamp is None:
             timestamp = datetime.datetime.now()
 
+        if filetype == 'hdf5' and not Hdf5DataWriter.is_available():
+            self.log.error('Saving data as "hdf5" requires the h5py package. Saving as npy-files.')
+            filetype = 'npy'
+        binary_file = filetype in ('npy', 'hdf5')
+
         # Try to cast data array into numpy.ndarray if it is not already one
         # Also collect information on arrays in the process and do sanity checks
         found_1d = False
@@ -353,6 +500,10 @@ class SaveLogic(GenericLogic):
                                    'Could not save data.'.format(type(data[keyname])))
                     return -1
 
+            # binary files store each array as it is. No need to check the dimensions and dtypes.
+            if binary_file:
+                continue
+
             # determine dimensions
             if data[keyname].ndim < 3:
                 length = data[keyname].shape[0]
@@ -384,72 +535,39 @@ class SaveLogic(GenericLogic):
                            'arrays only. Saving data failed!')
             return -1
 
-        # try to trace back the functioncall to the class which was calling it.
-        try:
-            frm = inspect.stack()[1]
-            # this will get the object, which called the save_data function.
-            mod = inspect.getmodule(frm[0])
-            # that will extract the name of the class.
-            module_name = mod.__name__.split('.')[-1]
-        except:
-            # Sometimes it is not possible to get the object which called the save_data function
-            # (such as when calling this from the console).
-            module_name = 'UNSPECIFIED'
-
-        # determine proper file path
-        if filepath is None:
-            filepath = self.get_path_for_module(module_name)
-        elif not os.path.exists(filepath):
-            os.makedirs(filepath)
-            self.log.info('Custom filepath does not exist. Created directory "{0}"'
-                          ''.format(filepath))
-
-        # create filelabel if none has been passed
-        if filelabel is None:
-            filelabel = module_name
-        if self.active_poi_name != '':
-            filelabel = self.active_poi_name.replace(' ', '_') + '_' + filelabel
-
-        # determine proper unique filename to save if none has been passed
-        if filename is None:
-            filename = timestamp.strftime('%Y%m%d-%H%M-%S' + '_' + filelabel + '.dat')
-
-        # Check format specifier.
-        if not isinstance(fmt, str) and len(fmt) != len(data):
+        # Check format specifier of text files.
+        if not binary_file and not isinstance(fmt, str) and len(fmt) != len(data):
             self.log.error('Length of list of format specifiers and number of data items differs. '
                            'Saving not possible. Please pass exactly as many format specifiers as '
                            'data arrays.')
             return -1
 
-        # Create header string for the file
-        header = 'Saved Data from the class {0} on {1}.\n' \
-                 ''.format(module_name, timestamp.strftime('%d.%m.%Y at %Hh%Mm%Ss'))
-        header += '\nParameters:\n===========\n\n'
-        # Include the active POI name (if not empty) as a parameter in the header
-        if self.active_poi_name != '':
-            header += 'Measured at POI: {0}\n'.format(self.active_poi_name)
-        # add the parameters if specified:
-        if parameters is not None:
-            # check whether the format for the parameters have a dict type:
-            if isinstance(parameters, dict):
-                if isinstance(self._additional_parameters, dict):
-                    parameters = {**self._additional_parameters, **parameters}
-                for entry, param in parameters.items():
-                    if isinstance(param, float):
-                        header += '{0}: {1:.16e}\n'.format(entry, param)
-                    else:
-                        header += '{0}: {1}\n'.format(entry, param)
-            # make a hardcore string conversion and try to save the parameters directly:
-            else:
-                self.log.error('The parameters are not passed as a dictionary! The SaveLogic will '
-                               'try to save the parameters nevertheless.')
-                header += 'not specified parameters: {0}\n'.format(parameters)
-        header += '\nData:\n=====\n'
+        filepath, filename = self._get_file_location(module_name, poi_name, filepath, filename,
+                                                     filelabel, timestamp)
+        saved_file_path = os.path.join(filepath, filename)
+
+        # Create header string for text files
+        if not binary_file:
+            header = self._create_text_header(module_name=module_name,
+                                              poi_name=poi_name,
+                                              timestamp=timestamp,
+                                              parameters=parameters)
 
         # write data to file
         # FIXME: Implement other file formats
+        # write binary files. No restructuring of the data is needed.
+        if binary_file:
+            writer = self._create_binary_writer(filetype=filetype,
+                                                file_path=os.path.join(filepath, filename),
+                                                parameters=parameters,
+                                                module_name=module_name,
+                                                poi_name=poi_name,
+                                                timestamp=timestamp)
+            writer.write(data)
+            saved_file_path = writer.file_path
+            self.log.debug('Data saved to "{0}"'.format(writer.file_path))
         # write to textfile
-        if filetype == 'text':
+        elif filetype == 'text':
             # Reshape data if multiple 1D arrays have been passed to this method.
             # If a 2D array has been passed, reformat the specifier
             if len(data) != 1:
@@ -494,12 +612,13 @@ class SaveLogic(GenericLogic):
         # write npz file and save parameters in textfile
         elif filetype == 'npz':
             header += str(list(data.keys()))[1:-1]
-            np.savez_compressed(filepath + '/' + filename[:-4], **data)
-            self.save_array_as_text(data=[], filename=filename[:-4]+'_params.dat', filepath=filepath,
+            np.savez_compressed(os.path.join(filepath, os.path.splitext(filename)[0]), **data)
+            saved_file_path = os.path.join(filepath, os.path.splitext(filename)[0] + '.npz')
+            self.save_array_as_text(data=[], filename=os.path.splitext(filename)[0]+'_params.dat', filepath=filepath,
                                     fmt=fmt, header=header, delimiter=delimiter, comments='#',
                                     append=False)
         else:
-            self.log.error('Only saving of data as textfile and npz-file is implemented. Filetype "{0}" is not '
+            self.log.error('Only saving of data as textfile, npz-, npy- and hdf5-file is implemented. Filetype "{0}" is not '
                            'supported yet. Saving as textfile.'.format(filetype))
             self.save_array_as_text(data=data[identifier_str], filename=filename, filepath=filepath,
                                     fmt=fmt, header=header, delimiter=delimiter, comments='#',
@@ -562,9 +681,166 @@ class SaveLogic(GenericLogic):
                 png_image.save(fig_fname_image, "png", pnginfo=png_metadata)
 
             # close matplotlib figure
-            plt.close(plotfig)
+            if close_figure:
+                plt.close(plotfig)
             self.log.debug('Time needed to save data: {0:.2f}s'.format(time.time()-start_time))
             #----------------------------------------------------------------------------------
+        return saved_file_path
+
+    def open_data_stream(self, filepath=None, parameters=None, filename=None, filelabel=None,
+                         timestamp=None, filetype='hdf5'):
+        """
+        Opens a binary data file to which data can be appended in chunks during a measurement.
+        Location and name of the file are determined like in save_data.
+
+        Usage:
+            stream = savelogic.open_data_stream(filelabel='count_trace', parameters=params)
+            stream.append({'Time (s)': times, 'Signal (counts/s)': counts})
+            ...
+            stream.close()
+
+        Each call to append adds the passed data to the columns along the first axis. The data
+        dict has the same format as for save_data.
+
+        @param string filepath: optional, the path to the directory, where the data will be saved.
+        @param dictionary parameters: optional, the parameters to save as metadata.
+        @param string filename: optional, fixed name of the file.
+        @param string filelabel: optional, label to create the filename from.
+        @param datetime timestamp: optional, timestamp used for the filename.
+        @param string filetype: optional, 'hdf5' (default, requires h5py) or 'npy'
+
+        @return BinaryDataWriter: the opened data stream
+        """
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        module_name = self._get_calling_module_name()
+        filepath, filename = self._get_file_location(module_name, self.active_poi_name, filepath,
+                                                     filename, filelabel, timestamp)
+        if filetype == 'hdf5' and not Hdf5DataWriter.is_available():
+            self.log.error('Saving data as "hdf5" requires the h5py package. Streaming data as '
+                           'npy-files.')
+            filetype = 'npy'
+        return self._create_binary_writer(filetype=filetype,
+                                          file_path=os.path.join(filepath, filename),
+                                          parameters=parameters,
+                                          module_name=module_name,
+                                          poi_name=self.active_poi_name,
+                                          timestamp=timestamp)
+
+    def _get_calling_module_name(self):
+        """
+        Tries to trace back the function call to the module which called the save method.
+
+        @return str: name of the calling module, 'UNSPECIFIED' if it can not be determined
+        """
+        try:
+            # stack[0] is this method, stack[1] the save method and stack[2] the caller
+            frm = inspect.stack()[2]
+            # this will get the object, which called the save function.
+            mod = inspect.getmodule(frm[0])
+            # that will extract the name of the class.
+            module_name = mod.__name__.split('.')[-1]
+        except:
+            # Sometimes it is not possible to get the object which called the save function
+            # (such as when calling this from the console).
+            module_name = 'UNSPECIFIED'
+        return module_name
+
+    def _get_file_location(self, module_name, poi_name, filepath, filename, filelabel, timestamp):
+        """
+        Determines directory and filename to save data to (see save_data).
+
+        @return tuple(str, str): the file path and the filename
+        """
+        # determine proper file path
+        if filepath is None:
+            filepath = self.get_path_for_module(module_name)
+        elif not os.path.exists(filepath):
+            os.makedirs(filepath)
+            self.log.info('Custom filepath does not exist. Created directory "{0}"'
+                          ''.format(filepath))
+
+        # create filelabel if none has been passed
+        if filelabel is None:
+            filelabel = module_name
+        if poi_name != '':
+            filelabel = poi_name.replace(' ', '_') + '_' + filelabel
+
+        # determine proper unique filename to save if none has been passed
+        if filename is None:
+            filename = timestamp.strftime('%Y%m%d-%H%M-%S' + '_' + filelabel + '.dat')
+        return filepath, filename
+
+    def _create_text_header(self, module_name, poi_name, timestamp, parameters):
+        """
+        Creates the header of text data files containing the parameters.
+
+        @param str module_name: name of the module saving the data
+        @param str poi_name: name of the active POI ('' for none)
+        @param datetime timestamp: the timestamp of the data
+        @param dict parameters: the parameters to write into the header
+
+        @return str: the header string
+        """
+        header = 'Saved Data from the class {0} on {1}.\n' \
+                 ''.format(module_name, timestamp.strftime('%d.%m.%Y at %Hh%Mm%Ss'))
+        header += '\nParameters:\n===========\n\n'
+        # Include the active POI name (if not empty) as a parameter in the header
+        if poi_name != '':
+            header += 'Measured at POI: {0}\n'.format(poi_name)
+        # add the parameters if specified:
+        if parameters is not None:
+            # check whether the format for the parameters have a dict type:
+            if isinstance(parameters, dict):
+                if isinstance(self._additional_parameters, dict):
+                    parameters = {**self._additional_parameters, **parameters}
+                for entry, param in parameters.items():
+                    if isinstance(param, float):
+                        header += '{0}: {1:.16e}\n'.format(entry, param)
+                    else:
+                        header += '{0}: {1}\n'.format(entry, param)
+            # make a hardcore string conversion and try to save the parameters directly:
+            else:
+                self.log.error('The parameters are not passed as a dictionary! The SaveLogic will '
+                               'try to save the parameters nevertheless.')
+                header += 'not specified parameters: {0}\n'.format(parameters)
+        header += '\nData:\n=====\n'
+        return header
+
+    def _create_binary_writer(self, filetype, file_path, parameters, module_name, poi_name,
+                              timestamp):
+        """
+        Creates the writer for binary data files.
+
+        @param str filetype: 'npy' or 'hdf5'
+        @param str file_path: full path of the file. The file extension is replaced.
+        @param dict parameters: the parameters to save as metadata
+        @param str module_name: name of the module saving the data
+        @param str poi_name: name of the active POI ('' for none)
+        @param datetime timestamp: the timestamp of the data
+
+        @return BinaryDataWriter: the writer object
+        """
+        if parameters is None:
+            parameters = dict()
+        elif not isinstance(parameters, dict):
+            self.log.error('The parameters are not passed as a dictionary! The SaveLogic will '
+                           'try to save the parameters nevertheless.')
+            parameters = {'not specified parameters': str(parameters)}
+        if isinstance(self._additional_parameters, dict):
+            parameters = {**self._additional_parameters, **parameters}
+
+        metadata = OrderedDict()
+        metadata['module'] = module_name
+        metadata['timestamp'] = timestamp.strftime('%d.%m.%Y at %Hh%Mm%Ss')
+        if poi_name != '':
+            metadata['Measured at POI'] = poi_name
+
+        file_path = os.path.splitext(file_path)[0]
+        if filetype == 'hdf5':
+            return Hdf5DataWriter(file_path, parameters, metadata,
+                                  compression=self.hdf5_compression)
+        return NpyDataWriter(file_path, parameters, metadata)
 
     def save_array_as_text(self, data, filename, filepath='', fmt='%.15e', header='',
                            delimiter='\t', comments='#', append=False):
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the fit backends of the OptimizerLogic on simulated refocus scans with shot noise.
+The lmfit backend (twoDgaussian fit with MLE estimator and gaussianlinearoffset fit of the
+FitLogic) is compared to the fast backend of core.util.refocus_fit in speed and accuracy of the
+fitted positions.
+
+Run from the qudi main directory:
+    python tools/benchmark_refocus_fit.py [scans] [xy resolution] [z resolution]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import inspect
+import logging
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.util.refocus_fit import fit_twoDgaussian, fit_gaussian
+from logic.fitmethods import generalmethods, gaussianlikemethods, linearmethods
+
+
+class FitMethods:
+    """ The fit methods of the FitLogic used by the optimizer, attached to a class like the
+    FitLogic does, without the module manager.
+    """
+    log = logging.getLogger(__name__)
+
+
+for _module in (generalmethods, gaussianlikemethods, linearmethods):
+    for _name, _function in inspect.getmembers(_module, inspect.isfunction):
+        if _function.__module__ == _module.__name__:
+            setattr(FitMethods, _name, _function)
+
+
+def simulate_scans(scans, xy_resolution, z_resolution, xy_size=0.6e-6, z_size=2e-6, seed=0):
+    """ Simulate xy and z refocus scans around randomly displaced emitters.
+
+    @param int scans: number of refocus scans
+    @param int xy_resolution: pixels along x and y
+    @param int z_resolution: points of the z line
+    @param float xy_size: size of the xy scan in m
+    @param float z_size: length of the z line in m
+    @param int seed: seed of the random number generator
+
+    @return tuple: x, y, z axes, xy data with shape (scans, pixels), z data with shape
+                   (scans, points) and the true positions with shape (scans, 3)
+    """
+    random = np.random.RandomState(seed)
+    x_values = np.linspace(-xy_size / 2, xy_size / 2, xy_resolution)
+    z_values = np.linspace(-z_size / 2, z_size / 2, z_resolution)
+    x_grid, y_grid = np.meshgrid(x_values, x_values)
+    x_grid = x_grid.ravel()
+    y_grid = y_grid.ravel()
+
+    positions = random.uniform(-0.1, 0.1, (scans, 3)) * np.array([xy_size, xy_size, z_size])
+    sigma_xy = random.uniform(0.1e-6, 0.15e-6, (scans, 2))
+    sigma_z = random.uniform(0.4e-6, 0.5e-6, scans)
+    # counts per pixel for a dwell time of 20 ms
+    amplitude = random.uniform(200, 2000, scans)
+    background = random.uniform(40, 200, scans)
+
+    xy_data = amplitude[:, np.newaxis] * np.exp(
+        -(x_grid - positions[:, 0:1]) ** 2 / (2 * sigma_xy[:, 0:1] ** 2)
+        - (y_grid - positions[:, 1:2]) ** 2 / (2 * sigma_xy[:, 1:2] ** 2))
+    z_data = amplitude[:, np.newaxis] * np.exp(
+        -(z_values - positions[:, 2:3]) ** 2 / (2 * sigma_z[:, np.newaxis] ** 2))
+    xy_data = random.poisson(xy_data + background[:, np.newaxis]).astype(float)
+    z_data = random.poisson(z_data + background[:, np.newaxis]).astype(float)
+    return x_grid, y_grid, z_values, xy_data, z_data, positions
+
+
+def fit_lmfit(fit_methods, x_grid, y_grid, z_values, xy_data, z_data):
+    """ Fit the scans like the lmfit backend of the OptimizerLogic.
+
+    @return numpy.ndarray: fitted positions with shape (scans, 3), nan where the fit failed
+    """
+    positions = np.full((xy_data.shape[0], 3), np.nan)
+    for index, (xy_scan, z_scan) in enumerate(zip(xy_data, z_data)):
+        result = fit_methods.make_twoDgaussian_fit(
+            xy_axes=(x_grid, y_grid),
+            data=xy_scan,
+            estimator=fit_methods.estimate_twoDgaussian_MLE)
+        if result.success:
+            positions[index, :2] = (result.best_values['center_x'],
+                                    result.best_values['center_y'])
+        result = fit_methods.make_gaussianlinearoffset_fit(
+            x_axis=z_values,
+            data=z_scan,
+            units='m',
+            estimator=fit_methods.estimate_gaussianlinearoffset_peak)
+        if result.success:
+            positions[index, 2] = result.best_values['center']
+    return positions
+
+
+def fit_fast(x_grid, y_grid, z_values, xy_data, z_data):
+    """ Fit the scans like the fast backend of the OptimizerLogic.
+
+    @return numpy.ndarray: fitted positions with shape (scans, 3), nan where the fit failed
+    """
+    positions = np.full((xy_data.shape[0], 3), np.nan)
+    for index, (xy_scan, z_scan) in enumerate(zip(xy_data, z_data)):
+        result = fit_twoDgaussian(x_axis=x_grid, y_axis=y_grid, data=xy_scan)
+        if result.success:
+            positions[index, :2] = (result.best_values['center_x'],
+                                    result.best_values['center_y'])
+        result = fit_gaussian(x_axis=z_values, data=z_scan)
+        if result.success:
+            positions[index, 2] = result.best_values['center']
+    return positions
+
+
+def print_result(name, duration, scans, positions, true_positions):
+    errors = np.abs(positions - true_positions) * 1e9
+    print('{0}: {1:.2f} ms per refocus, {2:d} of {3:d} fits successful'.format(
+        name, duration / scans * 1e3, int(np.isfinite(positions).all(axis=1).sum()), scans))
+    print('    median absolute error x: {0:.1f} nm, y: {1:.1f} nm, z: {2:.1f} nm'.format(
+        *np.nanmedian(errors, axis=0)))
+
+
+def main(scans=200, xy_resolution=10, z_resolution=30):
+    x_grid, y_grid, z_values, xy_data, z_data, true_positions = simulate_scans(
+        scans, xy_resolution, z_resolution)
+    print('{0:d} refocus scans with {1:d}x{1:d} xy pixels and {2:d} z points'.format(
+        scans, xy_resolution, z_resolution))
+
+    start = time.perf_counter()
+    lmfit_positions = fit_lmfit(FitMethods(), x_grid, y_grid, z_values, xy_data, z_data)
+    print_result('lmfit', time.perf_counter() - start, scans, lmfit_positions, true_positions)
+
+    start = time.perf_counter()
+    fast_positions = fit_fast(x_grid, y_grid, z_values, xy_data, z_data)
+    print_result('fast ', time.perf_counter() - start, scans, fast_positions, true_positions)
+
+    difference = np.nanmax(np.abs(fast_positions - lmfit_positions), axis=0) * 1e9
+    print('maximal difference of the backends x: {0:.1f} nm, y: {1:.1f} nm, z: {2:.1f} nm'.format(
+        *difference))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the spot detection used by PoiManagerLogic.auto_catch_poi on a simulated confocal
+scan with randomly placed gaussian spots and shot noise.
+
+Run from the qudi main directory:
+    python tools/benchmark_spot_detection.py [pixels] [spots]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.util.filters import find_spots
+
+
+def simulate_scan(pixels, spots, sigma=2., amplitude=1000., background=50., seed=0):
+    """ Simulate a confocal scan with gaussian spots at random positions.
+
+    @param int pixels: number of pixels along each axis
+    @param int spots: number of spots
+    @param float sigma: standard deviation of the spots in pixels
+    @param float amplitude: height of the spots in counts
+    @param float background: mean background counts
+    @param int seed: seed of the random number generator
+
+    @return tuple(numpy.ndarray, numpy.ndarray): scan image and spot positions with shape (spots, 2)
+    """
+    random = np.random.RandomState(seed)
+    positions = random.uniform(0, pixels, (spots, 2))
+    image = np.zeros((pixels, pixels))
+    radius = int(np.ceil(5 * sigma))
+    offsets = np.arange(-radius, radius + 1)
+    for row, column in positions:
+        rows = np.clip(int(row) + offsets, 0, pixels - 1)
+        columns = np.clip(int(column) + offsets, 0, pixels - 1)
+        image[np.ix_(rows, columns)] += amplitude * np.exp(
+            -((rows[:, np.newaxis] - row) ** 2 + (columns - column) ** 2) / (2 * sigma ** 2))
+    return random.poisson(image + background).astype(float), positions
+
+
+def main(pixels=1000, spots=2000, spot_size=8, threshold_factor=3, repetitions=5):
+    image, positions = simulate_scan(pixels, spots)
+    threshold = image.mean() * threshold_factor
+    durations = list()
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        found, scores = find_spots(image, spot_size, threshold)
+        durations.append(time.perf_counter() - start)
+    distances = np.sqrt(((found[:, np.newaxis] - positions) ** 2).sum(axis=2)).min(axis=1)
+    print('{0:d}x{0:d} pixels, {1:d} spots'.format(pixels, spots))
+    print('found {0:d} spots, {1:d} within 1 pixel of a simulated spot'.format(
+        len(found), int((distances < 1).sum())))
+    print('detection time: {0:.3f} s (best of {1:d})'.format(min(durations), repetitions))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
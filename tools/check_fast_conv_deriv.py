@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that the vectorized ungated pulse extraction method ungated_fast_conv_deriv yields the same
+results as ungated_conv_deriv. Both methods are run on the FastComTec demo timetrace, on a
+simulated timetrace with many laser pulses and on a noiseless timetrace with less laser pulses
+than requested, which makes ungated_fast_conv_deriv fall back to ungated_conv_deriv.
+
+Run from the qudi main directory:
+    python tools/check_fast_conv_deriv.py [number_of_pulses]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import sys
+import time
+import logging
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logic.pulsed.pulse_extraction_methods.basic_extraction_methods import BasicPulseExtractor
+
+
+class RecordingHandler(logging.Handler):
+    """ Keeps all emitted log messages to check which code path has been taken. """
+    def __init__(self):
+        super().__init__(level=logging.DEBUG)
+        self.messages = list()
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class ExtractionSettings:
+    """ Provides the settings PulseExtractorBase reads from PulsedMeasurementLogic. """
+    def __init__(self, number_of_lasers):
+        self.measurement_settings = {'number_of_lasers': number_of_lasers}
+        self.fast_counter_settings = {'is_gated': False}
+        self.sampling_information = dict()
+        self.log = logging.getLogger('check_fast_conv_deriv')
+        self.log.setLevel(logging.DEBUG)
+
+
+def simulate_timetrace(pulses, laser_length=300, period=700, offset=300, signal=20.,
+                       background=1., seed=0):
+    """ Simulate an ungated timetrace with equally spaced laser pulses and shot noise.
+
+    @param int pulses: number of laser pulses
+    @param int laser_length: length of the laser pulses in bins
+    @param int period: distance between the rising flanks of two laser pulses in bins
+    @param int offset: position of the first rising flank in bins
+    @param float signal: mean counts per bin during the laser pulses
+    @param float background: mean counts per bin outside of the laser pulses
+    @param int seed: seed of the random number generator. No noise is added if None.
+
+    @return numpy.ndarray: the simulated timetrace
+    """
+    rate = np.full(offset + pulses * period, background)
+    for rising in offset + period * np.arange(pulses):
+        rate[rising:rising + laser_length] = signal
+    if seed is None:
+        return rate.astype('int64')
+    return np.random.RandomState(seed).poisson(rate).astype('int64')
+
+
+def compare(name, count_data, number_of_lasers, expect_fallback=False):
+    """ Run both extraction methods on count_data and assert identical results.
+
+    @param str name: name of the timetrace to print
+    @param numpy.ndarray count_data: the timetrace
+    @param int number_of_lasers: number of laser pulses to extract
+    @param bool expect_fallback: whether ungated_fast_conv_deriv must fall back to
+                                 ungated_conv_deriv
+    """
+    settings = ExtractionSettings(number_of_lasers)
+    handler = RecordingHandler()
+    settings.log.addHandler(handler)
+    extractor = BasicPulseExtractor(settings)
+    try:
+        start = time.perf_counter()
+        reference = extractor.ungated_conv_deriv(count_data.copy())
+        reference_time = time.perf_counter() - start
+        start = time.perf_counter()
+        result = extractor.ungated_fast_conv_deriv(count_data.copy())
+        fast_time = time.perf_counter() - start
+    finally:
+        settings.log.removeHandler(handler)
+
+    fell_back = any('Falling back to ungated_conv_deriv' in msg for msg in handler.messages)
+    assert fell_back == expect_fallback, \
+        '{0}: fallback to ungated_conv_deriv expected: {1}, taken: {2}'.format(
+            name, expect_fallback, fell_back)
+    for key in ('laser_indices_rising', 'laser_indices_falling', 'laser_counts_arr'):
+        assert np.array_equal(reference[key], result[key]), \
+            '{0}: "{1}" of both methods differ'.format(name, key)
+    print('{0}: {1:d} bins, {2:d} lasers, fallback: {3}, identical results, '
+          'ungated_conv_deriv: {4:.3f} s, ungated_fast_conv_deriv: {5:.3f} s'.format(
+              name, count_data.size, number_of_lasers, fell_back, reference_time, fast_time))
+
+
+def main(pulses=2000):
+    demo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'FastComTec_demo_timetrace.asc')
+    compare('demo timetrace', np.loadtxt(demo_path, dtype='int64'), 50)
+    compare('simulated timetrace', simulate_timetrace(pulses), pulses)
+    compare('too few flanks', simulate_timetrace(3, seed=None), 5, expect_fallback=True)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))